@@ -0,0 +1,26 @@
+"""add grade and comment versions
+
+Revision ID: 3a1e0c7d5b2f
+Revises: e43177bfe90b
+Create Date: 2020-06-15 10:21:43.512807
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a1e0c7d5b2f'
+down_revision = 'e43177bfe90b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('grade', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+    op.add_column('comment', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    op.drop_column('grade', 'version')
+    op.drop_column('comment', 'version')
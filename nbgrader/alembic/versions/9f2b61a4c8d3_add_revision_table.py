@@ -0,0 +1,48 @@
+"""add revision table
+
+Revision ID: 9f2b61a4c8d3
+Revises: 3a1e0c7d5b2f
+Create Date: 2020-06-22 14:05:12.337105
+
+"""
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f2b61a4c8d3'
+down_revision = '3a1e0c7d5b2f'
+branch_labels = None
+depends_on = None
+
+
+def _get_or_create_table(*args):
+    try:
+        table = op.create_table(*args)
+    except sa.exc.OperationalError:
+        table = sa.sql.table(*args)
+    return table
+
+
+def upgrade():
+    """
+    This migration adds a table holding a counter that is incremented
+    every time the gradebook is modified
+    """
+    _get_or_create_table(
+        'revision',
+        sa.Column('id', sa.String(32), primary_key=True, nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+    )
+
+    connection = op.get_bind()
+    results = connection.execute("select id from revision").fetchall()
+    if len(results) == 0:
+        connection.execute(
+            "INSERT INTO revision (id, value) VALUES ('{}', 0)".format(uuid.uuid4().hex))
+
+
+def downgrade():
+    op.drop_table('revision')
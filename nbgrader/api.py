@@ -2,24 +2,33 @@ from __future__ import division
 
 from . import utils
 
+import copy
 import datetime
+import functools
+import os
 import subprocess as sp
+import threading
 
 from sqlalchemy import (create_engine, ForeignKey, Column, String, Text,
                         DateTime, Interval, Float, Enum, UniqueConstraint,
-                        Boolean)
+                        Boolean, Integer)
 from sqlalchemy.orm import (sessionmaker, scoped_session, relationship,
                             column_property, aliased)
-from sqlalchemy.orm.exc import NoResultFound, FlushError
+from sqlalchemy.orm.exc import NoResultFound, FlushError, StaleDataError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.sql import and_, or_
 from sqlalchemy import select, func, exists, case, literal_column, union_all
 from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy import event
+from collections import OrderedDict
 from uuid import uuid4
 from .dbutil import _temp_alembic_ini
-from typing import List, Any, Optional, Union
+from typing import List, Any, Optional, Union, Tuple
 from .auth import Authenticator
 
 Base = declarative_base()
@@ -44,6 +53,10 @@ class MissingEntry(ValueError):
     pass
 
 
+class StaleEntry(ValueError):
+    pass
+
+
 class Assignment(Base):
     """Database representation of the master/source version of an assignment."""
 
@@ -817,6 +830,12 @@ class Grade(Base):
     #: Whether a score needs to be assigned manually. This is True by default.
     needs_manual_grade = Column(Boolean, default=True, nullable=False)
 
+    #: Version counter of the grade, incremented each time the grade is
+    #: updated. Used to detect concurrent modifications.
+    version = Column(Integer, nullable=False)
+
+    __mapper_args__ = {"version_id_col": version}
+
     #: The overall score, computed automatically from the
     #: :attr:`~nbgrader.api.Grade.auto_score` and :attr:`~nbgrader.api.Grade.manual_score`
     #: values. If neither are set, the score is zero. If both are set, then the
@@ -867,7 +886,8 @@ class Grade(Base):
             "max_score": self.max_score,
             "needs_manual_grade": self.needs_manual_grade,
             "failed_tests": self.failed_tests,
-            "cell_type": self.cell_type
+            "cell_type": self.cell_type,
+            "version": self.version
         }
 
     def __repr__(self):
@@ -942,6 +962,12 @@ class Comment(Base):
     #: A comment which is assigned manually
     manual_comment = Column(Text())
 
+    #: Version counter of the comment, incremented each time the comment is
+    #: updated. Used to detect concurrent modifications.
+    version = Column(Integer, nullable=False)
+
+    __mapper_args__ = {"version_id_col": version}
+
     #: The overall comment, computed automatically from the
     #: :attr:`~nbgrader.api.Comment.auto_comment` and
     #: :attr:`~nbgrader.api.Comment.manual_comment` values. If neither are set,
@@ -971,7 +997,8 @@ class Comment(Base):
             "assignment": self.assignment.name,
             "student": self.student.id,
             "auto_comment": self.auto_comment,
-            "manual_comment": self.manual_comment
+            "manual_comment": self.manual_comment,
+            "version": self.version
         }
 
     def __repr__(self):
@@ -989,6 +1016,22 @@ class Course(Base):
     def __repr__(self):
         return "Course<{}>".format(self.id)
 
+
+class Revision(Base):
+    """Table to store the revision of the gradebook, which is incremented
+    every time anything in the gradebook is modified."""
+
+    __tablename__ = "revision"
+
+    #: Unique id of the gradebook database (automatically generated)
+    id = Column(String(32), primary_key=True, default=new_uuid)
+
+    #: Number of times the gradebook has been modified
+    value = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return "Revision<{}>".format(self.value)
+
 ## Needs manual grade
 
 SubmittedNotebook.needs_manual_grade = column_property(
@@ -1319,6 +1362,100 @@ SubmittedAssignment.late_submission_penalty = column_property(
     .correlate_except(SubmittedNotebook), deferred=True)
 
 
+#: Statements which modify the gradebook
+_write_statements = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def _track_writes(session, transaction, connection):
+    """Note when anything is written to the database in a transaction of the
+    session, whether through the ORM, bulk updates or raw SQL."""
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:7].upper().startswith(_write_statements):
+            session.info["modified"] = True
+
+    event.listen(connection, "before_cursor_execute", before_cursor_execute)
+
+
+def _increment_revision(session):
+    """Increment the gradebook revision once a transaction that modified the
+    gradebook has been committed.
+
+    This is done in a separate transaction, so that the revision counter is
+    only locked for as long as it takes to increment it, rather than for the
+    whole of every transaction that writes to the gradebook.
+
+    """
+    if not session.info.pop("modified", False):
+        return
+
+    table = Revision.__table__
+    with session.get_bind().begin() as connection:
+        connection.execute(table.update().values(value=table.c.value + 1))
+
+
+def _reset_modified(session):
+    """Forget about anything having been written once the transaction is
+    rolled back."""
+    session.info.pop("modified", None)
+
+
+def _has_uncommitted_changes(session) -> bool:
+    """Whether a session has changes which are not committed yet, whether or
+    not they have been flushed."""
+    return bool(
+        session.new or session.dirty or session.deleted
+        or session.info.get("modified"))
+
+
+#: Results of :func:`cached_by_revision` methods, keyed by gradebook,
+#: method and arguments
+_revision_cache = OrderedDict()  # type: OrderedDict
+
+#: Maximum number of results kept in the revision cache
+_revision_cache_size = 64
+
+#: Lock for the revision cache, which is shared by the gradebooks of all
+#: threads
+_revision_cache_lock = threading.Lock()
+
+
+def cached_by_revision(func):
+    """Cache the result of a :class:`~nbgrader.api.Gradebook` method until
+    the revision of the gradebook changes. The result must not contain any
+    database objects, as it is shared between gradebook instances; callers
+    get a copy of it, so they are free to modify it.
+
+    Results are neither cached nor taken from the cache while the session of
+    the gradebook has uncommitted changes, as they could be rolled back after
+    being cached under the revision that the next commit gets.
+
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args):
+        if _has_uncommitted_changes(self.db()):
+            return func(self, *args)
+
+        db_id, revision = self.revision_key
+        key = (db_id, func.__name__) + args
+        with _revision_cache_lock:
+            cached = _revision_cache.get(key)
+            if cached is not None and cached[0] == revision:
+                _revision_cache.move_to_end(key)
+
+        if cached is None or cached[0] != revision:
+            # computed outside of the lock, as it queries the database
+            cached = (revision, func(self, *args))
+            with _revision_cache_lock:
+                _revision_cache[key] = cached
+                _revision_cache.move_to_end(key)
+                while len(_revision_cache) > _revision_cache_size:
+                    _revision_cache.popitem(last=False)
+
+        return copy.deepcopy(cached[1])
+
+    return wrapper
+
+
 class Gradebook(object):
     """The gradebook object to interface with the database holding
     nbgrader grades.
@@ -1328,7 +1465,9 @@ class Gradebook(object):
     def __init__(self,
                  db_url: str,
                  course_id: str = "default_course",
-                 authenticator: Optional[Authenticator] = None):
+                 authenticator: Optional[Authenticator] = None,
+                 engine: Optional[Engine] = None,
+                 initialize: bool = True):
         """Initialize the connection to the database.
 
         Parameters
@@ -1341,12 +1480,38 @@ class Gradebook(object):
         authenticator:
             An authenticator instance for communicating with an external
             database.
+        engine:
+            (Optional) An existing engine for ``db_url`` to use instead of
+            creating a new one, e.g. from a :class:`GradebookFactory`. The
+            engine is not disposed of when the gradebook is closed.
+        initialize:
+            Whether to create the tables, the revision counter and the course
+            if they don't exist yet. This can be skipped if it has already
+            been done through the same engine, as :class:`GradebookFactory`
+            does.
 
         """
         # create the connection to the database
-        self.engine = create_engine(db_url, echo=False)
-        self.db = scoped_session(sessionmaker(autoflush=True, bind=self.engine))
+        if engine is None:
+            self.engine = create_engine(db_url, echo=False)
+            self._owns_engine = True
+        else:
+            self.engine = engine
+            self._owns_engine = False
+        session_factory = sessionmaker(autoflush=True, bind=self.engine)
+        event.listen(session_factory, "after_begin", _track_writes)
+        event.listen(session_factory, "after_commit", _increment_revision)
+        event.listen(session_factory, "after_rollback", _reset_modified)
+        self.db = scoped_session(session_factory)
+        self.course_id = course_id
+        self.authenticator = authenticator
+
+        if initialize:
+            self._initialize_database()
 
+    def _initialize_database(self) -> None:
+        """Create the tables, the revision counter and the course if they
+        don't exist yet."""
         # this creates all the tables in the database if they don't already exist
         db_exists = len(self.engine.table_names()) > 0
         Base.metadata.create_all(bind=self.engine)
@@ -1358,9 +1523,12 @@ class Gradebook(object):
             self.db.execute("INSERT INTO alembic_version (version_num) VALUES ('{}');".format(alembic_version))
             self.db.commit()
 
-        self.check_course(course_id=course_id)
-        self.course_id = course_id
-        self.authenticator = authenticator
+        # make sure there is a revision counter
+        if self.db.query(Revision).first() is None:
+            self.db.add(Revision())
+            self.db.commit()
+
+        self.check_course(course_id=self.course_id)
 
     def __enter__(self) -> 'Gradebook':
         return self
@@ -1378,7 +1546,21 @@ class Gradebook(object):
 
         """
         self.db.remove()
-        self.engine.dispose()
+        if self._owns_engine:
+            self.engine.dispose()
+
+    @property
+    def revision(self) -> int:
+        """The number of times the gradebook has been modified. This can be
+        used to check whether anything has changed since the gradebook was
+        last read."""
+        return self.revision_key[1]
+
+    @property
+    def revision_key(self) -> Tuple[str, int]:
+        """A tuple of the unique id of the gradebook database and its current
+        revision, suitable for use as a cache key."""
+        return self.db.query(Revision.id, Revision.value).one()
 
     def check_course(self, course_id: str = "default_course", **kwargs: dict) -> Course:
         """Set the course id
@@ -2709,6 +2891,122 @@ class Gradebook(object):
 
         return comment
 
+    def _find_for_update(self, cls, updates):
+        """Load all the entries of type ``cls`` referenced by a list of updates
+        with a single query, checking that they exist and that their version
+        (if given) is the current one."""
+        ids = [update.get("id") for update in updates]
+        if len(set(ids)) != len(ids):
+            raise InvalidEntry("Duplicate {} ids in batch update".format(cls.__tablename__))
+
+        entries = {}
+        if len(ids) > 0:
+            for entry in self.db.query(cls).filter(cls.id.in_(ids)).all():
+                entries[entry.id] = entry
+
+        for update in updates:
+            entry = entries.get(update.get("id"))
+            if entry is None:
+                raise MissingEntry("No such {}: {}".format(cls.__tablename__, update.get("id")))
+            version = update.get("version")
+            if version is not None and version != entry.version:
+                raise StaleEntry("{} {} has been modified (version is {}, expected {})".format(
+                    cls.__tablename__, entry.id, entry.version, version))
+
+        return [entries[x] for x in ids]
+
+    def update_grades_and_comments(self,
+                                   grades: List[dict] = None,
+                                   comments: List[dict] = None
+                                   ) -> Tuple[List[Grade], List[Comment]]:
+        """Update the manually assigned scores and comments of many grades and
+        comments at once. All updates are validated first, and then applied
+        in a single transaction: either all of them are saved, or none are.
+
+        Each update is a dictionary with the ``id`` of the grade or comment,
+        and the new values of ``manual_score`` and/or ``extra_credit`` (for
+        grades) or ``manual_comment`` (for comments). Keys which are not
+        present are left unchanged.
+
+        If an update includes a ``version``, it must match the current
+        version of the grade or comment, as given by
+        :func:`~nbgrader.api.Grade.to_dict`. This makes sure that changes
+        made by another grader in the meantime are not silently overwritten.
+
+        Parameters
+        ----------
+        grades:
+            a list of updates for :class:`~nbgrader.api.Grade` objects
+        comments:
+            a list of updates for :class:`~nbgrader.api.Comment` objects
+
+        Returns
+        -------
+        grades, comments
+            the updated grades and comments, in the same order as the updates
+
+        """
+        grades = list(grades or [])
+        comments = list(comments or [])
+
+        # validate the new values before touching anything
+        for update in grades + comments:
+            if not isinstance(update, dict) or "id" not in update:
+                raise InvalidEntry("Invalid update: {}".format(update))
+
+        grade_values = []
+        for update in grades:
+            values = {}
+            for key in ("manual_score", "extra_credit"):
+                if key not in update:
+                    continue
+                value = update[key]
+                if value is not None:
+                    try:
+                        value = float(value)
+                    except (TypeError, ValueError):
+                        raise InvalidEntry("Invalid {} for grade {}: {}".format(
+                            key, update.get("id"), value))
+                values[key] = value
+            grade_values.append(values)
+
+        comment_values = []
+        for update in comments:
+            values = {}
+            if "manual_comment" in update:
+                value = update["manual_comment"]
+                if value is not None and not isinstance(value, str):
+                    raise InvalidEntry("Invalid manual_comment for comment {}: {}".format(
+                        update.get("id"), value))
+                values["manual_comment"] = value
+            comment_values.append(values)
+
+        db_grades = self._find_for_update(Grade, grades)
+        db_comments = self._find_for_update(Comment, comments)
+
+        for grade, values in zip(db_grades, grade_values):
+            for attr in values:
+                setattr(grade, attr, values[attr])
+            if grade.manual_score is None and grade.auto_score is None:
+                grade.needs_manual_grade = True
+            else:
+                grade.needs_manual_grade = False
+
+        for comment, values in zip(db_comments, comment_values):
+            for attr in values:
+                setattr(comment, attr, values[attr])
+
+        try:
+            self.db.commit()
+        except StaleDataError as e:
+            self.db.rollback()
+            raise StaleEntry(*e.args)
+        except (IntegrityError, FlushError) as e:
+            self.db.rollback()
+            raise InvalidEntry(*e.args)
+
+        return db_grades, db_comments
+
     def average_assignment_score(self, assignment_id):
         """Compute the average score for an assignment.
 
@@ -2951,6 +3249,7 @@ class Gradebook(object):
                 TaskCell.cell_type == "markdown")).scalar()
         return score_sum / notebook.num_submissions
 
+    @cached_by_revision
     def student_dicts(self):
         """Returns a list of dictionaries containing student data. Equivalent
         to calling :func:`~nbgrader.api.Student.to_dict` for each student,
@@ -2998,6 +3297,7 @@ class Gradebook(object):
             students = [s.to_dict() for s in self.students]
             return students
 
+    @cached_by_revision
     def submission_dicts(self, assignment_id):
         """Returns a list of dictionaries containing submission data. Equivalent
         to calling :func:`~nbgrader.api.SubmittedAssignment.to_dict` for each
@@ -3015,6 +3315,30 @@ class Gradebook(object):
             A list of dictionaries, one per submitted assignment
 
         """
+        return self._submission_dicts(Assignment.name == assignment_id)
+
+    @cached_by_revision
+    def student_submission_dicts(self, student_id):
+        """Returns a list of dictionaries containing data about all the
+        submissions of a student. Equivalent to calling
+        :func:`~nbgrader.api.SubmittedAssignment.to_dict` for each of the
+        student's submissions, except that this method is implemented using
+        proper SQL joins and is much faster.
+
+        Parameters
+        ----------
+        student_id : string
+            the unique id of the student
+
+        Returns
+        -------
+        submissions : list
+            A list of dictionaries, one per submitted assignment
+
+        """
+        return self._submission_dicts(Student.id == student_id)
+
+    def _submission_dicts(self, condition):
         # subquery the code scores
         code_scores = self.db.query(
             SubmittedAssignment.id.label("id"),
@@ -3120,7 +3444,7 @@ class Gradebook(object):
          .outerjoin(manual_grade, SubmittedAssignment.id == manual_grade.c.id)\
          .outerjoin(total_scores, SubmittedAssignment.id == total_scores.c.id)\
          .filter(and_(
-             Assignment.name == assignment_id,
+             condition,
              Student.id == SubmittedAssignment.student_id,
              SubmittedAssignment.id == SubmittedNotebook.assignment_id,
              SubmittedNotebook.id == Grade.notebook_id,
@@ -3144,6 +3468,7 @@ class Gradebook(object):
         ]
         return [dict(zip(keys, x)) for x in assignments]
 
+    @cached_by_revision
     def notebook_submission_dicts(self, notebook_id, assignment_id):
         """Returns a list of dictionaries containing submission data. Equivalent
         to calling :func:`~nbgrader.api.SubmittedNotebook.to_dict` for each
@@ -3316,3 +3641,123 @@ class Gradebook(object):
             "failed_tests", "flagged"
         ]
         return [dict(zip(keys, x)) for x in submissions]
+
+
+class GradebookFactory(object):
+    """Creates :class:`Gradebook` instances that share one engine, and
+    therefore one connection pool, per database URL. Creating a gradebook
+    from the factory is cheap, as it only opens a new session: the tables and
+    the course are only checked the first time a gradebook of a course is
+    created with an engine, and closing it returns the connection to the pool
+    rather than tearing down the engine.
+
+    The engine of a SQLite database is disposed of and replaced if the
+    database file is deleted or replaced (i.e. its inode changes), so that
+    pooled connections never point to the old file.
+
+    """
+
+    def __init__(self,
+                 pool_size: int = 5,
+                 max_overflow: int = 10,
+                 pool_recycle: int = 3600):
+        """Initialize the factory.
+
+        Parameters
+        ----------
+        pool_size:
+            Number of connections kept open to each database
+        max_overflow:
+            Number of connections that may be opened on top of ``pool_size``
+            when all of them are in use
+        pool_recycle:
+            Number of seconds after which a connection is replaced, so that
+            it is not closed from under us by the database server
+
+        """
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_recycle = pool_recycle
+        self._engines = {}  # type: dict
+        #: The identity of the database file of each engine, see _file_identity
+        self._identities = {}  # type: dict
+        #: The (database URL, course) pairs which have been initialized
+        self._initialized = set()  # type: set
+
+    @staticmethod
+    def _is_memory(db_url: str) -> bool:
+        url = make_url(db_url)
+        return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+    @staticmethod
+    def _file_identity(db_url: str) -> Optional[Tuple[int, int]]:
+        """Return the device and inode of the file of a SQLite database, or
+        None if it is not a SQLite database file or doesn't exist."""
+        url = make_url(db_url)
+        if url.get_backend_name() != "sqlite" or GradebookFactory._is_memory(db_url):
+            return None
+        try:
+            st = os.stat(url.database)
+        except OSError:
+            return None
+        return (st.st_dev, st.st_ino)
+
+    def _discard(self, db_url: str) -> None:
+        self._engines.pop(db_url).dispose()
+        self._identities.pop(db_url, None)
+        self._initialized = set(x for x in self._initialized if x[0] != db_url)
+
+    def engine(self, db_url: str) -> Engine:
+        """Get the engine for the given database URL, creating it if it does
+        not exist yet or if its database file has been replaced."""
+        if db_url in self._engines and self._identities[db_url] != self._file_identity(db_url):
+            self._discard(db_url)
+
+        if db_url not in self._engines:
+            url = make_url(db_url)
+            if self._is_memory(db_url):
+                # every connection to an in-memory database is a different
+                # database, so there is nothing to pool
+                engine = create_engine(db_url, echo=False)
+            else:
+                kwargs = {}
+                if url.get_backend_name() == "sqlite":
+                    # the pool makes sure a connection is only used by one
+                    # thread at a time
+                    kwargs["connect_args"] = {"check_same_thread": False}
+                engine = create_engine(
+                    db_url, echo=False, poolclass=QueuePool,
+                    pool_size=self.pool_size, max_overflow=self.max_overflow,
+                    pool_recycle=self.pool_recycle, pool_pre_ping=True,
+                    **kwargs)
+            self._engines[db_url] = engine
+            self._identities[db_url] = self._file_identity(db_url)
+        return self._engines[db_url]
+
+    def __call__(self,
+                 db_url: str,
+                 course_id: str = "default_course",
+                 authenticator: Optional[Authenticator] = None) -> Gradebook:
+        """Create a gradebook for the given database URL. It should be closed
+        after use, e.g. by using it as a context manager."""
+        engine = self.engine(db_url)
+        # every connection to an in-memory database is a new database
+        initialize = self._is_memory(db_url) or (db_url, course_id) not in self._initialized
+        gb = Gradebook(
+            db_url, course_id=course_id, authenticator=authenticator,
+            engine=engine, initialize=initialize)
+        if initialize:
+            self._initialized.add((db_url, course_id))
+            # the database file may only just have been created
+            self._identities[db_url] = self._file_identity(db_url)
+        return gb
+
+    def dispose(self) -> None:
+        """Close all the connections held by the factory."""
+        for db_url in list(self._engines):
+            self._discard(db_url)
+
+
+#: The factory shared by everything in this process that opens gradebooks
+#: repeatedly, such as :class:`~nbgrader.apps.api.NbGraderAPI`
+gradebook_factory = GradebookFactory()
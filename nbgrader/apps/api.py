@@ -11,7 +11,7 @@ from traitlets import Instance, Enum, Unicode, observe
 from ..coursedir import CourseDirectory
 from ..converters import GenerateAssignment, Autograde, GenerateFeedback
 from ..exchange import ExchangeList, ExchangeReleaseAssignment, ExchangeReleaseFeedback, ExchangeFetchFeedback, ExchangeCollect, ExchangeError, ExchangeSubmit
-from ..api import MissingEntry, Gradebook, Student, SubmittedAssignment
+from ..api import MissingEntry, Gradebook, Student, SubmittedAssignment, gradebook_factory
 from ..utils import parse_utc, temp_attrs, capture_log, as_timezone, to_numeric_tz
 from ..auth import Authenticator
 
@@ -105,10 +105,12 @@ class NbGraderAPI(LoggingConfigurable):
 
         Note that each time this property is accessed, a new gradebook is
         created. The user is responsible for destroying the gradebook through
-        :func:`~nbgrader.api.Gradebook.close`.
+        :func:`~nbgrader.api.Gradebook.close`. Gradebooks for the same
+        database share a connection pool (see
+        :class:`~nbgrader.api.GradebookFactory`), so this is cheap.
 
         """
-        return Gradebook(self.coursedir.db_url, self.course_id)
+        return gradebook_factory(self.coursedir.db_url, self.course_id)
 
     def get_source_assignments(self):
         """Get the names of all assignments in the `source` directory.
@@ -208,6 +210,47 @@ class NbGraderAPI(LoggingConfigurable):
 
         return students
 
+    def get_submitted_assignments(self, student_id):
+        """Get the names of the assignments that a given student has submitted
+        (determined by whether or not a submission exists in the `submitted`
+        directory).
+
+        Arguments
+        ---------
+        student_id: string
+            The unique id of the student
+
+        Returns
+        -------
+        assignments: set
+            A set of assignment names
+
+        """
+        # get the names of all the student's submissions in the `submitted` directory
+        filenames = glob.glob(self.coursedir.format_path(
+            self.coursedir.submitted_directory,
+            student_id=student_id,
+            assignment_id='*'))
+
+        regex = self.coursedir.format_path(
+            self.coursedir.submitted_directory,
+            student_id=re.escape(student_id),
+            assignment_id='(?P<assignment_id>.*)',
+            escape=True)
+
+        assignments = set([])
+        for filename in filenames:
+            # skip files that aren't directories
+            if not os.path.isdir(filename):
+                continue
+
+            # parse out the assignment name
+            matches = re.match(regex, filename)
+            if matches:
+                assignments.add(matches.groupdict()['assignment_id'])
+
+        return assignments
+
     def get_submitted_timestamp(self, assignment_id, student_id):
         """Gets the timestamp of a submitted assignment.
 
@@ -262,25 +305,27 @@ class NbGraderAPI(LoggingConfigurable):
 
         students = set([])
         for student_id in ag_students:
-            # skip files that aren't directories
-            filename = self.coursedir.format_path(
-                self.coursedir.autograded_directory,
-                student_id=student_id,
-                assignment_id=assignment_id)
-            if not os.path.isdir(filename):
-                continue
-
-            # get the timestamps and check whether the submitted timestamp is
-            # newer than the autograded timestamp
-            submitted_timestamp = self.get_submitted_timestamp(assignment_id, student_id)
-            autograded_timestamp = ag_timestamps[student_id]
-            if submitted_timestamp != autograded_timestamp:
-                continue
-
-            students.add(student_id)
+            if self._is_autograded(assignment_id, student_id, ag_timestamps[student_id]):
+                students.add(student_id)
 
         return students
 
+    def _is_autograded(self, assignment_id, student_id, autograded_timestamp):
+        """Check whether a submission that is in the database has an up to
+        date autograded version, given its timestamp in the database."""
+        # skip files that aren't directories
+        filename = self.coursedir.format_path(
+            self.coursedir.autograded_directory,
+            student_id=student_id,
+            assignment_id=assignment_id)
+        if not os.path.isdir(filename):
+            return False
+
+        # get the timestamps and check whether the submitted timestamp is
+        # newer than the autograded timestamp
+        submitted_timestamp = self.get_submitted_timestamp(assignment_id, student_id)
+        return submitted_timestamp == autograded_timestamp
+
     def get_assignment(self, assignment_id, released=None):
         """Get information about an assignment given its name.
 
@@ -487,39 +532,8 @@ class NbGraderAPI(LoggingConfigurable):
             students = {x['id']: x for x in self.get_students()}
 
         if student_id in ungraded:
-            ts = self.get_submitted_timestamp(assignment_id, student_id)
-            if ts:
-                timestamp = ts.isoformat()
-                display_timestamp = as_timezone(ts, self.timezone).strftime(self.timestamp_format)
-            else:
-                timestamp = None
-                display_timestamp = None
-
-            submission = {
-                "id": None,
-                "name": assignment_id,
-                "timestamp": timestamp,
-                "display_timestamp": display_timestamp,
-                "score": 0.0,
-                "max_score": 0.0,
-                "code_score": 0.0,
-                "max_code_score": 0.0,
-                "written_score": 0.0,
-                "max_written_score": 0.0,
-                "task_score": 0.0,
-                "max_task_score": 0.0,
-                "needs_manual_grade": False,
-                "autograded": False,
-                "submitted": True,
-                "student": student_id,
-            }
-
-            if student_id not in students:
-                submission["last_name"] = None
-                submission["first_name"] = None
-            else:
-                submission["last_name"] = students[student_id]["last_name"]
-                submission["first_name"] = students[student_id]["first_name"]
+            submission = self._unautograded_submission(
+                assignment_id, student_id, students.get(student_id), True)
 
         elif student_id in autograded:
             with self.gradebook as gb:
@@ -539,31 +553,65 @@ class NbGraderAPI(LoggingConfigurable):
             submission["submitted"] = True
 
         else:
-            submission = {
-                "id": None,
-                "name": assignment_id,
-                "timestamp": None,
-                "display_timestamp": None,
-                "score": 0.0,
-                "max_score": 0.0,
-                "code_score": 0.0,
-                "max_code_score": 0.0,
-                "written_score": 0.0,
-                "max_written_score": 0.0,
-                "task_score": 0.0,
-                "max_task_score": 0.0,
-                "needs_manual_grade": False,
-                "autograded": False,
-                "submitted": False,
-                "student": student_id,
-            }
+            submission = self._unautograded_submission(
+                assignment_id, student_id, students.get(student_id), False)
 
-            if student_id not in students:
-                submission["last_name"] = None
-                submission["first_name"] = None
-            else:
-                submission["last_name"] = students[student_id]["last_name"]
-                submission["first_name"] = students[student_id]["first_name"]
+        return submission
+
+    def _unautograded_submission(self, assignment_id, student_id, student, submitted):
+        """Get information about a submission that has not been autograded.
+
+        Arguments
+        ---------
+        assignment_id: string
+            The name of the assignment
+        student_id: string
+            The student's id
+        student: dict
+            A dictionary containing information about the student, or None
+            if the student is not in the database
+        submitted: bool
+            Whether the student has submitted the assignment
+
+        Returns
+        -------
+        submission: dict
+            A dictionary containing information about the submission
+
+        """
+        timestamp = None
+        display_timestamp = None
+        if submitted:
+            ts = self.get_submitted_timestamp(assignment_id, student_id)
+            if ts:
+                timestamp = ts.isoformat()
+                display_timestamp = as_timezone(ts, self.timezone).strftime(self.timestamp_format)
+
+        submission = {
+            "id": None,
+            "name": assignment_id,
+            "timestamp": timestamp,
+            "display_timestamp": display_timestamp,
+            "score": 0.0,
+            "max_score": 0.0,
+            "code_score": 0.0,
+            "max_code_score": 0.0,
+            "written_score": 0.0,
+            "max_written_score": 0.0,
+            "task_score": 0.0,
+            "max_task_score": 0.0,
+            "needs_manual_grade": False,
+            "autograded": False,
+            "submitted": submitted,
+            "student": student_id,
+        }
+
+        if student is None:
+            submission["last_name"] = None
+            submission["first_name"] = None
+        else:
+            submission["last_name"] = student["last_name"]
+            submission["first_name"] = student["first_name"]
 
         return submission
 
@@ -732,15 +780,17 @@ class NbGraderAPI(LoggingConfigurable):
             the student does not exist
 
         """
-        if submitted is None:
-            submitted = self.get_submitted_students("*")
-
         try:
             with self.gradebook as gb:
                 student = gb.find_student(student_id).to_dict()
 
         except MissingEntry:
-            if student_id in submitted:
+            if submitted is not None:
+                has_submitted = student_id in submitted
+            else:
+                has_submitted = len(self.get_submitted_assignments(student_id)) > 0
+
+            if has_submitted:
                 student = {
                     "id": student_id,
                     "last_name": None,
@@ -799,10 +849,33 @@ class NbGraderAPI(LoggingConfigurable):
             submissions
 
         """
+        with self.gradebook as gb:
+            db_submissions = {x["name"]: x for x in gb.student_submission_dicts(student_id)}
+            try:
+                student = gb.find_student(student_id)
+                student = {"first_name": student.first_name, "last_name": student.last_name}
+            except MissingEntry:
+                student = None
+
+        submitted = self.get_submitted_assignments(student_id)
+
         # return just an empty list if the student doesn't exist
         submissions = []
         for assignment_id in self.get_source_assignments():
-            submission = self.get_submission(assignment_id, student_id)
+            submission = db_submissions.get(assignment_id, None)
+            if submission and self._is_autograded(assignment_id, student_id, submission["timestamp"]):
+                ts = submission["timestamp"]
+                if ts:
+                    submission["timestamp"] = ts.isoformat()
+                    submission["display_timestamp"] = as_timezone(
+                        ts, self.timezone).strftime(self.timestamp_format)
+                else:
+                    submission["display_timestamp"] = None
+                submission["autograded"] = True
+                submission["submitted"] = True
+            else:
+                submission = self._unautograded_submission(
+                    assignment_id, student_id, student, assignment_id in submitted)
             submissions.append(submission)
 
         submissions.sort(key=lambda x: x["name"])
@@ -20,6 +20,10 @@ flags.update({
         {'ExchangeCollect' : {'update': True}},
         "Update existing submissions with ones that have newer timestamps."
     ),
+    'delta': (
+        {'ExchangeCollect' : {'delta': True}},
+        "When updating submissions, only copy the files that changed."
+    ),
 })
 
 class CollectApp(NbGrader):
@@ -59,6 +63,11 @@ class CollectApp(NbGrader):
         flag:
 
             nbgrader collect --update assignment1
+
+        To only copy the files that changed when updating submissions (which is
+        much faster for submissions with large files that rarely change):
+
+            nbgrader collect --update --delta assignment1
         """
 
     @default("classes")
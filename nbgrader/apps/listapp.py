@@ -32,6 +32,10 @@ flags.update({
         {'ExchangeList' : {'as_json': True}},
         "Print out assignments as json."
     ),
+    'rebuild-index': (
+        {'ExchangeList' : {'rebuild_index': True}},
+        "Rebuild the index of inbound submissions from the inbound directory."
+    ),
 })
 
 class ListApp(NbGrader):
@@ -86,6 +90,13 @@ class ListApp(NbGrader):
         `--remove` flag:
 
             nbgrader list --inbound --remove --student=student1
+
+        If there are many submissions, looking them up in the inbound directory
+        can be slow. To instead keep an index of the submissions, which is
+        only read by the instructor and is updated from the inbound directory
+        whenever a submission has been added or removed, create it with:
+
+            nbgrader list --inbound --rebuild-index
         """
 
     @default("classes")
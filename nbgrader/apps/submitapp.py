@@ -20,6 +20,10 @@ flags.update({
         {'ExchangeSubmit': {'strict': True}},
         "Fail if the submission is missing notebooks for the assignment"
     ),
+    'packed': (
+        {'ExchangeSubmit': {'packed': True}},
+        "Submit the assignment as a single compressed archive"
+    ),
 })
 
 
@@ -62,6 +66,11 @@ class SubmitApp(NbGrader):
         it to try to cheat and fake a submission from another student:
         your actual student id can be recovered from the file ownership,
         leaving behind a big trace leading to you.
+
+        If your instructor asks for it, the assignment can be submitted as a
+        single compressed archive, which is faster for large assignments:
+
+            nbgrader submit assignment1 --packed
     """
 
     @default("classes")
@@ -3,12 +3,13 @@
 import os
 import traceback
 
-from nbformat import current_nbformat, read as orig_read, write as orig_write
+from nbformat import current_nbformat
 from traitlets import Bool
 
 from .baseapp import NbGrader
-from ..nbgraderformat import MetadataValidator, write, ValidationError, SchemaTooNewError
+from ..nbgraderformat import MetadataValidator, ValidationError, SchemaTooNewError
 from ..utils import find_all_notebooks
+from ..notebookio import read as read_nb, write as write_nb
 
 aliases = {
     'log-level': 'Application.log_level',
@@ -74,11 +75,11 @@ class UpdateApp(NbGrader):
         notebooks = sorted(list(notebooks))
         for notebook in notebooks:
             self.log.info("Updating metadata for notebook: {}".format(notebook))
-            nb = orig_read(notebook, current_nbformat)
+            nb = read_nb(notebook, current_nbformat)
             nb = MetadataValidator().upgrade_notebook_metadata(nb)
             if self.validate:
                 try:
-                    write(nb, notebook)
+                    MetadataValidator().validate_nb(nb)
                 except ValidationError:
                     self.log.error(traceback.format_exc())
                     self.fail("Notebook '{}' failed to validate, metadata is corrupted".format(notebook))
@@ -89,6 +90,6 @@ class UpdateApp(NbGrader):
                         "of the nbgrader metadata format. Please update your version of "
                         "nbgrader to the latest version to be able to use this notebook."
                     ).format(notebook))
-            else:
-                orig_write(nb, notebook)
+            # these are the instructor's (or students') own notebooks
+            write_nb(nb, notebook, stamp=False)
 
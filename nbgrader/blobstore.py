@@ -0,0 +1,73 @@
+import os
+import uuid
+import hashlib
+
+from nbformat.notebooknode import NotebookNode
+from typing import Dict
+
+
+class BlobStore(object):
+    """Content-addressed store for large cell outputs, shared by all the
+    submissions of a course.
+
+    Each blob is stored under the SHA-256 hash of its contents, so that an
+    output that is identical across students (e.g. the same plot) is only
+    stored once. Blobs are never modified once written, and are written to a
+    temporary file first and then renamed into place, so that readers never
+    see a partial blob even if several autograders write the same one.
+
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def is_digest(digest: str) -> bool:
+        return len(digest) == 64 and all(c in "0123456789abcdef" for c in digest)
+
+    def path(self, digest: str) -> str:
+        """Returns the path of the blob with the given digest."""
+        if not self.is_digest(digest):
+            raise ValueError("Invalid blob digest: {}".format(digest))
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def __contains__(self, digest: str) -> bool:
+        return os.path.isfile(self.path(digest))
+
+    def put(self, data: bytes) -> str:
+        """Stores the data, if it isn't stored already, and returns its
+        digest."""
+        digest = self.digest(data)
+        path = self.path(digest)
+        if os.path.isfile(path):
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+        try:
+            with open(tmp, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """Returns the data of the blob with the given digest. Raises
+        :class:`FileNotFoundError` if there is no such blob."""
+        with open(self.path(digest), "rb") as fh:
+            return fh.read()
+
+
+def blob_references(output: NotebookNode) -> Dict[str, str]:
+    """Returns the blobs referenced by an output, as a dictionary of mimetypes
+    to digests. Outputs that were not moved into a blob store return an empty
+    dictionary."""
+    return output.get("metadata", {}).get("nbgrader", {}).get("blobs", {})
+
@@ -1,15 +1,19 @@
 import os
 import shutil
+import typing
 
 from textwrap import dedent
 from traitlets import Bool, List, Dict
+from traitlets.config import Config
 
 from .base import BaseConverter, NbGraderException
 from ..preprocessors import (
     AssignLatePenalties, ClearOutput, DeduplicateIds, OverwriteCells, SaveAutoGrades,
-    Execute, LimitOutput, OverwriteKernelspec, CheckCellMetadata)
+    Execute, LimitOutput, OverwriteKernelspec, CheckCellMetadata, ExternalizeOutputs)
 from ..api import Gradebook, MissingEntry
+from ..master import MasterAssignment, load_master_assignment
 from .. import utils
+from ..coursedir import CourseDirectory
 
 
 class Autograde(BaseConverter):
@@ -60,6 +64,7 @@ class Autograde(BaseConverter):
     autograde_preprocessors = List([
         Execute,
         LimitOutput,
+        ExternalizeOutputs,
         SaveAutoGrades,
         AssignLatePenalties,
         CheckCellMetadata
@@ -67,6 +72,28 @@ class Autograde(BaseConverter):
 
     preprocessors = List([])
 
+    def __init__(self, coursedir: CourseDirectory = None, **kwargs: typing.Any) -> None:
+        super(Autograde, self).__init__(coursedir=coursedir, **kwargs)
+        # the autograded notebooks are read back by autograde itself, the
+        # formgrader and generate_feedback, so they are stamped to be read
+        # faster
+        c = Config()
+        if 'stamp' not in self.config.NotebookIOExporter:
+            c.NotebookIOExporter.stamp = True
+        self.update_config(c)
+
+    def start(self) -> None:
+        # master version of each assignment, loaded once and shared by all
+        # the submissions of the run
+        self._masters = {}
+        super(Autograde, self).start()
+
+    def _get_master(self, assignment_id: str) -> MasterAssignment:
+        if assignment_id not in self._masters:
+            with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
+                self._masters[assignment_id] = load_master_assignment(gb, assignment_id)
+        return self._masters[assignment_id]
+
     def init_assignment(self, assignment_id: str, student_id: str) -> None:
         super(Autograde, self).init_assignment(assignment_id, student_id)
         # try to get the student from the database, and throw an error if it
@@ -90,13 +117,12 @@ class Autograde(BaseConverter):
                     raise NbGraderException(msg)
 
         # make sure the assignment exists
-        with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
-            try:
-                gb.find_assignment(assignment_id)
-            except MissingEntry:
-                msg = "No assignment with ID '%s' exists in the database" % assignment_id
-                self.log.error(msg)
-                raise NbGraderException(msg)
+        try:
+            master = self._get_master(assignment_id)
+        except MissingEntry:
+            msg = "No assignment with ID '%s' exists in the database" % assignment_id
+            self.log.error(msg)
+            raise NbGraderException(msg)
 
         # try to read in a timestamp from file
         src_path = self._format_source(assignment_id, student_id)
@@ -133,16 +159,12 @@ class Autograde(BaseConverter):
 
         # ignore notebooks that aren't in the database
         notebooks = []
-        with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
-            for notebook in self.notebooks:
-                notebook_id = os.path.splitext(os.path.basename(notebook))[0]
-                try:
-                    gb.find_notebook(notebook_id, assignment_id)
-                except MissingEntry:
-                    self.log.warning("Skipping unknown notebook: %s", notebook)
-                    continue
-                else:
-                    notebooks.append(notebook)
+        for notebook in self.notebooks:
+            notebook_id = os.path.splitext(os.path.basename(notebook))[0]
+            if notebook_id not in master.notebooks:
+                self.log.warning("Skipping unknown notebook: %s", notebook)
+                continue
+            notebooks.append(notebook)
         self.notebooks = notebooks
         if len(self.notebooks) == 0:
             msg = "No notebooks found, did you forget to run 'nbgrader generate_assignment'?"
@@ -151,21 +173,31 @@ class Autograde(BaseConverter):
 
         # check for missing notebooks and give them a score of zero if they
         # do not exist
-        with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
-            assignment = gb.find_assignment(assignment_id)
-            for notebook in assignment.notebooks:
-                path = os.path.join(self.coursedir.format_path(
-                    self.coursedir.submitted_directory,
-                    student_id,
-                    assignment_id), "{}.ipynb".format(notebook.name))
-                if not os.path.exists(path):
-                    self.log.warning("No submitted file: {}".format(path))
+        missing = []
+        for notebook_id in master.notebooks:
+            path = os.path.join(self.coursedir.format_path(
+                self.coursedir.submitted_directory,
+                student_id,
+                assignment_id), "{}.ipynb".format(notebook_id))
+            if not os.path.exists(path):
+                self.log.warning("No submitted file: {}".format(path))
+                missing.append(notebook_id)
+
+        if missing:
+            with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
+                for notebook_id in missing:
                     submission = gb.find_submission_notebook(
-                        notebook.name, assignment_id, student_id)
+                        notebook_id, assignment_id, student_id)
                     for grade in submission.grades:
                         grade.auto_score = 0
                         grade.needs_manual_grade = False
-                    gb.db.commit()
+                gb.db.commit()
+
+    def init_single_notebook_resources(self, notebook_filename: str) -> typing.Dict[str, typing.Any]:
+        resources = super(Autograde, self).init_single_notebook_resources(notebook_filename)
+        master = self._get_master(resources['nbgrader']['assignment'])
+        resources['nbgrader']['master'] = master.notebooks[resources['nbgrader']['notebook']]
+        return resources
 
     def _init_preprocessors(self) -> None:
         self.exporter._preprocessors = []
@@ -174,8 +206,7 @@ class Autograde(BaseConverter):
         else:
             preprocessors = self.autograde_preprocessors
 
-        for pp in preprocessors:
-            self.exporter.register_preprocessor(pp)
+        self._register_preprocessors(preprocessors)
 
     def convert_single_notebook(self, notebook_filename: str) -> None:
         self.log.info("Sanitizing %s", notebook_filename)
@@ -9,13 +9,15 @@ from traitlets.config import LoggingConfigurable, Config
 from traitlets import Bool, List, Dict, Integer, Instance, Type
 from traitlets import default
 from textwrap import dedent
-from nbconvert.exporters import Exporter, NotebookExporter
+from nbconvert.exporters import Exporter
 from nbconvert.writers import FilesWriter
 
 from ..coursedir import CourseDirectory
 from ..utils import find_all_files, rmtree, remove
 from ..preprocessors.execute import UnresponsiveKernelError
+from ..preprocessors.fused import fuse_preprocessors
 from ..nbgraderformat import SchemaTooOldError, SchemaTooNewError
+from ..notebookio import NotebookIOExporter
 import typing
 from nbconvert.exporters.exporter import ResourcesDict
 
@@ -30,7 +32,7 @@ class BaseConverter(LoggingConfigurable):
     assignments = Dict({})
     writer = Instance(FilesWriter)
     exporter = Instance(Exporter)
-    exporter_class = Type(NotebookExporter, klass=Exporter)
+    exporter_class = Type(NotebookIOExporter, klass=Exporter)
     preprocessors = List([])
 
     force = Bool(False, help="Whether to overwrite existing assignments/submissions").tag(config=True)
@@ -50,6 +52,18 @@ class BaseConverter(LoggingConfigurable):
     def _permissions_default(self) -> int:
         return 664 if self.coursedir.groupshared else 444
 
+    fuse_cell_preprocessors = Bool(
+        True,
+        help=dedent(
+            """
+            Whether consecutive preprocessors that only work on one cell at a
+            time share a single pass over the cells of each notebook, rather
+            than each going through all the cells in turn. The notebooks
+            produced are the same either way.
+            """
+        )
+    ).tag(config=True)
+
     coursedir = Instance(CourseDirectory, allow_none=True)
 
     def __init__(self, coursedir: CourseDirectory = None, **kwargs: typing.Any) -> None:
@@ -68,8 +82,7 @@ class BaseConverter(LoggingConfigurable):
         self.init_notebooks()
         self.writer = FilesWriter(parent=self, config=self.config)
         self.exporter = self.exporter_class(parent=self, config=self.config)
-        for pp in self.preprocessors:
-            self.exporter.register_preprocessor(pp)
+        self._register_preprocessors(self.preprocessors)
         currdir = os.getcwd()
         os.chdir(self.coursedir.root)
         try:
@@ -77,6 +90,15 @@ class BaseConverter(LoggingConfigurable):
         finally:
             os.chdir(currdir)
 
+    def _register_preprocessors(self, preprocessors: typing.List[typing.Any]) -> None:
+        """Add preprocessors to the exporter, fusing the cell-level ones if
+        :attr:`fuse_cell_preprocessors` is set."""
+        for pp in preprocessors:
+            self.exporter.register_preprocessor(pp)
+        if self.fuse_cell_preprocessors:
+            self.exporter._preprocessors = fuse_preprocessors(
+                self.exporter._preprocessors, parent=self.exporter)
+
     @default("classes")
     def _classes_default(self):
         classes = super(BaseConverter, self)._classes_default()
@@ -157,10 +179,11 @@ class BaseConverter(LoggingConfigurable):
         resources['nbgrader']['assignment'] = gd['assignment_id']
         resources['nbgrader']['notebook'] = gd['notebook_id']
         resources['nbgrader']['db_url'] = self.coursedir.db_url
+        resources['nbgrader']['blob_directory'] = self.coursedir.blob_directory
 
         return resources
 
-    def write_single_notebook(self, output: str, resources: ResourcesDict) -> None:
+    def write_single_notebook(self, output: typing.Union[str, bytes], resources: ResourcesDict) -> None:
         # configure the writer build directory
         self.writer.build_directory = self._format_dest(
             resources['nbgrader']['assignment'], resources['nbgrader']['student'])
@@ -6,7 +6,8 @@ from nbconvert.exporters import HTMLExporter
 from nbconvert.preprocessors import CSSHTMLHeaderPreprocessor
 
 from .base import BaseConverter
-from ..preprocessors import GetGrades
+from ..notebookio import NotebookIOHTMLExporter
+from ..preprocessors import GetGrades, ResolveOutputs
 
 
 class GenerateFeedback(BaseConverter):
@@ -20,6 +21,7 @@ class GenerateFeedback(BaseConverter):
         return self.coursedir.feedback_directory
 
     preprocessors = List([
+        ResolveOutputs,
         GetGrades,
         CSSHTMLHeaderPreprocessor
     ])
@@ -32,7 +34,7 @@ class GenerateFeedback(BaseConverter):
 
     @default("export_class")
     def _exporter_class_default(self):
-        return HTMLExporter
+        return NotebookIOHTMLExporter
 
     @default("permissions")
     def _permissions_default(self):
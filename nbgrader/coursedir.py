@@ -190,6 +190,21 @@ class CourseDirectory(LoggingConfigurable):
         return "sqlite:///{}".format(
             os.path.abspath(os.path.join(self.root, "gradebook.db")))
 
+    blob_directory = Unicode(
+        "",
+        help=dedent(
+            """
+            The directory of the content-addressed store that large outputs of
+            autograded notebooks are moved into when
+            `ExternalizeOutputs.enabled` is set. Defaults to <root>/blobs,
+            where <root> is another configurable variable.
+            """
+        )
+    ).tag(config=True)
+
+    @default("blob_directory")
+    def _blob_directory_default(self):
+        return os.path.abspath(os.path.join(self.root, "blobs"))
 
     root = Unicode(
         '',
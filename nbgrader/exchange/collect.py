@@ -1,14 +1,19 @@
 import os
-import glob
 import shutil
 import sys
+import logging
+import uuid
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from textwrap import dedent
 
-from traitlets import Bool
+from traitlets import Bool, Integer
 
 from .exchange import Exchange
-from ..utils import check_mode, parse_utc
+from .manifest import InboundManifest
+from .packed import PackedSubmission
+from .storage import is_staging
+from ..utils import parse_utc
 
 # pwd is for matching unix names with student ide, so we shouldn't import it on
 # windows machines
@@ -24,6 +29,36 @@ def groupby(l, key=lambda x: x):
     return d
 
 
+class BufferedLog(object):
+    """Stores log messages so that they can be emitted later, all together.
+    This keeps the output about each submission in one piece when several
+    submissions are collected at the same time."""
+
+    def __init__(self):
+        self.messages = []
+
+    def log(self, level, msg, *args):
+        self.messages.append((level, msg, args))
+
+    def debug(self, msg, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(logging.WARNING, msg, *args)
+
+    def error(self, msg, *args):
+        self.log(logging.ERROR, msg, *args)
+
+    def flush(self, log):
+        """Emit the stored messages to ``log``."""
+        for level, msg, args in self.messages:
+            log.log(level, msg, *args)
+        self.messages = []
+
+
 class ExchangeCollect(Exchange):
 
     update = Bool(
@@ -36,6 +71,40 @@ class ExchangeCollect(Exchange):
         help="Whether to cross-check the student_id with the UNIX-owner of the submitted directory."
     ).tag(config=True)
 
+    delta = Bool(
+        False,
+        help=dedent(
+            """
+            When updating a submission, only copy the files that are new or
+            have changed since it was last collected, and delete the files
+            that are no longer part of it, instead of copying the whole
+            submission again.
+            """
+        )
+    ).tag(config=True)
+
+    delta_checksum = Bool(
+        False,
+        help=dedent(
+            """
+            In delta mode, also compare the contents of files that have the
+            same size and modification time, rather than assuming they are
+            unchanged.
+            """
+        )
+    ).tag(config=True)
+
+    max_workers = Integer(
+        1,
+        help=dedent(
+            """
+            Number of submissions to collect at the same time. Collecting
+            several submissions concurrently can be much faster when the
+            exchange or the course directory is on a network filesystem.
+            """
+        )
+    ).tag(config=True)
+
     def _path_to_record(self, path):
         filename = os.path.split(path)[1]
         # Only split twice on +, giving three components. This allows usernames with +.
@@ -55,13 +124,19 @@ class ExchangeCollect(Exchange):
 
         self.course_path = os.path.join(self.root, self.coursedir.course_id)
         self.inbound_path = os.path.join(self.course_path, 'inbound')
-        if not os.path.isdir(self.inbound_path):
+        if not self.storage.isdir(self.inbound_path):
             self.fail("Course not found: {}".format(self.inbound_path))
-        if not check_mode(self.inbound_path, read=True, execute=True):
+        if not self.storage.access(self.inbound_path, read=True, execute=True):
             self.fail("You don't have read permissions for the directory: {}".format(self.inbound_path))
+        self.storage.clean_staging(self.inbound_path, self.staging_max_age)
         student_id = self.coursedir.student_id if self.coursedir.student_id else '*'
-        pattern = os.path.join(self.inbound_path, '{}+{}+*'.format(student_id, self.coursedir.assignment_id))
-        records = [self._path_to_record(f) for f in glob.glob(pattern)]
+        manifest = InboundManifest(self.course_path, groupshared=self.coursedir.groupshared)
+        if self.storage.local and manifest.available():
+            paths = manifest.glob(student_id, self.coursedir.assignment_id)
+        else:
+            pattern = os.path.join(self.inbound_path, '{}+{}+*'.format(student_id, self.coursedir.assignment_id))
+            paths = self.storage.glob(pattern)
+        records = [self._path_to_record(f) for f in paths if not is_staging(f)]
         usergroups = groupby(records, lambda item: item['username'])
         self.src_records = [self._sort_by_timestamp(v)[0] for v in usergroups.values()]
 
@@ -79,51 +154,111 @@ class ExchangeCollect(Exchange):
                 self.coursedir.assignment_id,
                 self.coursedir.course_id))
 
-        for rec in self.src_records:
-            student_id = rec['username']
-            src_path = os.path.join(self.inbound_path, rec['filename'])
-
-            # Cross check the student id with the owner of the submitted directory
-            if self.check_owner and pwd is not None: # check disabled under windows
-                try:
-                    owner = pwd.getpwuid(os.stat(src_path).st_uid).pw_name
-                except KeyError:
-                    owner = "unknown id"
-                if student_id != owner:
-                    self.log.warning(dedent(
-                        """
-                        {} claims to be submitted by {} but is owned by {}; cheating attempt?
-                        you may disable this warning by unsetting the option CollectApp.check_owner
-                        """).format(src_path, student_id, owner))
-
-            dest_path = self.coursedir.format_path(self.coursedir.submitted_directory, student_id, self.coursedir.assignment_id)
-            if not os.path.exists(os.path.dirname(dest_path)):
-                os.makedirs(os.path.dirname(dest_path))
-
-            copy = False
-            updating = False
-            if os.path.isdir(dest_path):
-                existing_timestamp = self.coursedir.get_existing_timestamp(dest_path)
-                new_timestamp = rec['timestamp']
-                if self.update and (existing_timestamp is None or new_timestamp > existing_timestamp):
-                    copy = True
-                    updating = True
-            else:
+        # the messages about each submission are emitted as soon as it has
+        # been collected, in one piece
+        failed = []
+
+        def collected(rec, log, error):
+            log.flush(self.log)
+            if error is not None:
+                failed.append(rec['username'])
+
+        if self.max_workers > 1 and len(self.src_records) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {
+                    executor.submit(self._collect_record, rec): rec
+                    for rec in self.src_records}
+                for future in as_completed(futures):
+                    collected(futures[future], *future.result())
+        else:
+            for rec in self.src_records:
+                collected(rec, *self._collect_record(rec))
+
+        if failed:
+            self.fail("Could not collect submissions of '{}' from: {}".format(
+                self.coursedir.assignment_id, ", ".join(sorted(failed))))
+
+    def _collect_record(self, rec):
+        """Collect a single submission. Returns the messages logged while
+        doing so, and the exception that stopped it, if any."""
+        log = BufferedLog()
+        try:
+            self._copy_record(rec, log)
+        except Exception as e:
+            log.error("Failed to collect submission: {} {}: {}".format(
+                rec['username'], self.coursedir.assignment_id, e))
+            return log, e
+        return log, None
+
+    def _copy_record(self, rec, log):
+        student_id = rec['username']
+        src_path = os.path.join(self.inbound_path, rec['filename'])
+
+        # Cross check the student id with the owner of the submitted directory
+        # check disabled under windows, and for storages without owners
+        if self.check_owner and pwd is not None and self.storage.local:
+            try:
+                owner = pwd.getpwuid(os.stat(src_path).st_uid).pw_name
+            except KeyError:
+                owner = "unknown id"
+            if student_id != owner:
+                log.warning(dedent(
+                    """
+                    {} claims to be submitted by {} but is owned by {}; cheating attempt?
+                    you may disable this warning by unsetting the option CollectApp.check_owner
+                    """).format(src_path, student_id, owner))
+
+        dest_path = self.coursedir.format_path(self.coursedir.submitted_directory, student_id, self.coursedir.assignment_id)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+
+        copy = False
+        updating = False
+        if os.path.isdir(dest_path):
+            existing_timestamp = self.coursedir.get_existing_timestamp(dest_path)
+            new_timestamp = rec['timestamp']
+            if self.update and (existing_timestamp is None or new_timestamp > existing_timestamp):
                 copy = True
+                updating = True
+        else:
+            copy = True
 
-            if copy:
-                if updating:
-                    self.log.info("Updating submission: {} {}".format(student_id, self.coursedir.assignment_id))
-                    shutil.rmtree(dest_path)
-                else:
-                    self.log.info("Collecting submission: {} {}".format(student_id, self.coursedir.assignment_id))
-                self.do_copy(src_path, dest_path)
+        if copy:
+            if updating:
+                log.info("Updating submission: {} {}".format(student_id, self.coursedir.assignment_id))
             else:
-                if self.update:
-                    self.log.info("No newer submission to collect: {} {}".format(
-                        student_id, self.coursedir.assignment_id
-                    ))
+                log.info("Collecting submission: {} {}".format(student_id, self.coursedir.assignment_id))
+
+            with self.storage.local_copy(src_path) as src_path:
+                packed = PackedSubmission.is_packed(src_path)
+                if updating and self.delta:
+                    if packed:
+                        # unpack next to the existing submission, and sync from there
+                        unpacked_path = "{}.unpack-{}".format(dest_path, uuid.uuid4().hex)
+                        try:
+                            self.do_unpack(src_path, unpacked_path, log=log)
+                            copied, deleted = self.do_sync(
+                                unpacked_path, dest_path, log=log, read_only=True,
+                                checksum=self.delta_checksum)
+                        finally:
+                            shutil.rmtree(unpacked_path, ignore_errors=True)
+                    else:
+                        copied, deleted = self.do_sync(
+                            src_path, dest_path, log=log, read_only=True,
+                            checksum=self.delta_checksum)
+                    log.debug("Copied {} and deleted {} files".format(copied, deleted))
                 else:
-                    self.log.info("Submission already exists, use --update to update: {} {}".format(
-                        student_id, self.coursedir.assignment_id
-                    ))
+                    if updating:
+                        shutil.rmtree(dest_path)
+                    if packed:
+                        self.do_unpack(src_path, dest_path, log=log)
+                    else:
+                        self.do_copy(src_path, dest_path, log=log, read_only=True)
+        else:
+            if self.update:
+                log.info("No newer submission to collect: {} {}".format(
+                    student_id, self.coursedir.assignment_id
+                ))
+            else:
+                log.info("Submission already exists, use --update to update: {} {}".format(
+                    student_id, self.coursedir.assignment_id
+                ))
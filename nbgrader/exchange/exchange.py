@@ -1,21 +1,171 @@
 import os
 import datetime
+import fnmatch
 import sys
 import shutil
 import glob
+import hashlib
 
+from stat import S_IWGRP, S_IWOTH
 from textwrap import dedent
 
 from dateutil.tz import gettz
 from dateutil.parser import parse
 from traitlets.config import LoggingConfigurable
-from traitlets import Unicode, Bool, Instance, Type, default, validate, TraitError
+from traitlets import Unicode, Bool, Enum, Instance, Integer, Type, default, validate, TraitError
 from jupyter_core.paths import jupyter_data_dir
 
+from .packed import PackedSubmission
+from .storage import ExchangeStorage, FileSystemStorage
 from ..utils import check_directory, ignore_patterns, self_owned
 from ..coursedir import CourseDirectory
 from ..auth import Authenticator
 
+# fcntl is only used for reflinks, which aren't available on windows
+if sys.platform != 'win32':
+    import fcntl
+else:
+    fcntl = None
+
+# ioctl request for cloning a file on linux (FICLONE from linux/fs.h)
+FICLONE = 0x40049409
+
+
+def reflink(src, dst):
+    """Make ``dst`` a copy-on-write clone of ``src``. Raises an
+    :class:`OSError` if the filesystem doesn't support it."""
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            os.remove(dst)
+            raise
+
+
+def is_linkable(path):
+    """Whether the file ``path`` can be hard linked into a copy that must not
+    change: it must be owned by the current user, and not be writable by
+    anyone else. In particular, submissions in the inbound directory are owned
+    by the students, who could otherwise still change the collected copy."""
+    if not hasattr(os, 'getuid'):
+        return False
+    st = os.stat(path)
+    return st.st_uid == os.getuid() and not st.st_mode & (S_IWGRP | S_IWOTH)
+
+
+def copy_tree(src, dest, exclude=None, include=None, max_file_size=None,
+              copy_function=shutil.copy2, fileperms=None, dirperms=None,
+              groupshared=False, log=None):
+    """
+    Copy the src dir to the new dest dir in a single pass, filtering files
+    and setting their final permissions as they are copied.
+
+    This is equivalent to :func:`shutil.copytree` with ``symlinks=True`` and
+    :func:`nbgrader.utils.ignore_patterns` as ``ignore``, followed by setting
+    the permissions of everything that was copied, but the directories are
+    only traversed once, and the file type and size of each entry comes from
+    :func:`os.scandir` rather than separate ``stat`` calls.
+
+    Arguments
+    ---------
+    exclude, include, max_file_size, log:
+        As for :func:`nbgrader.utils.ignore_patterns`
+    copy_function: callable
+        The function used to copy each file, as for :func:`shutil.copytree`
+    fileperms, dirperms: int or None
+        The permissions given to the copied files and directories (but not
+        symlinks). If they aren't given, files and directories keep the
+        permissions of the source, or are made group writable if
+        ``groupshared`` is True. Files must not be given permissions if
+        ``copy_function`` may hard link them.
+    """
+    os.makedirs(dest)
+    with os.scandir(src) as it:
+        entries = sorted(it, key=lambda x: x.name)
+
+    for entry in entries:
+        srcname = entry.path
+        dstname = os.path.join(dest, entry.name)
+        if exclude and any(fnmatch.fnmatch(entry.name, glob) for glob in exclude):
+            if log:
+                log.debug("Ignoring excluded file '{}' (see config option CourseDirectory.ignore)".format(srcname))
+            continue
+
+        if entry.is_file():
+            if include and not any(fnmatch.fnmatch(entry.name, glob) for glob in include):
+                if log:
+                    log.debug("Ignoring non included file '{}' (see config option CourseDirectory.include)".format(srcname))
+                continue
+            if max_file_size and entry.stat().st_size > 1000*max_file_size:
+                if log:
+                    log.warning("Ignoring file too large '{}' (see config option CourseDirectory.max_file_size)".format(srcname))
+                continue
+
+        if entry.is_symlink():
+            os.symlink(os.readlink(srcname), dstname)
+            shutil.copystat(srcname, dstname, follow_symlinks=False)
+        elif entry.is_dir():
+            copy_tree(srcname, dstname, exclude=exclude, include=include,
+                      max_file_size=max_file_size, copy_function=copy_function,
+                      fileperms=fileperms, dirperms=dirperms,
+                      groupshared=groupshared, log=log)
+        else:
+            copy_function(srcname, dstname)
+            if fileperms is not None:
+                os.chmod(dstname, fileperms)
+            elif groupshared:
+                _chmod_groupshared(dstname, entry.stat().st_mode, 0o660, 0o777, log)
+
+    shutil.copystat(src, dest)
+    if dirperms is not None:
+        os.chmod(dest, dirperms)
+    elif groupshared:
+        _chmod_groupshared(dest, os.stat(src).st_mode, 0o2770, 0o2777, log)
+
+
+def _chmod_groupshared(path, st_mode, perms, mask, log):
+    if st_mode & perms != perms:
+        try:
+            os.chmod(path, (st_mode|perms) & mask)
+        except PermissionError:
+            if log:
+                log.warning("Could not update permissions of %s to make it groupshared", path)
+
+
+def _remove(path):
+    """Remove a file, symlink or directory tree."""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def _file_hash(path):
+    m = hashlib.md5()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            m.update(chunk)
+    return m.hexdigest()
+
+
+def _same_file(src, dest, checksum=False, groupshared=False):
+    """Whether dest is an up to date copy of src."""
+    if os.path.islink(dest) or not os.path.isfile(dest):
+        return False
+    src_stat = os.stat(src)
+    dest_stat = os.stat(dest)
+    # groupshared copies are made ug+rw after copying
+    mode = src_stat.st_mode | 0o660 if groupshared else src_stat.st_mode
+    if (src_stat.st_size != dest_stat.st_size or
+            src_stat.st_mtime_ns != dest_stat.st_mtime_ns or
+            mode != dest_stat.st_mode):
+        return False
+    if checksum:
+        return _file_hash(src) == _file_hash(dest)
+    return True
+
 
 class ExchangeError(Exception):
     pass
@@ -78,6 +228,63 @@ class Exchange(LoggingConfigurable):
         )
     ).tag(config=True)
 
+    copy_strategy = Enum(
+        ["copy", "reflink", "hardlink"],
+        default_value="copy",
+        help=dedent(
+            """
+            How files are transferred to and from the exchange. 'copy' always
+            copies the contents of files. 'reflink' makes copy-on-write clones
+            of files where the filesystem supports it (e.g. btrfs or XFS), and
+            copies them otherwise. 'hardlink' additionally hard links files
+            that are read-only once transferred when they can't be cloned,
+            which requires the exchange and the course directory to be on the
+            same filesystem. Only files owned by the current user that nobody
+            else can write to are hard linked, so that the copy can't change
+            behind nbgrader's back. In particular, collect never hard links
+            the submissions of students, which they own: with a shared
+            exchange, 'hardlink' only clones or copies them, like 'reflink'.
+            Hard links are then only used for copies that collect makes
+            itself along the way, such as the unpacked files of packed
+            submissions when updating with CollectApp.delta.
+            """
+        )
+    ).tag(config=True)
+
+    storage_class = Type(
+        FileSystemStorage,
+        klass=ExchangeStorage,
+        help=dedent(
+            """
+            The class used to store the files of the exchange, which must be a
+            subclass of `nbgrader.exchange.storage.ExchangeStorage`. The
+            default, `FileSystemStorage`, uses the exchange directory as is.
+            `ObjectStoreStorage` stores files by content with a flat index of
+            paths in the exchange directory, like an object store such as S3.
+            """
+        )
+    ).tag(config=True)
+
+    storage = Instance(ExchangeStorage)
+
+    staging_max_age = Integer(
+        3600,
+        help=dedent(
+            """
+            Submissions and released assignments are staged in hidden
+            directories next to their destination, and only appear once they
+            are complete. Staging directories that haven't been modified for
+            this many seconds were left behind by transfers that never
+            finished, and are removed by `nbgrader collect` and `nbgrader
+            release_assignment`.
+            """
+        )
+    ).tag(config=True)
+
+    @default("storage")
+    def _storage_default(self):
+        return self.storage_class(root=self.root, parent=self)
+
     coursedir = Instance(CourseDirectory, allow_none=True)
     authenticator = Instance(Authenticator, allow_none=True)
 
@@ -127,38 +334,183 @@ class Exchange(LoggingConfigurable):
         """Actually do the file transfer."""
         raise NotImplementedError
 
-    def do_copy(self, src, dest, log=None):
+    def copy_function(self, read_only=False, log=None):
+        """Get a function to be used as :func:`shutil.copytree`'s
+        ``copy_function``, according to the copy strategy. Files are only hard
+        linked if ``read_only`` is True, as changing the copy (including its
+        permissions) would change the original as well, and only if nobody
+        else can change the original (see :func:`is_linkable`).
+        """
+        log = log or self.log
+        use_reflink = self.copy_strategy in ("reflink", "hardlink")
+        use_link = self.copy_strategy == "hardlink" and read_only and not self.coursedir.groupshared
+        # stop trying as soon as the filesystem doesn't support it
+        supported = {"reflink": use_reflink, "link": use_link}
+
+        def copy(src, dst):
+            if supported["reflink"]:
+                try:
+                    reflink(src, dst)
+                except OSError as e:
+                    log.debug("Could not clone %s, falling back: %s", src, e)
+                    supported["reflink"] = False
+                else:
+                    shutil.copystat(src, dst)
+                    return dst
+
+            if supported["link"] and is_linkable(src):
+                try:
+                    os.link(src, dst)
+                except OSError as e:
+                    log.debug("Could not hard link %s, falling back to copying: %s", src, e)
+                    supported["link"] = False
+                else:
+                    return dst
+
+            return shutil.copy2(src, dst)
+
+        return copy
+
+    def do_copy(self, src, dest, log=None, read_only=False, fileperms=None, dirperms=None):
         """
         Copy the src dir to the dest dir, omitting excluded
         file/directories, non included files, and too large files, as
         specified by the options coursedir.ignore, coursedir.include
-        and coursedir.max_file_size.
+        and coursedir.max_file_size. Files are copied according to the
+        copy_strategy option; pass ``read_only=True`` if the copy is never
+        modified, so that files may be hard linked. Messages are logged to
+        ``log`` if it is given.
+
+        The copied files and directories are given the permissions
+        ``fileperms`` and ``dirperms`` if they are given, or are made
+        group writable in groupshared mode, as they are copied (see
+        :func:`copy_tree`).
+        """
+        log = log or self.log
+        # files that are given permissions can't be hard links to the source
+        read_only = read_only and fileperms is None
+        copy_tree(src, dest,
+                  exclude=self.coursedir.ignore,
+                  include=self.coursedir.include,
+                  max_file_size=self.coursedir.max_file_size,
+                  copy_function=self.copy_function(read_only=read_only, log=log),
+                  fileperms=fileperms, dirperms=dirperms,
+                  groupshared=self.coursedir.groupshared, log=log)
+
+    def do_pack(self, src, dest, timestamp, unique_key=None, log=None):
+        """
+        Pack the src dir into a new packed submission dest (see
+        :class:`~nbgrader.exchange.packed.PackedSubmission`), omitting the
+        same files as :meth:`do_copy`.
         """
-        shutil.copytree(src, dest, symlinks=True,
-                        ignore=ignore_patterns(exclude=self.coursedir.ignore,
-                                               include=self.coursedir.include,
-                                               max_file_size=self.coursedir.max_file_size,
-                                               log=self.log))
-        # copytree copies access mode too - so we must add go+rw back to it if
-        # we are in groupshared.
+        log = log or self.log
+        return PackedSubmission.pack(
+            src, dest, timestamp, unique_key=unique_key,
+            ignore=ignore_patterns(exclude=self.coursedir.ignore,
+                                   include=self.coursedir.include,
+                                   max_file_size=self.coursedir.max_file_size,
+                                   log=log),
+            log=log)
+
+    def do_unpack(self, src, dest, log=None):
+        """
+        Unpack the packed submission src into the new dest dir.
+        """
+        log = log or self.log
+        try:
+            PackedSubmission(src).unpack(dest)
+        except Exception:
+            # don't leave a partial submission behind
+            shutil.rmtree(dest, ignore_errors=True)
+            raise
         if self.coursedir.groupshared:
-            for dirname, _, filenames in os.walk(dest):
-                # dirs become ug+rwx
-                st_mode = os.stat(dirname).st_mode
-                if st_mode & 0o2770 != 0o2770:
+            self._make_groupshared(dest, log)
+
+    def _make_groupshared(self, dest, log):
+        for dirname, _, filenames in os.walk(dest):
+            # dirs become ug+rwx
+            st_mode = os.stat(dirname).st_mode
+            if st_mode & 0o2770 != 0o2770:
+                try:
+                    os.chmod(dirname, (st_mode|0o2770) & 0o2777)
+                except PermissionError:
+                    log.warning("Could not update permissions of %s to make it groupshared", dirname)
+
+            for filename in filenames:
+                filename = os.path.join(dirname, filename)
+                st_mode = os.stat(filename).st_mode
+                if st_mode & 0o660 != 0o660:
                     try:
-                        os.chmod(dirname, (st_mode|0o2770) & 0o2777)
+                        os.chmod(filename, (st_mode|0o660) & 0o777)
                     except PermissionError:
-                        self.log.warning("Could not update permissions of %s to make it groupshared", dirname)
+                        log.warning("Could not update permissions of %s to make it groupshared", filename)
 
-                for filename in filenames:
-                    filename = os.path.join(dirname, filename)
-                    st_mode = os.stat(filename).st_mode
-                    if st_mode & 0o660 != 0o660:
-                        try:
-                            os.chmod(filename, (st_mode|0o660) & 0o777)
-                        except PermissionError:
-                            self.log.warning("Could not update permissions of %s to make it groupshared", filename)
+    def do_sync(self, src, dest, log=None, read_only=False, checksum=False):
+        """
+        Update the existing dest dir so that it ends up the same as if
+        ``do_copy(src, dest)`` had been run on an empty destination, but only
+        copy files that are new or changed, and delete files that are no
+        longer in src. Files are compared by size, modification time and
+        permissions, and also by content if ``checksum`` is True.
+
+        Returns the number of files that were copied and deleted.
+        """
+        log = log or self.log
+        ignore = ignore_patterns(exclude=self.coursedir.ignore,
+                                 include=self.coursedir.include,
+                                 max_file_size=self.coursedir.max_file_size,
+                                 log=log)
+        copy = self.copy_function(read_only=read_only, log=log)
+        counts = {"copied": 0, "deleted": 0}
+        self._sync_dir(src, dest, ignore, copy, checksum, counts)
+        if self.coursedir.groupshared:
+            self._make_groupshared(dest, log)
+        return counts["copied"], counts["deleted"]
+
+    def _sync_dir(self, src, dest, ignore, copy, checksum, counts):
+        names = os.listdir(src)
+        ignored = set(ignore(src, names))
+        if os.path.lexists(dest) and (os.path.islink(dest) or not os.path.isdir(dest)):
+            _remove(dest)
+            counts["deleted"] += 1
+        if not os.path.isdir(dest):
+            os.makedirs(dest)
+
+        wanted = set()
+        for name in names:
+            if name in ignored:
+                continue
+            wanted.add(name)
+            srcname = os.path.join(src, name)
+            destname = os.path.join(dest, name)
+
+            if os.path.islink(srcname):
+                target = os.readlink(srcname)
+                if os.path.islink(destname) and os.readlink(destname) == target:
+                    continue
+                if os.path.lexists(destname):
+                    _remove(destname)
+                os.symlink(target, destname)
+                counts["copied"] += 1
+
+            elif os.path.isdir(srcname):
+                self._sync_dir(srcname, destname, ignore, copy, checksum, counts)
+
+            else:
+                if _same_file(srcname, destname, checksum, self.coursedir.groupshared):
+                    continue
+                # remove the old file first, as it might be a hard link
+                if os.path.lexists(destname):
+                    _remove(destname)
+                copy(srcname, destname)
+                counts["copied"] += 1
+
+        for name in os.listdir(dest):
+            if name not in wanted:
+                _remove(os.path.join(dest, name))
+                counts["deleted"] += 1
+
+        shutil.copystat(src, dest)
 
     def start(self):
         if sys.platform == 'win32':
@@ -178,7 +530,10 @@ class Exchange(LoggingConfigurable):
     def _assignment_not_found(self, src_path, other_path):
         msg = "Assignment not found at: {}".format(src_path)
         self.log.fatal(msg)
-        found = glob.glob(other_path)
+        if self._in_exchange(other_path):
+            found = self.storage.glob(other_path)
+        else:
+            found = glob.glob(other_path)
         if found:
             # Normally it is a bad idea to put imports in the middle of
             # a function, but we do this here because otherwise fuzzywuzzy
@@ -190,13 +545,15 @@ class Exchange(LoggingConfigurable):
 
         raise ExchangeError(msg)
 
+    def _in_exchange(self, path):
+        root = os.path.abspath(self.root)
+        path = os.path.abspath(path)
+        return path == root or path.startswith(root + os.sep)
+
     def ensure_directory(self, path, mode):
         """Ensure that the path exists, has the right mode and is self owned."""
-        if not os.path.isdir(path):
-            os.makedirs(path)
-            # For some reason, Python won't create a directory with a mode of 0o733
-            # so we have to create and then chmod.
-            os.chmod(path, mode)
-        else:
+        if not self.storage.isdir(path):
+            self.storage.makedirs(path, mode)
+        elif self.storage.local:
             if not self.coursedir.groupshared and not self_owned(path):
                 self.fail("You don't own the directory: {}".format(path))
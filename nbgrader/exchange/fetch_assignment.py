@@ -3,8 +3,7 @@ import shutil
 
 from traitlets import Bool
 
-from .exchange import Exchange
-from ..utils import check_mode
+from .exchange import Exchange, copy_tree
 
 
 class ExchangeFetchAssignment(Exchange):
@@ -34,11 +33,11 @@ class ExchangeFetchAssignment(Exchange):
         self.course_path = os.path.join(self.root, self.coursedir.course_id)
         self.outbound_path = os.path.join(self.course_path, 'outbound')
         self.src_path = os.path.join(self.outbound_path, self.coursedir.assignment_id)
-        if not os.path.isdir(self.src_path):
+        if not self.storage.isdir(self.src_path):
             self._assignment_not_found(
                 self.src_path,
                 os.path.join(self.outbound_path, "*"))
-        if not check_mode(self.src_path, read=True, execute=True):
+        if not self.storage.access(self.src_path, read=True, execute=True):
             self.fail("You don't have read permissions for the directory: {}".format(self.src_path))
 
     def init_dest(self):
@@ -77,10 +76,12 @@ class ExchangeFetchAssignment(Exchange):
         if os.path.isdir(self.dest_path):
             self.copy_if_missing(src, dest, ignore=shutil.ignore_patterns(*self.coursedir.ignore))
         else:
-            shutil.copytree(src, dest, symlinks=True, ignore=shutil.ignore_patterns(*self.coursedir.ignore))
+            copy_tree(src, dest, exclude=self.coursedir.ignore,
+                      copy_function=self.copy_function(), log=self.log)
 
     def copy_files(self):
         self.log.info("Source: {}".format(self.src_path))
         self.log.info("Destination: {}".format(self.dest_path))
-        self.do_copy(self.src_path, self.dest_path)
+        with self.storage.local_copy(self.src_path) as src_path:
+            self.do_copy(src_path, self.dest_path)
         self.log.info("Fetched as: {} {}".format(self.coursedir.course_id, self.coursedir.assignment_id))
@@ -1,9 +1,10 @@
 import os
-import shutil
 import glob
 
 from .exchange import Exchange
-from ..utils import check_mode, notebook_hash, make_unique_key, get_username
+from .hashcache import HashCache
+from .manifest import find_feedback
+from ..utils import make_unique_key, get_username
 
 
 class ExchangeFetchFeedback(Exchange):
@@ -25,11 +26,11 @@ class ExchangeFetchFeedback(Exchange):
         else:
             student_id = get_username()
 
-        if not os.path.isdir(self.src_path):
+        if not self.storage.isdir(self.src_path):
             self._assignment_not_found(
                 self.src_path,
                 os.path.join(self.outbound_path, "*"))
-        if not check_mode(self.src_path, execute=True):
+        if not self.storage.access(self.src_path, execute=True):
             self.fail("You don't have execute permissions for the directory: {}".format(self.src_path))
 
         assignment_id = self.coursedir.assignment_id if self.coursedir.assignment_id else '*'
@@ -37,6 +38,7 @@ class ExchangeFetchFeedback(Exchange):
         self.log.debug(
             "Looking for submissions with pattern: {}".format(pattern))
 
+        self.hashes = HashCache(self.cache, log=self.log)
         self.feedback_files = []
         submissions = [os.path.split(x)[-1] for x in glob.glob(pattern)]
         for submission in submissions:
@@ -55,25 +57,19 @@ class ExchangeFetchFeedback(Exchange):
                     student_id,
                     timestamp)
 
-                # Look for the feedback using new-style of feedback
                 self.log.debug("Unique key is: {}".format(unique_key))
-                nb_hash = notebook_hash(notebook, unique_key)
-                feedbackpath = os.path.join(self.outbound_path, '{0}.html'.format(nb_hash))
-                if os.path.exists(feedbackpath):
+                feedback = find_feedback(self.course_path, notebook, unique_key, self.hashes, self.storage)
+                if feedback is not None:
+                    feedbackpath, legacy = feedback
                     self.feedback_files.append((notebook_id, timestamp, feedbackpath))
-                    self.log.info(
-                        "Found feedback for '{}/{}/{}' submitted at {}".format(
-                            self.coursedir.course_id, assignment_id, notebook_id, timestamp))
-                    continue
-
-                # If it doesn't exist, try the legacy hashing
-                nb_hash = notebook_hash(notebook)
-                feedbackpath = os.path.join(self.outbound_path, '{0}.html'.format(nb_hash))
-                if os.path.exists(feedbackpath):
-                    self.feedback_files.append((notebook_id, timestamp, feedbackpath))
-                    self.log.warning(
-                        "Found legacy feedback for '{}/{}/{}' submitted at {}".format(
-                            self.coursedir.course_id, assignment_id, notebook_id, timestamp))
+                    if legacy:
+                        self.log.warning(
+                            "Found legacy feedback for '{}/{}/{}' submitted at {}".format(
+                                self.coursedir.course_id, assignment_id, notebook_id, timestamp))
+                    else:
+                        self.log.info(
+                            "Found feedback for '{}/{}/{}' submitted at {}".format(
+                                self.coursedir.course_id, assignment_id, notebook_id, timestamp))
                     continue
 
                 # If we reached here, then there's no feedback available
@@ -97,11 +93,18 @@ class ExchangeFetchFeedback(Exchange):
             html_file = os.path.join(dest_with_timestamp, new_name)
             self.log.debug("Copying feedback from {} to {}".format(feedbackpath, html_file))
             if os.path.exists(html_file):
+                # the hashes of feedback in the exchange are cached like
+                # those of local files, so unchanged feedback isn't read again
+                if self.storage.local and \
+                        self.hashes.notebook_hash(feedbackpath) == self.hashes.notebook_hash(html_file):
+                    self.log.info("Feedback is unchanged: {}".format(html_file))
+                    continue
                 self.log.debug("Overwriting existing feedback: {}".format(html_file))
-            shutil.copy(feedbackpath, html_file, follow_symlinks=False)
+            self.storage.get_file(feedbackpath, html_file)
             self.log.info("Fetched feedback: {}".format(html_file))
 
     def copy_files(self):
         self.log.info("Source: {}".format(self.src_path))
         self.log.info("Destination: {}".format(self.dest_path))
         self.do_copy(self.src_path, self.dest_path)
+        self.hashes.save()
@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import hashlib
+
+from ..utils import notebook_hash, to_bytes
+
+
+class HashCache(object):
+    """Persistent cache of notebook and feedback hashes, stored as JSON in
+    the student's submission cache directory.
+
+    ``nbgrader list`` and ``nbgrader fetch_feedback`` need the hash of every
+    submitted notebook to find its feedback, and list also needs the
+    checksums of the feedback files. Hashing means reading each file in full,
+    so hashes are cached, keyed by the path, size and modification time of the
+    file and by the unique key mixed into the hash. A file that changes gets
+    a new size or modification time, and is rehashed.
+
+    Hashes of files that were modified very recently (within
+    :attr:`racy_window` seconds) aren't cached, as the file could be
+    modified again without its modification time changing.
+
+    """
+
+    filename = "hashes.json"
+    racy_window = 2
+
+    def __init__(self, cache_path, log=None):
+        self.path = os.path.join(cache_path, self.filename)
+        self.log = log
+        self.entries = {}
+        self.dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                self.entries = json.load(fh)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            if self.log:
+                self.log.warning("Ignoring invalid hash cache {}: {}".format(self.path, e))
+
+    @staticmethod
+    def _key(path, unique_key):
+        return "{}\0{}".format(os.path.abspath(path), unique_key or "")
+
+    def notebook_hash(self, path, unique_key=None):
+        """Equivalent to :func:`nbgrader.utils.notebook_hash`, but only hashes
+        the file if it isn't in the cache. Without a unique key, this is the
+        MD5 checksum of the file."""
+        st = os.stat(path)
+        key = self._key(path, unique_key)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+
+        nb_hash = notebook_hash(path, unique_key)
+        if time.time() - st.st_mtime > self.racy_window:
+            self.entries[key] = [st.st_size, st.st_mtime_ns, nb_hash]
+            self.dirty = True
+        elif key in self.entries:
+            del self.entries[key]
+            self.dirty = True
+        return nb_hash
+
+    def save(self):
+        """Write the cache if it has changed, dropping the entries of files
+        that no longer exist. Failing to write the cache isn't an error."""
+        if not self.dirty:
+            return
+
+        entries = {
+            key: value for key, value in self.entries.items()
+            if os.path.isfile(key.split("\0", 1)[0])}
+
+        tmp_path = "{}.tmp".format(self.path)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(entries, fh)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            if self.log:
+                self.log.warning("Could not write hash cache {}: {}".format(self.path, e))
+            return
+
+        self.entries = entries
+        self.dirty = False
+
+
+class StorageHashes(object):
+    """Hashes of files in an exchange storage that isn't on the local
+    filesystem, with the same interface as :class:`HashCache` but without
+    caching."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def notebook_hash(self, path, unique_key=None):
+        m = hashlib.md5(self.storage.read(path))
+        if unique_key:
+            m.update(to_bytes(unique_key))
+        return m.hexdigest()
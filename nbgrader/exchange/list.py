@@ -2,16 +2,13 @@ import os
 import glob
 import shutil
 import re
-import hashlib
 from traitlets import Bool
-from ..utils import notebook_hash, make_unique_key
+from ..utils import make_unique_key
 from .exchange import Exchange
-
-
-def _checksum(path):
-    m = hashlib.md5()
-    m.update(open(path, 'rb').read())
-    return m.hexdigest()
+from .hashcache import HashCache, StorageHashes
+from .manifest import InboundManifest, find_feedback
+from .packed import PackedSubmission
+from .storage import is_staging
 
 
 class ExchangeList(Exchange):
@@ -19,6 +16,10 @@ class ExchangeList(Exchange):
     inbound = Bool(False, help="List inbound files rather than outbound.").tag(config=True)
     cached = Bool(False, help="List assignments in submission cache.").tag(config=True)
     remove = Bool(False, help="Remove, rather than list files.").tag(config=True)
+    rebuild_index = Bool(
+        False,
+        help="Rebuild the index of inbound submissions from the contents of the inbound directory."
+    ).tag(config=True)
 
     def init_src(self):
         pass
@@ -29,13 +30,27 @@ class ExchangeList(Exchange):
         student_id = self.coursedir.student_id if self.coursedir.student_id else '*'
 
         if self.inbound:
+            manifest = InboundManifest(
+                os.path.join(self.root, course_id), groupshared=self.coursedir.groupshared)
+            if self.rebuild_index:
+                if course_id == '*':
+                    self.fail("No course id specified. Re-run with --course flag.")
+                if not self.storage.local:
+                    self.fail("The index of inbound submissions is only used with the filesystem storage.")
+                self.log.info("Rebuilt index of {} submissions: {}".format(
+                    manifest.rebuild(), manifest.path))
+            if course_id != '*' and self.storage.local and manifest.available():
+                self.assignments = sorted(manifest.glob(student_id, assignment_id))
+                return
             pattern = os.path.join(self.root, course_id, 'inbound', '{}+{}+*'.format(student_id, assignment_id))
         elif self.cached:
             pattern = os.path.join(self.cache, course_id, '{}+{}+*'.format(student_id, assignment_id))
+            self.assignments = sorted(glob.glob(pattern))
+            return
         else:
             pattern = os.path.join(self.root, course_id, 'outbound', '{}'.format(assignment_id))
 
-        self.assignments = sorted(glob.glob(pattern))
+        self.assignments = [x for x in self.storage.glob(pattern) if not is_staging(x)]
 
     def parse_assignment(self, assignment):
         if self.inbound:
@@ -50,6 +65,18 @@ class ExchangeList(Exchange):
             raise RuntimeError("Could not match '%s' with regexp '%s'", assignment, regexp)
         return m.groupdict()
 
+    def _load_packed(self, path):
+        """Get the packed submission at ``path`` in the exchange, or ``None``
+        if it isn't a packed submission."""
+        archive_path = os.path.join(path, PackedSubmission.archive_name)
+        manifest_path = os.path.join(path, PackedSubmission.manifest_name)
+        if not self.storage.isfile(archive_path) or not self.storage.isfile(manifest_path):
+            return None
+        manifest = PackedSubmission.parse_manifest(self.storage.read(manifest_path))
+        if manifest is None:
+            return None
+        return PackedSubmission(path, manifest=manifest)
+
     def format_inbound_assignment(self, info):
         msg = "{course_id} {student_id} {assignment_id} {timestamp}".format(**info)
         if info['status'] == 'submitted':
@@ -76,6 +103,8 @@ class ExchangeList(Exchange):
         else:
             courses = None
 
+        hashes = HashCache(self.cache, log=self.log)
+        exchange_hashes = hashes if self.storage.local else StorageHashes(self.storage)
         assignments = []
         for path in self.assignments:
             info = self.parse_assignment(path)
@@ -100,7 +129,15 @@ class ExchangeList(Exchange):
             if self.remove:
                 info['status'] = 'removed'
 
-            notebooks = sorted(glob.glob(os.path.join(info['path'], '*.ipynb')))
+            packed = None
+            if self.inbound and self._in_exchange(info['path']):
+                packed = self._load_packed(info['path'])
+            if not self._in_exchange(info['path']):
+                notebooks = sorted(glob.glob(os.path.join(info['path'], '*.ipynb')))
+            elif packed is not None:
+                notebooks = [os.path.join(info['path'], x) for x in packed.notebooks()]
+            else:
+                notebooks = self.storage.glob(os.path.join(info['path'], '*.ipynb'))
             if not notebooks:
                 self.log.warning("No notebooks found in {}".format(info['path']))
 
@@ -126,7 +163,7 @@ class ExchangeList(Exchange):
                     local_feedback_dir, '{0}.html'.format(nb_info['notebook_id']))
                 has_local_feedback = os.path.isfile(local_feedback_path)
                 if has_local_feedback:
-                    local_feedback_checksum = _checksum(local_feedback_path)
+                    local_feedback_checksum = hashes.notebook_hash(local_feedback_path)
                 else:
                     local_feedback_checksum = None
 
@@ -138,18 +175,19 @@ class ExchangeList(Exchange):
                     info['student_id'],
                     info['timestamp'])
                 self.log.debug("Unique key is: {}".format(unique_key))
-                nb_hash = notebook_hash(notebook, unique_key)
-                exchange_feedback_path = os.path.join(
-                    self.root, info['course_id'], 'feedback', '{0}.html'.format(nb_hash))
-                has_exchange_feedback = os.path.isfile(exchange_feedback_path)
-                if not has_exchange_feedback:
-                    # Try looking for legacy feedback.
-                    nb_hash = notebook_hash(notebook)
-                    exchange_feedback_path = os.path.join(
-                        self.root, info['course_id'], 'feedback', '{0}.html'.format(nb_hash))
-                    has_exchange_feedback = os.path.isfile(exchange_feedback_path)
-                if has_exchange_feedback:
-                    exchange_feedback_checksum = _checksum(exchange_feedback_path)
+                if packed is not None:
+                    notebook_hashes = packed
+                elif self._in_exchange(notebook):
+                    notebook_hashes = exchange_hashes
+                else:
+                    notebook_hashes = hashes
+                feedback = find_feedback(
+                    os.path.join(self.root, info['course_id']), notebook, unique_key,
+                    notebook_hashes, self.storage)
+                has_exchange_feedback = feedback is not None
+                if has_exchange_feedback and has_local_feedback:
+                    exchange_feedback_path, _ = feedback
+                    exchange_feedback_checksum = exchange_hashes.notebook_hash(exchange_feedback_path)
                 else:
                     exchange_feedback_checksum = None
 
@@ -182,6 +220,8 @@ class ExchangeList(Exchange):
 
             assignments.append(info)
 
+        hashes.save()
+
         # partition the assignments into groups for course/student/assignment
         if self.inbound or self.cached:
             _get_key = lambda info: (info['course_id'], info['student_id'], info['assignment_id'])
@@ -237,13 +277,18 @@ class ExchangeList(Exchange):
                 self.log.info(self.format_outbound_assignment(info))
 
         for assignment in self.assignments:
-            shutil.rmtree(assignment)
+            if self.cached:
+                shutil.rmtree(assignment)
+            else:
+                self.storage.delete(assignment)
 
         return assignments
 
     def start(self):
         if self.inbound and self.cached:
             self.fail("Options --inbound and --cached are incompatible.")
+        if self.rebuild_index and not self.inbound:
+            self.fail("Option --rebuild-index can only be used with --inbound.")
 
         super(ExchangeList, self).start()
 
@@ -0,0 +1,202 @@
+import os
+import json
+import fnmatch
+from stat import S_IRUSR, S_IWUSR, S_IWGRP, S_IRGRP
+
+from .storage import FileSystemStorage
+
+
+class InboundManifest(object):
+    """Index of the submissions in the inbound directory of a course.
+
+    Listing the inbound directory can be very slow when it holds many
+    submissions (e.g. on NFS), so if the index exists, collect and list look
+    up submissions in it instead of globbing the inbound directory. The index
+    records the modification time of the inbound directory when it was
+    built, which changes whenever a submission is added or removed: it is
+    only trusted while the inbound directory hasn't changed since, and is
+    otherwise rebuilt from a listing of the directory. The index is created
+    by :meth:`rebuild`.
+
+    The index is only written by the instructor, and can't be read or
+    written by students.
+
+    """
+
+    filename = "inbound.manifest"
+
+    # The modification times of directories only have a limited resolution,
+    # so a submission made just after the index was built could leave the
+    # inbound directory with the same modification time. The index is only
+    # trusted if it was written at least this long after the last change to
+    # the inbound directory, as seen by the file server's clock.
+    racy_ns = 2 * 10**9
+
+    def __init__(self, course_path, groupshared=False):
+        self.course_path = course_path
+        self.inbound_path = os.path.join(course_path, "inbound")
+        self.path = os.path.join(course_path, self.filename)
+        self.groupshared = groupshared
+
+    @property
+    def mode(self):
+        # 0600
+        # groupshared: +0060
+        return S_IRUSR | S_IWUSR | ((S_IRGRP | S_IWGRP) if self.groupshared else 0)
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def available(self):
+        """Whether the index exists and can be used by the current user."""
+        return self.exists() and os.access(self.path, os.R_OK | os.W_OK)
+
+    def _load(self, inbound_mtime_ns):
+        try:
+            index_mtime_ns = os.stat(self.path).st_mtime_ns
+            with open(self.path, "r", encoding="utf-8") as fh:
+                index = json.load(fh)
+            mtime_ns = index["mtime_ns"]
+            names = index["names"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if mtime_ns != inbound_mtime_ns or index_mtime_ns - mtime_ns < self.racy_ns:
+            return None
+        return names
+
+    def _list(self):
+        # the modification time is taken before listing, so that submissions
+        # made while listing show up as a change the next time
+        mtime_ns = os.stat(self.inbound_path).st_mtime_ns
+        names = sorted(
+            x.name for x in os.scandir(self.inbound_path)
+            if x.is_dir() and not x.name.startswith("."))
+        return mtime_ns, names
+
+    def _save(self, mtime_ns, names):
+        tmp_path = "{}.tmp".format(self.path)
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"mtime_ns": mtime_ns, "names": names}, fh)
+        os.chmod(tmp_path, self.mode)
+        os.replace(tmp_path, self.path)
+
+    def names(self):
+        """Get the names of all submissions in the inbound directory, from
+        the index if the inbound directory hasn't changed since it was built,
+        or else from the inbound directory (updating the index)."""
+        names = self._load(os.stat(self.inbound_path).st_mtime_ns)
+        if names is not None:
+            return names
+
+        mtime_ns, names = self._list()
+        try:
+            self._save(mtime_ns, names)
+        except OSError:
+            # e.g. another instructor's index, without --groupshared
+            pass
+        return names
+
+    def glob(self, student_id="*", assignment_id="*"):
+        """Get the paths of the submissions of the given student and
+        assignment, which may both be ``*``. Equivalent to globbing
+        ``inbound/{student_id}+{assignment_id}+*``."""
+        pattern = "{}+{}+*".format(student_id, assignment_id)
+        return [os.path.join(self.inbound_path, x) for x in fnmatch.filter(self.names(), pattern)]
+
+    def rebuild(self):
+        """(Re)create the index from the contents of the inbound directory,
+        and return the number of submissions in it."""
+        mtime_ns, names = self._list()
+        self._save(mtime_ns, names)
+        return len(names)
+
+
+class FeedbackManifest(object):
+    """Index of the feedback released for a course, mapping the hash of each
+    submitted notebook (the name of its released feedback file, without
+    ``.html``) to the checksum of the feedback.
+
+    Release feedback updates the manifest, and uses it to skip feedback that
+    was already released and hasn't changed. The names of the released
+    feedback files are only known to the students they belong to, as the
+    feedback directory can't be listed, so the manifest is only readable by
+    the instructor. Students look up their feedback with :func:`find_feedback`.
+
+    The manifest is read and written through the given
+    :class:`~nbgrader.exchange.storage.ExchangeStorage`, which defaults to
+    the filesystem.
+
+    """
+
+    filename = "feedback.manifest"
+
+    def __init__(self, course_path, groupshared=False, storage=None):
+        self.path = os.path.join(course_path, self.filename)
+        self.groupshared = groupshared
+        self.storage = storage if storage is not None else FileSystemStorage()
+
+    @property
+    def mode(self):
+        # 0600
+        # groupshared: +0060
+        return S_IRUSR | S_IWUSR | ((S_IRGRP | S_IWGRP) if self.groupshared else 0)
+
+    def exists(self):
+        return self.storage.isfile(self.path)
+
+    def load(self):
+        """Get the released feedback, as a dictionary of notebook hashes to
+        feedback checksums. Returns an empty dictionary if the manifest
+        doesn't exist or can't be read."""
+        try:
+            entries = json.loads(self.storage.read(self.path).decode("utf-8"))
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(entries, dict):
+            return {}
+        return entries
+
+    def save(self, entries):
+        """Replace the manifest with the given entries."""
+        tmp_path = "{}.tmp".format(self.path)
+        self.storage.write(tmp_path, json.dumps(entries, sort_keys=True).encode("utf-8"))
+        if self.storage.local:
+            os.chmod(tmp_path, self.mode)
+        self.storage.rename(tmp_path, self.path)
+
+
+def find_feedback(course_path, notebook, unique_key, hashes, storage):
+    """Find the released feedback for a submitted notebook.
+
+    Parameters
+    ----------
+    course_path : str
+        The path to the course in the exchange
+    notebook : str
+        The path to the submitted notebook
+    unique_key : str
+        The unique key of the submission of the notebook
+    hashes : :class:`~nbgrader.exchange.hashcache.HashCache`
+        The cache to get the hashes of the notebook from, or a
+        :class:`~nbgrader.exchange.packed.PackedSubmission` if the
+        notebook is in a packed submission
+    storage : :class:`~nbgrader.exchange.storage.ExchangeStorage`
+        The storage of the exchange
+
+    Returns
+    -------
+    A tuple of the path to the feedback and whether it is legacy feedback,
+    or ``None`` if there is no feedback for the notebook.
+
+    """
+    feedback_path = os.path.join(course_path, "feedback")
+    path = os.path.join(feedback_path, "{}.html".format(hashes.notebook_hash(notebook, unique_key)))
+    if storage.isfile(path):
+        return path, False
+
+    # Try looking for legacy feedback.
+    path = os.path.join(feedback_path, "{}.html".format(hashes.notebook_hash(notebook)))
+    if storage.isfile(path):
+        return path, True
+
+    return None
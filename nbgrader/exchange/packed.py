@@ -0,0 +1,243 @@
+import os
+import io
+import json
+import hashlib
+import tarfile
+
+from ..utils import to_bytes
+
+
+class _HashingReader(object):
+    """Wraps a file, computing the MD5 checksum of what is read from it."""
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.md5 = hashlib.md5()
+
+    def read(self, size=-1):
+        data = self.fh.read(size)
+        self.md5.update(data)
+        return data
+
+
+class PackedSubmission(object):
+    """A submission stored in the inbound directory as a single compressed
+    archive, along with a JSON manifest of the files in it.
+
+    A packed submission is still a directory named after the submission, so
+    that it is found and listed like any other, but it only contains
+    :attr:`archive_name` and :attr:`manifest_name` rather than a copy of the
+    whole assignment directory. The manifest records the size and MD5 checksum
+    of every file in the archive, which are checked when it is unpacked, as
+    well as the hashes of the notebooks that feedback is released under, so
+    that the notebooks don't have to be unpacked to look up their feedback.
+
+    Only regular files and directories are packed; the archive can't contain
+    links or files outside of the submission.
+
+    A loose submission may well contain files with the same names, so a
+    submission is only taken to be packed if it has the archive, and a
+    manifest of the current :attr:`format_name` and :attr:`format_version`.
+
+    """
+
+    archive_name = "submission.tar.gz"
+    manifest_name = "submission.json"
+    format_name = "nbgrader-packed-submission"
+    format_version = 1
+
+    def __init__(self, path, manifest=None):
+        self.path = path
+        self.archive_path = os.path.join(path, self.archive_name)
+        self.manifest_path = os.path.join(path, self.manifest_name)
+        # the manifest is read from manifest_path if it isn't given
+        self._manifest = manifest
+
+    @classmethod
+    def parse_manifest(cls, data):
+        """Parse the contents of a manifest file, returning ``None`` if it
+        isn't the manifest of a packed submission."""
+        try:
+            manifest = json.loads(data)
+        except ValueError:
+            return None
+        if not isinstance(manifest, dict):
+            return None
+        if manifest.get("format") != cls.format_name or manifest.get("version") != cls.format_version:
+            return None
+        return manifest
+
+    @classmethod
+    def load(cls, path):
+        """Get the packed submission in the directory ``path``, or ``None``
+        if it isn't a packed submission."""
+        if not os.path.isfile(os.path.join(path, cls.archive_name)):
+            return None
+        try:
+            with open(os.path.join(path, cls.manifest_name), "rb") as fh:
+                manifest = cls.parse_manifest(fh.read())
+        except OSError:
+            return None
+        if manifest is None:
+            return None
+        return cls(path, manifest=manifest)
+
+    @classmethod
+    def is_packed(cls, path):
+        return cls.load(path) is not None
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            with open(self.manifest_path, "rb") as fh:
+                manifest = self.parse_manifest(fh.read())
+            if manifest is None:
+                raise ValueError("Not the manifest of a packed submission: {}".format(self.manifest_path))
+            self._manifest = manifest
+        return self._manifest
+
+    def notebooks(self):
+        """Get the names of the notebooks at the top level of the submission."""
+        return sorted(
+            x for x in self.manifest["files"]
+            if "/" not in x and x.endswith(".ipynb"))
+
+    def notebook_hash(self, path, unique_key=None):
+        """Equivalent to :func:`nbgrader.utils.notebook_hash` for a file of the
+        submission, given as a path within the submission directory."""
+        name = os.path.relpath(path, self.path).replace(os.sep, "/")
+        entry = self.manifest["files"][name]
+        if not unique_key:
+            return entry["md5"]
+        if entry.get("unique_key") == unique_key:
+            return entry["hash"]
+
+        with tarfile.open(self.archive_path, "r:gz") as tar:
+            m = hashlib.md5(tar.extractfile(name).read())
+        m.update(to_bytes(unique_key))
+        return m.hexdigest()
+
+    @classmethod
+    def pack(cls, src, dest, timestamp, unique_key=None, ignore=None, log=None):
+        """Pack the directory ``src`` into a new packed submission ``dest``.
+
+        Parameters
+        ----------
+        src : str
+            The directory to pack
+        dest : str
+            The submission directory to create
+        timestamp : str
+            The timestamp of the submission, which is added to the archive as
+            ``timestamp.txt``
+        unique_key : callable
+            A function of a notebook id returning the unique key of the
+            notebook, used to record the hashes of the notebooks at the top
+            level of the submission
+        ignore : callable
+            A function like the ``ignore`` argument of
+            :func:`shutil.copytree`, returning the names of the files and
+            directories in a directory that shouldn't be packed
+
+        """
+        os.makedirs(dest)
+        files = {}
+        submission = cls(dest)
+        with tarfile.open(submission.archive_path, "w:gz") as tar:
+            for dirname, dirnames, filenames in os.walk(src):
+                if ignore is not None:
+                    ignored = set(ignore(dirname, dirnames + filenames))
+                    dirnames[:] = [x for x in dirnames if x not in ignored]
+                    filenames = [x for x in filenames if x not in ignored]
+                if dirname == src:
+                    # replaced by the timestamp of this submission
+                    filenames = [x for x in filenames if x != "timestamp.txt"]
+
+                reldir = os.path.relpath(dirname, src)
+                for name in sorted(dirnames) + sorted(filenames):
+                    path = os.path.join(dirname, name)
+                    arcname = name if reldir == "." else "/".join(reldir.split(os.sep) + [name])
+                    if os.path.islink(path):
+                        if log:
+                            log.warning("Not packing symbolic link: {}".format(path))
+                        continue
+                    info = tar.gettarinfo(path, arcname)
+                    info.uid = info.gid = 0
+                    info.uname = info.gname = ""
+                    if info.isdir():
+                        tar.addfile(info)
+                        continue
+
+                    with open(path, "rb") as fh:
+                        reader = _HashingReader(fh)
+                        tar.addfile(info, reader)
+                    files[arcname] = cls._file_entry(reader.md5, info.size, arcname, unique_key)
+
+            data = to_bytes(timestamp)
+            info = tarfile.TarInfo("timestamp.txt")
+            info.size = len(data)
+            info.mode = 0o644
+            info.mtime = int(os.stat(submission.archive_path).st_mtime)
+            tar.addfile(info, io.BytesIO(data))
+            files["timestamp.txt"] = cls._file_entry(hashlib.md5(data), len(data), "timestamp.txt")
+
+        with open(submission.manifest_path, "w", encoding="utf-8") as fh:
+            json.dump({
+                "format": cls.format_name,
+                "version": cls.format_version,
+                "timestamp": timestamp,
+                "files": files
+            }, fh, sort_keys=True)
+        return submission
+
+    @staticmethod
+    def _file_entry(m, size, arcname, unique_key=None):
+        entry = {"size": size, "md5": m.hexdigest()}
+        if unique_key is not None and "/" not in arcname and arcname.endswith(".ipynb"):
+            entry["unique_key"] = unique_key(os.path.splitext(arcname)[0])
+            m.update(to_bytes(entry["unique_key"]))
+            entry["hash"] = m.hexdigest()
+        return entry
+
+    def unpack(self, dest):
+        """Unpack the submission into the directory ``dest``, which is
+        created. Raises a :class:`ValueError` if the archive doesn't match the
+        manifest or contains anything other than files and directories within
+        the submission."""
+        files = self.manifest["files"]
+        unpacked = set()
+        os.makedirs(dest)
+        with tarfile.open(self.archive_path, "r:gz") as tar:
+            for info in tar:
+                parts = info.name.split("/")
+                if info.name.startswith("/") or ".." in parts or "" in parts:
+                    raise ValueError("Invalid path in {}: {}".format(self.archive_path, info.name))
+                path = os.path.join(dest, *parts)
+
+                if info.isdir():
+                    os.makedirs(path, exist_ok=True)
+                    continue
+                if not info.isfile():
+                    raise ValueError("Not a regular file in {}: {}".format(self.archive_path, info.name))
+                if info.name not in files or info.name in unpacked:
+                    raise ValueError("Unexpected file in {}: {}".format(self.archive_path, info.name))
+
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                m = hashlib.md5()
+                size = 0
+                with tar.extractfile(info) as fsrc, open(path, "wb") as fdst:
+                    for chunk in iter(lambda: fsrc.read(1024 * 1024), b""):
+                        m.update(chunk)
+                        size += len(chunk)
+                        fdst.write(chunk)
+                entry = files[info.name]
+                if size != entry["size"] or m.hexdigest() != entry["md5"]:
+                    raise ValueError("Checksum mismatch in {}: {}".format(self.archive_path, info.name))
+                os.chmod(path, info.mode & 0o777)
+                os.utime(path, (info.mtime, info.mtime))
+                unpacked.add(info.name)
+
+        missing = set(files) - unpacked
+        if missing:
+            raise ValueError("Missing files in {}: {}".format(
+                self.archive_path, ", ".join(sorted(missing))))
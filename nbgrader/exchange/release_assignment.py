@@ -1,5 +1,4 @@
 import os
-import shutil
 from stat import (
     S_IRUSR, S_IWUSR, S_IXUSR,
     S_IRGRP, S_IWGRP, S_IXGRP,
@@ -94,23 +93,24 @@ class ExchangeReleaseAssignment(Exchange):
             self.inbound_path,
             S_ISGID|S_IRUSR|S_IWUSR|S_IXUSR|S_IWGRP|S_IXGRP|S_IWOTH|S_IXOTH|(S_IRGRP if self.coursedir.groupshared else 0)
         )
+        self.storage.clean_staging(self.outbound_path, self.staging_max_age)
 
     def copy_files(self):
-        if os.path.isdir(self.dest_path):
+        if self.storage.isdir(self.dest_path):
             if self.force:
                 self.log.info("Overwriting files: {} {}".format(
                     self.coursedir.course_id, self.coursedir.assignment_id
                 ))
-                shutil.rmtree(self.dest_path)
+                self.storage.delete(self.dest_path)
             else:
                 self.fail("Destination already exists, add --force to overwrite: {} {}".format(
                     self.coursedir.course_id, self.coursedir.assignment_id
                 ))
         self.log.info("Source: {}".format(self.src_path))
         self.log.info("Destination: {}".format(self.dest_path))
-        self.do_copy(self.src_path, self.dest_path)
-        self.set_perms(
-            self.dest_path,
-            fileperms=(S_IRUSR|S_IWUSR|S_IRGRP|S_IROTH|(S_IWGRP if self.coursedir.groupshared else 0)),
-            dirperms=(S_IRUSR|S_IWUSR|S_IXUSR|S_IRGRP|S_IXGRP|S_IROTH|S_IXOTH|((S_ISGID|S_IWGRP) if self.coursedir.groupshared else 0)))
+        with self.storage.staging(self.dest_path) as dest_path:
+            self.do_copy(
+                self.src_path, dest_path,
+                fileperms=(S_IRUSR|S_IWUSR|S_IRGRP|S_IROTH|(S_IWGRP if self.coursedir.groupshared else 0)),
+                dirperms=(S_IRUSR|S_IWUSR|S_IXUSR|S_IRGRP|S_IXGRP|S_IROTH|S_IXOTH|((S_ISGID|S_IWGRP) if self.coursedir.groupshared else 0)))
         self.log.info("Released as: {} {}".format(self.coursedir.course_id, self.coursedir.assignment_id))
@@ -1,11 +1,12 @@
 import os
-import shutil
 import glob
 import re
 from stat import S_IRUSR, S_IWUSR, S_IXUSR, S_IRGRP, S_IWGRP, S_IXGRP, S_IXOTH, S_ISGID
 
 from .exchange import Exchange
-from ..utils import notebook_hash, make_unique_key
+from .hashcache import HashCache
+from .manifest import FeedbackManifest
+from ..utils import make_unique_key
 
 
 class ExchangeReleaseFeedback(Exchange):
@@ -36,6 +37,13 @@ class ExchangeReleaseFeedback(Exchange):
         else:
             exclude_students = set()
 
+        manifest = FeedbackManifest(
+            self.course_path, groupshared=self.coursedir.groupshared, storage=self.storage)
+        released = manifest.load()
+        hashes = HashCache(self.cache, log=self.log)
+        timestamps = {}
+        changed = False
+
         html_files = glob.glob(os.path.join(self.src_path, "*.html"))
         for html_file in html_files:
             regexp = re.escape(os.path.sep).join([
@@ -64,7 +72,10 @@ class ExchangeReleaseFeedback(Exchange):
                 self.coursedir.submitted_directory, student_id,
                 self.coursedir.assignment_id)
 
-            timestamp = open(os.path.join(feedback_dir, 'timestamp.txt')).read()
+            if feedback_dir not in timestamps:
+                with open(os.path.join(feedback_dir, 'timestamp.txt')) as fh:
+                    timestamps[feedback_dir] = fh.read()
+            timestamp = timestamps[feedback_dir]
             nbfile = os.path.join(submission_dir, "{}.ipynb".format(notebook_id))
             unique_key = make_unique_key(
                 self.coursedir.course_id,
@@ -74,10 +85,22 @@ class ExchangeReleaseFeedback(Exchange):
                 timestamp)
 
             self.log.debug("Unique key is: {}".format(unique_key))
-            checksum = notebook_hash(nbfile, unique_key)
+            checksum = hashes.notebook_hash(nbfile, unique_key)
             dest = os.path.join(self.dest_path, "{}.html".format(checksum))
+            feedback_checksum = hashes.notebook_hash(html_file)
+
+            if released.get(checksum) == feedback_checksum and self.storage.isfile(dest):
+                self.log.info("Feedback for student '{}' on assignment '{}/{}/{}' ({}) is already released".format(
+                    student_id, self.coursedir.course_id, self.coursedir.assignment_id, notebook_id, timestamp))
+                continue
 
             self.log.info("Releasing feedback for student '{}' on assignment '{}/{}/{}' ({})".format(
                 student_id, self.coursedir.course_id, self.coursedir.assignment_id, notebook_id, timestamp))
-            shutil.copy(html_file, dest, follow_symlinks=False)
+            self.storage.put_file(html_file, dest)
             self.log.info("Feedback released to: {}".format(dest))
+            released[checksum] = feedback_checksum
+            changed = True
+
+        if changed or not manifest.exists():
+            manifest.save(released)
+        hashes.save()
@@ -0,0 +1,647 @@
+import os
+import json
+import bisect
+import glob
+import time
+import uuid
+import shutil
+import hashlib
+import fnmatch
+import tempfile
+import contextlib
+from collections import namedtuple
+from stat import S_IFDIR, S_IFREG
+from urllib.parse import quote, unquote
+
+from traitlets.config import LoggingConfigurable
+from traitlets import Unicode
+
+from ..utils import check_mode
+
+
+StorageStat = namedtuple("StorageStat", ["st_size", "st_mtime", "st_mode"])
+
+#: Marks the hidden directories that are staged next to their destination.
+STAGING_MARKER = ".staging-"
+
+
+def is_staging(path):
+    """Whether the path is a directory still being staged by
+    :meth:`FileSystemStorage.staging`, which should be ignored."""
+    name = os.path.basename(path)
+    return name.startswith(".") and STAGING_MARKER in name
+
+
+class ExchangeStorage(LoggingConfigurable):
+    """Storage of the files in the exchange.
+
+    The exchange classes do all their reads and writes of the exchange
+    through the storage, so that the exchange doesn't have to be a directory
+    shared by everyone. Files and directories are named by paths under
+    :attr:`root`, in the same way whatever the storage is.
+
+    Subclasses must implement all the methods that raise
+    :class:`NotImplementedError`. Storages that aren't a directory on the
+    local filesystem (:attr:`local` is False) don't have owners or
+    permissions, so checking them is left to the exchange classes when
+    :attr:`local` is True.
+
+    """
+
+    root = Unicode(
+        "",
+        help="The root of the exchange, usually the same as Exchange.root."
+    )
+
+    #: Whether the paths of the storage are paths on the local filesystem.
+    local = False
+
+    def isdir(self, path):
+        """Whether the directory exists."""
+        raise NotImplementedError
+
+    def isfile(self, path):
+        """Whether the file exists."""
+        raise NotImplementedError
+
+    def listdir(self, path):
+        """Get the sorted names of the files and directories in a directory."""
+        raise NotImplementedError
+
+    def list(self, path):
+        """Get the sorted paths of all the files in a directory and its
+        subdirectories, relative to the directory."""
+        raise NotImplementedError
+
+    def glob(self, pattern):
+        """Get the paths matching a pattern, in which ``*`` and ``?`` don't
+        match ``/``."""
+        raise NotImplementedError
+
+    def stat(self, path):
+        """Get the size, modification time and mode of a file or directory,
+        as a :class:`StorageStat`. Raises :class:`FileNotFoundError` if it
+        doesn't exist."""
+        raise NotImplementedError
+
+    def access(self, path, read=False, write=False, execute=False):
+        """Whether the current user can rwx the path."""
+        raise NotImplementedError
+
+    def makedirs(self, path, mode=None):
+        """Create a directory and its parents, with the given mode."""
+        raise NotImplementedError
+
+    def read(self, path):
+        """Get the contents of a file, as bytes."""
+        raise NotImplementedError
+
+    def write(self, path, data):
+        """Create or replace a file with the given bytes."""
+        raise NotImplementedError
+
+    def put_file(self, src, path):
+        """Copy the local file ``src`` to ``path``."""
+        raise NotImplementedError
+
+    def get_file(self, path, dest):
+        """Copy the file ``path`` to the local file ``dest``."""
+        raise NotImplementedError
+
+    def put_tree(self, src, path, ignore=None, copy_function=None):
+        """Copy the local directory ``src`` to the new directory ``path``.
+        ``ignore`` and ``copy_function`` are as for :func:`shutil.copytree`,
+        although storages that don't store local files don't use
+        ``copy_function``."""
+        raise NotImplementedError
+
+    def get_tree(self, path, dest, ignore=None, copy_function=None):
+        """Copy the directory ``path`` to the new local directory ``dest``."""
+        raise NotImplementedError
+
+    def delete(self, path):
+        """Remove a file or a directory and everything in it."""
+        raise NotImplementedError
+
+    def rename(self, src, dest):
+        """Rename a file or directory, replacing ``dest``. Renaming a file is
+        atomic, but renaming a directory may not be, depending on the
+        storage."""
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def local_copy(self, path):
+        """Context manager giving a local directory with the contents of the
+        directory ``path``, to be read in place of it."""
+        tmp = tempfile.mkdtemp(prefix="nbgrader-exchange-")
+        try:
+            dest = os.path.join(tmp, os.path.basename(path))
+            self.get_tree(path, dest)
+            yield dest
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    @contextlib.contextmanager
+    def staging(self, path):
+        """Context manager giving a local path at which to create a directory,
+        which becomes the new directory ``path`` once the context exits
+        without an error."""
+        tmp = tempfile.mkdtemp(prefix="nbgrader-exchange-")
+        try:
+            dest = os.path.join(tmp, os.path.basename(path))
+            yield dest
+            self.put_tree(dest, path)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def clean_staging(self, path, max_age):
+        """Remove the directories staged in the directory ``path`` that were
+        last modified more than ``max_age`` seconds ago, which were left
+        behind by transfers that never finished. Returns the number of
+        directories removed."""
+        return 0
+
+
+class FileSystemStorage(ExchangeStorage):
+    """The exchange is a directory on a filesystem shared by all users,
+    usually over NFS."""
+
+    local = True
+
+    def isdir(self, path):
+        return os.path.isdir(path)
+
+    def isfile(self, path):
+        return os.path.isfile(path)
+
+    def listdir(self, path):
+        return sorted(os.listdir(path))
+
+    def list(self, path):
+        files = []
+        for dirname, _, filenames in os.walk(path):
+            files.extend(os.path.relpath(os.path.join(dirname, x), path) for x in filenames)
+        return sorted(files)
+
+    def glob(self, pattern):
+        return sorted(glob.glob(pattern))
+
+    def stat(self, path):
+        st = os.stat(path)
+        return StorageStat(st.st_size, st.st_mtime, st.st_mode)
+
+    def access(self, path, read=False, write=False, execute=False):
+        return check_mode(path, read=read, write=write, execute=execute)
+
+    def makedirs(self, path, mode=None):
+        os.makedirs(path)
+        if mode is not None:
+            # For some reason, Python won't create a directory with a mode of 0o733
+            # so we have to create and then chmod.
+            os.chmod(path, mode)
+
+    def read(self, path):
+        with open(path, "rb") as fh:
+            return fh.read()
+
+    def write(self, path, data):
+        with open(path, "wb") as fh:
+            fh.write(data)
+
+    def put_file(self, src, path):
+        shutil.copy(src, path, follow_symlinks=False)
+
+    def get_file(self, path, dest):
+        shutil.copy(path, dest, follow_symlinks=False)
+
+    def put_tree(self, src, path, ignore=None, copy_function=None):
+        shutil.copytree(src, path, symlinks=True, ignore=ignore,
+                        copy_function=copy_function or shutil.copy2)
+
+    def get_tree(self, path, dest, ignore=None, copy_function=None):
+        shutil.copytree(path, dest, symlinks=True, ignore=ignore,
+                        copy_function=copy_function or shutil.copy2)
+
+    def delete(self, path):
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+    def rename(self, src, dest):
+        os.replace(src, dest)
+
+    @contextlib.contextmanager
+    def local_copy(self, path):
+        yield path
+
+    @contextlib.contextmanager
+    def staging(self, path):
+        # Stage the directory as a hidden sibling of its destination, and
+        # publish it with a single rename, so that nobody ever sees it half
+        # written. The random suffix keeps concurrent transfers apart.
+        staged_path = os.path.join(
+            os.path.dirname(path),
+            ".{}{}{}".format(os.path.basename(path), STAGING_MARKER, uuid.uuid4().hex))
+        try:
+            yield staged_path
+            if os.path.lexists(path):
+                # renaming would replace an empty directory
+                raise FileExistsError("File exists: '{}'".format(path))
+            os.rename(staged_path, path)
+        except BaseException:
+            if os.path.lexists(staged_path):
+                shutil.rmtree(staged_path, ignore_errors=True)
+            raise
+
+    def clean_staging(self, path, max_age):
+        removed = 0
+        cutoff = time.time() - max_age
+        with os.scandir(path) as it:
+            entries = [x for x in it if is_staging(x.name)]
+        for entry in entries:
+            try:
+                if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                    continue
+                self.log.warning("Removing unfinished transfer: {}".format(entry.path))
+                self.delete(entry.path)
+            except OSError as e:
+                self.log.warning("Could not remove unfinished transfer {}: {}".format(entry.path, e))
+            else:
+                removed += 1
+        return removed
+
+
+class ObjectStoreStorage(ExchangeStorage):
+    """A local stand-in for an object store such as S3, in :attr:`root`.
+
+    File contents are stored once per distinct content under
+    ``objects/``, named by their SHA-256. Each path is a key, stored as a
+    small JSON record in the flat ``keys/`` directory; directories only exist
+    as the common prefixes of keys, and as markers ending in ``/`` so that
+    they exist before anything is put in them. Listing never walks a directory
+    tree: it scans the key directory once and filters the keys by prefix.
+
+    Writing a key and renaming a file are atomic, but nothing that involves
+    several keys is: putting a directory writes its keys one at a time, and
+    renaming a directory copies its keys one at a time before deleting the
+    old ones, so others may see a partial directory in the meantime, and a
+    transfer that fails halfway through leaves one behind. The exchange
+    therefore never stages a directory and renames it into place in this
+    storage, as it does on the filesystem (see :meth:`staging`). Objects that
+    are no longer referenced by any key are kept until removed by
+    :meth:`prune`.
+
+    The listing of the key directory is kept while the key directory is
+    unchanged, so that looking up many keys doesn't scan it every time.
+
+    Records are named by their quoted key. Keys that would make too long a
+    file name are named by the beginning of their quoted key, followed by
+    ``#`` (which quoting never leaves as is) and the SHA-256 of the key, and
+    the key itself is kept in the record.
+
+    """
+
+    # A change made in the same tick of the clock as a listing of the key
+    # directory might not change its modification time, so listings are only
+    # kept if the key directory was last changed at least this long before.
+    racy_window = 2
+
+    _cached_listing = None
+
+    # Records of keys whose quoted form is longer than this are named by the
+    # beginning of the quoted key and its hash, so that their names stay
+    # within the limits of common filesystems (usually 255 bytes).
+    max_record_name = 200
+
+
+    objects_dirname = Unicode("objects", help="Directory of the stored objects, in the root.")
+    keys_dirname = Unicode("keys", help="Directory of the keys, in the root.")
+
+    @property
+    def objects_path(self):
+        return os.path.join(self.root, self.objects_dirname)
+
+    @property
+    def keys_path(self):
+        return os.path.join(self.root, self.keys_dirname)
+
+    def _key(self, path):
+        key = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root))
+        key = key.replace(os.sep, "/")
+        if key == ".":
+            return ""
+        if key == ".." or key.startswith("../"):
+            raise ValueError("Path is not in the exchange: {}".format(path))
+        return key
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.rstrip("/").split("/"))
+
+    def _record_name(self, key):
+        name = quote(key, safe="")
+        if len(name) <= self.max_record_name:
+            return name
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        # leave room for the 64 digits of the hash, and the #
+        return "{}#{}".format(name[:self.max_record_name - 65], digest)
+
+    def _record_path(self, key):
+        return os.path.join(self.keys_path, self._record_name(key))
+
+    def _listing(self):
+        """Get the sorted names of the records in the key directory (see
+        :meth:`_record_name`)."""
+        try:
+            mtime_ns = os.stat(self.keys_path).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        cached = self._cached_listing
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+
+        names = sorted(x.name for x in os.scandir(self.keys_path) if not x.name.startswith("."))
+        if time.time() - mtime_ns / 10**9 > self.racy_window:
+            self._cached_listing = (mtime_ns, names)
+        else:
+            self._cached_listing = None
+        return names
+
+    def _keys(self, prefix=""):
+        names = self._listing()
+        # quoting keeps prefixes, so the names with the quoted prefix are
+        # next to each other in the listing, along with the hashed names of
+        # long keys that start with as much of it as fits in their name
+        quoted = quote(prefix, safe="")
+        head = quoted[:self.max_record_name - 65]
+        keys = []
+        for name in names[bisect.bisect_left(names, head):]:
+            if not name.startswith(head):
+                break
+            if "#" in name:
+                try:
+                    with open(os.path.join(self.keys_path, name), "r", encoding="utf-8") as fh:
+                        key = json.load(fh)["key"]
+                except FileNotFoundError:
+                    continue
+            else:
+                key = unquote(name)
+            if key.startswith(prefix):
+                keys.append(key)
+        return sorted(keys)
+
+    def _get_record(self, key):
+        try:
+            with open(self._record_path(key), "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return None
+
+    def _set_record(self, key, record):
+        record = {k: v for k, v in record.items() if k != "key"}
+        if "#" in self._record_name(key):
+            record["key"] = key
+        os.makedirs(self.keys_path, exist_ok=True)
+        tmp_path = os.path.join(self.keys_path, ".{}".format(uuid.uuid4().hex))
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(record, fh)
+        os.replace(tmp_path, self._record_path(key))
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_path, digest[:2], digest)
+
+    def _store(self, fh):
+        """Store the contents of a file object, and return their digest."""
+        os.makedirs(self.objects_path, exist_ok=True)
+        tmp_path = os.path.join(self.objects_path, ".{}".format(uuid.uuid4().hex))
+        m = hashlib.sha256()
+        with open(tmp_path, "wb") as out:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                m.update(chunk)
+                out.write(chunk)
+        digest = m.hexdigest()
+        object_path = self._object_path(digest)
+        if os.path.exists(object_path):
+            os.remove(tmp_path)
+            # keep prune from removing it before the key is written
+            os.utime(object_path)
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(tmp_path, object_path)
+        return digest
+
+    def _put_file(self, src, key):
+        st = os.stat(src)
+        with open(src, "rb") as fh:
+            digest = self._store(fh)
+        self._set_record(key, {
+            "object": digest,
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "mode": st.st_mode & 0o777})
+
+    def _get_file(self, record, dest):
+        shutil.copyfile(self._object_path(record["object"]), dest)
+        os.chmod(dest, record["mode"])
+        os.utime(dest, (record["mtime"], record["mtime"]))
+
+    def _subkeys(self, key):
+        """Get the keys in a directory, which is the root if ``key`` is empty."""
+        prefix = key + "/" if key else ""
+        return prefix, [x for x in self._keys(prefix) if x != prefix]
+
+    def isdir(self, path):
+        key = self._key(path)
+        if key == "":
+            return os.path.isdir(self.root)
+        return len(self._keys(key + "/")) > 0
+
+    def isfile(self, path):
+        key = self._key(path)
+        return key != "" and self._get_record(key) is not None
+
+    def listdir(self, path):
+        prefix, keys = self._subkeys(self._key(path))
+        if not keys and not self.isdir(path):
+            raise FileNotFoundError(path)
+        return sorted(set(x[len(prefix):].split("/")[0] for x in keys))
+
+    def list(self, path):
+        prefix, keys = self._subkeys(self._key(path))
+        return [
+            os.path.join(*x[len(prefix):].split("/")) for x in keys
+            if not x.endswith("/")]
+
+    def glob(self, pattern):
+        parts = self._key(pattern).split("/")
+        matches = set()
+        for key in self._keys():
+            names = key.rstrip("/").split("/")
+            if len(names) < len(parts):
+                continue
+            names = names[:len(parts)]
+            if all(fnmatch.fnmatchcase(n, p) for n, p in zip(names, parts)):
+                matches.add("/".join(names))
+        return sorted(self._path(x) for x in matches)
+
+    def stat(self, path):
+        key = self._key(path)
+        record = self._get_record(key) if key else None
+        if record is not None and "object" in record:
+            return StorageStat(record["size"], record["mtime"], S_IFREG | record["mode"])
+        if self.isdir(path):
+            return StorageStat(0, 0, S_IFDIR | 0o755)
+        raise FileNotFoundError(path)
+
+    def access(self, path, read=False, write=False, execute=False):
+        return self.isdir(path) or self.isfile(path)
+
+    def makedirs(self, path, mode=None):
+        self._set_record(self._key(path) + "/", {})
+
+    def read(self, path):
+        record = self._get_record(self._key(path))
+        if record is None or "object" not in record:
+            raise FileNotFoundError(path)
+        with open(self._object_path(record["object"]), "rb") as fh:
+            return fh.read()
+
+    def write(self, path, data):
+        with tempfile.TemporaryFile() as fh:
+            fh.write(data)
+            fh.seek(0)
+            digest = self._store(fh)
+        self._set_record(self._key(path), {
+            "object": digest,
+            "size": len(data),
+            "mtime": time.time(),
+            "mode": 0o644})
+
+    def put_file(self, src, path):
+        self._put_file(src, self._key(path))
+
+    def get_file(self, path, dest):
+        record = self._get_record(self._key(path))
+        if record is None or "object" not in record:
+            raise FileNotFoundError(path)
+        self._get_file(record, dest)
+
+    def put_tree(self, src, path, ignore=None, copy_function=None):
+        key = self._key(path)
+        if self.isdir(path):
+            raise FileExistsError(path)
+        # like copytree, create the parent directories
+        parts = key.split("/")
+        for i in range(1, len(parts)):
+            self._set_record("/".join(parts[:i]) + "/", {})
+        for dirname, dirnames, filenames in os.walk(src):
+            if ignore is not None:
+                ignored = set(ignore(dirname, dirnames + filenames))
+                dirnames[:] = [x for x in dirnames if x not in ignored]
+                filenames = [x for x in filenames if x not in ignored]
+
+            reldir = os.path.relpath(dirname, src)
+            prefix = key if reldir == "." else "/".join([key] + reldir.split(os.sep))
+            self._set_record(prefix + "/", {})
+            for name in dirnames + filenames:
+                fullname = os.path.join(dirname, name)
+                if os.path.islink(fullname):
+                    # os.walk doesn't follow links to directories, so this
+                    # is the only record of them
+                    self._set_record("{}/{}".format(prefix, name), {"link": os.readlink(fullname)})
+                elif name in filenames:
+                    self._put_file(fullname, "{}/{}".format(prefix, name))
+
+    def get_tree(self, path, dest, ignore=None, copy_function=None):
+        prefix, keys = self._subkeys(self._key(path))
+        if not keys:
+            raise FileNotFoundError(path)
+        os.makedirs(dest)
+        for key in keys:
+            names = key[len(prefix):].rstrip("/").split("/")
+            if ignore is not None and any(
+                    names[i] in ignore(os.path.join(path, *names[:i]), [names[i]])
+                    for i in range(len(names))):
+                continue
+
+            target = os.path.join(dest, *names)
+            record = self._get_record(key)
+            if record is None:
+                continue
+            if key.endswith("/"):
+                os.makedirs(target, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if "link" in record:
+                os.symlink(record["link"], target)
+            else:
+                self._get_file(record, target)
+
+    def delete(self, path):
+        key = self._key(path)
+        if key == "":
+            raise ValueError("Can't delete the root of the exchange")
+        keys = self._keys(key + "/")
+        if self._get_record(key) is not None:
+            keys.append(key)
+        if not keys:
+            raise FileNotFoundError(path)
+        for x in keys:
+            try:
+                os.remove(self._record_path(x))
+            except FileNotFoundError:
+                pass
+
+    def rename(self, src, dest):
+        src_key = self._key(src)
+        dest_key = self._key(dest)
+        record = self._get_record(src_key)
+        if record is not None:
+            if "key" in record or "#" in self._record_name(dest_key):
+                self._set_record(dest_key, record)
+                os.remove(self._record_path(src_key))
+            else:
+                os.replace(self._record_path(src_key), self._record_path(dest_key))
+            return
+
+        keys = self._keys(src_key + "/")
+        if not keys:
+            raise FileNotFoundError(src)
+        # the source is only removed once the destination is complete, so
+        # that a rename that fails halfway through can be done again
+        old_keys = set(self._keys(dest_key + "/"))
+        for key in keys:
+            new_key = dest_key + key[len(src_key):]
+            record = self._get_record(key)
+            if record is not None:
+                self._set_record(new_key, record)
+                old_keys.discard(new_key)
+        for key in sorted(old_keys) + keys:
+            try:
+                os.remove(self._record_path(key))
+            except FileNotFoundError:
+                pass
+
+    def prune(self, min_age=3600):
+        """Remove the objects that aren't referenced by any key, and return
+        how many were removed. Objects are stored before the keys that
+        reference them are written, so objects that were stored less than
+        ``min_age`` seconds ago are kept."""
+        cutoff = time.time() - min_age
+        used = set()
+        for key in self._keys():
+            record = self._get_record(key)
+            if record and "object" in record:
+                used.add(record["object"])
+
+        removed = 0
+        for dirname, _, filenames in os.walk(self.objects_path):
+            for filename in filenames:
+                if filename in used or filename.startswith("."):
+                    continue
+                path = os.path.join(dirname, filename)
+                if os.stat(path).st_mtime > cutoff:
+                    continue
+                os.remove(path)
+                removed += 1
+        return removed
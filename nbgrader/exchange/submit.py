@@ -10,7 +10,7 @@ from textwrap import dedent
 from traitlets import Bool
 
 from .exchange import Exchange
-from ..utils import get_username, check_mode, find_all_notebooks
+from ..utils import get_username, find_all_notebooks, make_unique_key
 
 
 class ExchangeSubmit(Exchange):
@@ -30,6 +30,18 @@ class ExchangeSubmit(Exchange):
         )
     ).tag(config=True)
 
+    packed = Bool(
+        False,
+        help=dedent(
+            """
+            Whether to submit the assignment as a single compressed archive
+            and a manifest of the files in it, rather than as a copy of the
+            assignment directory. This keeps the number of files in the
+            exchange down when there are many submissions.
+            """
+        )
+    ).tag(config=True)
+
     def init_src(self):
         if self.path_includes_course:
             root = os.path.join(self.coursedir.course_id, self.coursedir.assignment_id)
@@ -49,9 +61,9 @@ class ExchangeSubmit(Exchange):
             self.fail("You do not have access to this course.")
 
         self.inbound_path = os.path.join(self.root, self.coursedir.course_id, 'inbound')
-        if not os.path.isdir(self.inbound_path):
+        if not self.storage.isdir(self.inbound_path):
             self.fail("Inbound directory doesn't exist: {}".format(self.inbound_path))
-        if not check_mode(self.inbound_path, write=True, execute=True):
+        if not self.storage.access(self.inbound_path, write=True, execute=True):
             self.fail("You don't have write permissions to the directory: {}".format(self.inbound_path))
 
         self.cache_path = os.path.join(self.cache, self.coursedir.course_id)
@@ -62,6 +74,7 @@ class ExchangeSubmit(Exchange):
             student_id = self.coursedir.student_id
         else:
             student_id = get_username()
+        self.student_id = student_id
         if self.add_random_string:
             random_str = base64.urlsafe_b64encode(os.urandom(9)).decode('ascii')
             self.assignment_filename = '{}+{}+{}+{}'.format(
@@ -77,13 +90,15 @@ class ExchangeSubmit(Exchange):
         course_path = os.path.join(self.root, self.coursedir.course_id)
         outbound_path = os.path.join(course_path, 'outbound')
         self.release_path = os.path.join(outbound_path, self.coursedir.assignment_id)
-        if not os.path.isdir(self.release_path):
+        if not self.storage.isdir(self.release_path):
             self.fail("Assignment not found: {}".format(self.release_path))
-        if not check_mode(self.release_path, read=True, execute=True):
+        if not self.storage.access(self.release_path, read=True, execute=True):
             self.fail("You don't have read permissions for the directory: {}".format(self.release_path))
 
     def check_filename_diff(self):
-        released_notebooks = find_all_notebooks(self.release_path)
+        released_notebooks = [
+            x for x in self.storage.list(self.release_path)
+            if os.path.splitext(x)[-1] == '.ipynb']
         submitted_notebooks = find_all_notebooks(self.src_path)
 
         # Look for missing notebooks in submitted notebooks
@@ -140,19 +155,28 @@ class ExchangeSubmit(Exchange):
 
         # copy to the real location
         self.check_filename_diff()
-        self.do_copy(self.src_path, dest_path)
-        with open(os.path.join(dest_path, "timestamp.txt"), "w") as fh:
-            fh.write(self.timestamp)
-        self.set_perms(
-            dest_path,
-            fileperms=(S_IRUSR | S_IWUSR | S_IRGRP | S_IROTH),
-            dirperms=(S_IRUSR | S_IWUSR | S_IXUSR | S_IRGRP | S_IXGRP | S_IROTH | S_IXOTH))
-
-        # Make this 0777=ugo=rwx so the instructor can delete later. Hidden from other users by the timestamp.
-        os.chmod(
-            dest_path,
-            S_IRUSR|S_IWUSR|S_IXUSR|S_IRGRP|S_IWGRP|S_IXGRP|S_IROTH|S_IWOTH|S_IXOTH
-        )
+        fileperms = S_IRUSR | S_IWUSR | S_IRGRP | S_IROTH
+        dirperms = S_IRUSR | S_IWUSR | S_IXUSR | S_IRGRP | S_IXGRP | S_IROTH | S_IXOTH
+        with self.storage.staging(dest_path) as staged_path:
+            if self.packed:
+                self.do_pack(
+                    self.src_path, staged_path, self.timestamp,
+                    unique_key=lambda notebook_id: make_unique_key(
+                        self.coursedir.course_id, self.coursedir.assignment_id,
+                        notebook_id, self.student_id, self.timestamp))
+                self.set_perms(staged_path, fileperms=fileperms, dirperms=dirperms)
+            else:
+                self.do_copy(self.src_path, staged_path, fileperms=fileperms, dirperms=dirperms)
+                timestamp_path = os.path.join(staged_path, "timestamp.txt")
+                with open(timestamp_path, "w") as fh:
+                    fh.write(self.timestamp)
+                os.chmod(timestamp_path, fileperms)
+
+            # Make this 0777=ugo=rwx so the instructor can delete later. Hidden from other users by the timestamp.
+            os.chmod(
+                staged_path,
+                S_IRUSR|S_IWUSR|S_IXUSR|S_IRGRP|S_IWGRP|S_IXGRP|S_IROTH|S_IWOTH|S_IXOTH
+            )
 
         # also copy to the cache
         if not os.path.isdir(self.cache_path):
@@ -0,0 +1,118 @@
+"""Read-only snapshots of the master version of an assignment, as saved in the
+database by ``nbgrader generate_assignment``.
+
+The master version of an assignment is the same for every submission, so
+``nbgrader autograde`` loads it once per run and hands it to the
+preprocessors, rather than each of them querying the database for every
+submission.
+
+"""
+
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Optional
+
+from .api import Gradebook, MissingEntry, Assignment, Notebook, SourceCell, GradeCell, TaskCell
+
+
+class MasterCell(NamedTuple):
+    """The master version of a cell, as saved in the database by
+    :class:`~nbgrader.preprocessors.SaveCells`."""
+
+    name: str
+    cell_type: str
+    locked: bool
+    source: str
+    checksum: str
+    #: The points of the grade or task cell with the same name, if any
+    max_score: Optional[float]
+
+
+class MasterNotebook(NamedTuple):
+    """The master version of a notebook."""
+
+    name: str
+    #: The JSON representation of the kernelspec of the notebook, if any
+    kernelspec: Optional[str]
+    #: The master cells of the notebook, keyed by name
+    cells: Mapping[str, MasterCell]
+
+    def __deepcopy__(self, memo: dict) -> "MasterNotebook":
+        # nbconvert deep copies the resources for every notebook, but the
+        # snapshot is read-only and can be shared as is
+        return self
+
+
+class MasterAssignment(NamedTuple):
+    """The master version of an assignment."""
+
+    name: str
+    #: The master notebooks of the assignment, keyed by name
+    notebooks: Mapping[str, MasterNotebook]
+
+    def __deepcopy__(self, memo: dict) -> "MasterAssignment":
+        return self
+
+
+def _load_cells(gradebook: Gradebook, assignment_id: str, notebook_id: Optional[str] = None) -> Dict[str, Dict[str, MasterCell]]:
+    """Loads the master cells of an assignment, or of only one of its
+    notebooks, keyed by notebook and then by cell name. This takes one query
+    for the source cells, and one for each kind of graded cell."""
+    def in_assignment(query, cls):
+        query = query\
+            .join(Notebook, Notebook.id == cls.notebook_id)\
+            .join(Assignment, Assignment.id == Notebook.assignment_id)\
+            .filter(Assignment.name == assignment_id)
+        if notebook_id is not None:
+            query = query.filter(Notebook.name == notebook_id)
+        return query
+
+    # grade cells take precedence over task cells, like in find_graded_cell
+    max_scores = {}
+    for cls in (TaskCell, GradeCell):
+        for notebook, name, max_score in in_assignment(
+                gradebook.db.query(Notebook.name, cls.name, cls.max_score), cls):
+            max_scores[(notebook, name)] = max_score
+
+    source_cells = in_assignment(gradebook.db.query(
+        Notebook.name.label("notebook"), SourceCell.name, SourceCell.cell_type,
+        SourceCell.locked, SourceCell.source, SourceCell.checksum), SourceCell)
+
+    cells = {}
+    for x in source_cells:
+        cells.setdefault(x.notebook, {})[x.name] = MasterCell(
+            x.name, x.cell_type, x.locked, x.source, x.checksum,
+            max_scores.get((x.notebook, x.name)))
+    return cells
+
+
+def load_master_cells(gradebook: Gradebook, notebook_id: str, assignment_id: str) -> Mapping[str, MasterCell]:
+    """Loads the master version of every cell of a notebook, keyed by the cell
+    name."""
+    cells = _load_cells(gradebook, assignment_id, notebook_id)
+    return MappingProxyType(cells.get(notebook_id, {}))
+
+
+def load_master_assignment(gradebook: Gradebook, assignment_id: str) -> MasterAssignment:
+    """Loads the master version of an assignment and of all its notebooks.
+
+    Raises
+    ------
+    MissingEntry
+        if the assignment does not exist
+
+    """
+    assignment = gradebook.db.query(Assignment.id)\
+        .filter(Assignment.name == assignment_id)\
+        .one_or_none()
+    if assignment is None:
+        raise MissingEntry("No such assignment: {}".format(assignment_id))
+
+    notebooks = gradebook.db.query(Notebook.name, Notebook.kernelspec)\
+        .filter(Notebook.assignment_id == assignment.id)\
+        .order_by(Notebook.name)
+    cells = _load_cells(gradebook, assignment_id)
+
+    return MasterAssignment(assignment_id, MappingProxyType({
+        name: MasterNotebook(name, kernelspec, MappingProxyType(cells.get(name, {})))
+        for name, kernelspec in notebooks
+    }))
@@ -1,8 +1,11 @@
 import json
 import os
+import functools
+import typing
 import jsonschema
 
 from jsonschema import ValidationError
+from jsonschema.exceptions import best_match
 from traitlets.config import LoggingConfigurable
 from nbformat.notebooknode import NotebookNode
 
@@ -26,16 +29,29 @@ class SchemaTooNewError(SchemaMismatchError):
     pass
 
 
+@functools.lru_cache(maxsize=None)
+def schema_validator(schema_version: int) -> typing.Any:
+    """Get the JSON schema validator of a version of the metadata format.
+    The schema is read and checked once, and the validator is shared by the
+    whole process, as building it is much slower than using it."""
+    with open(os.path.join(root, "v{:d}.json".format(schema_version)), "r") as fh:
+        schema = json.loads(fh.read())
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema)
+
+
 class BaseMetadataValidator(LoggingConfigurable):
 
     def __init__(self) -> None:
-        with open(os.path.join(root, "v{:d}.json".format(self.schema_version)), "r") as fh:
-            self.schema = json.loads(fh.read())
+        self._validator = schema_validator(self.schema_version)
+        # shared by all validators, so it must not be modified
+        self.schema = self._validator.schema
+        self._allowed_keys = frozenset(self.schema["properties"].keys())
 
     def _remove_extra_keys(self, cell: NotebookNode) -> None:
         meta = cell.metadata['nbgrader']
-        allowed = set(self.schema["properties"].keys())
-        keys = set(meta.keys()) - allowed
+        keys = set(meta.keys()) - self._allowed_keys
         if len(keys) > 0:
             self.log.warning("extra keys detected in metadata, these will be removed: {}".format(keys))
             for key in keys:
@@ -61,7 +77,10 @@ class BaseMetadataValidator(LoggingConfigurable):
             raise SchemaTooNewError(
                 "Schema version is too new: {} (expected {})".format(schema, self.schema_version),
                 schema, self.schema_version)
-        jsonschema.validate(cell.metadata['nbgrader'], self.schema)
+        # the same as jsonschema.validate, without rebuilding the validator
+        error = best_match(self._validator.iter_errors(cell.metadata['nbgrader']))
+        if error is not None:
+            raise error
 
     def validate_nb(self, nb: NotebookNode) -> None:
         for cell in nb.cells:
@@ -133,6 +133,6 @@ def reads_v1(source: str, as_version: int, **kwargs: typing.Any) -> NotebookNode
     return nb
 
 
-def writes_v1(nb: NotebookNode, **kwargs: typing.Any) -> None:
+def writes_v1(nb: NotebookNode, **kwargs: typing.Any) -> str:
     MetadataValidatorV1().validate_nb(nb)
-    _writes(nb, **kwargs)
+    return _writes(nb, **kwargs)
@@ -12,7 +12,14 @@ class MetadataValidatorV2(BaseMetadataValidator):
 
     def __init__(self) -> None:
         super().__init__()
-        self.v1 = MetadataValidatorV1()
+        # only needed to upgrade old metadata
+        self._v1 = None
+
+    @property
+    def v1(self) -> MetadataValidatorV1:
+        if self._v1 is None:
+            self._v1 = MetadataValidatorV1()
+        return self._v1
 
     def _upgrade_v1_to_v2(self, cell: NotebookNode) -> NotebookNode:
         meta = cell.metadata['nbgrader']
@@ -122,6 +129,6 @@ def reads_v2(source: str, as_version: int, **kwargs: typing.Any) -> NotebookNode
     return nb
 
 
-def writes_v2(nb: NotebookNode, **kwargs: typing.Any) -> None:
+def writes_v2(nb: NotebookNode, **kwargs: typing.Any) -> str:
     MetadataValidatorV2().validate_nb(nb)
-    _writes(nb, **kwargs)
+    return _writes(nb, **kwargs)
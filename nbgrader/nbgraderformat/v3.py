@@ -14,8 +14,21 @@ class MetadataValidatorV3(BaseMetadataValidator):
 
     def __init__(self) -> None:
         super().__init__()
-        self.v1 = MetadataValidatorV1()
-        self.v2 = MetadataValidatorV2()
+        # only needed to upgrade old metadata
+        self._v1 = None
+        self._v2 = None
+
+    @property
+    def v1(self) -> MetadataValidatorV1:
+        if self._v1 is None:
+            self._v1 = MetadataValidatorV1()
+        return self._v1
+
+    @property
+    def v2(self) -> MetadataValidatorV2:
+        if self._v2 is None:
+            self._v2 = MetadataValidatorV2()
+        return self._v2
 
     def _upgrade_v2_to_v3(self, cell: NotebookNode) -> NotebookNode:
         meta = cell.metadata['nbgrader']
@@ -90,14 +103,18 @@ class MetadataValidatorV3(BaseMetadataValidator):
                     "Task cells have to be markdown: {}".format(cell.source))
 
     def validate_nb(self, nb: NotebookNode) -> None:
-        super(MetadataValidatorV3, self).validate_nb(nb)
-
+        # Validate the cells and look for duplicate grade ids in a single
+        # pass, skipping cells without nbgrader metadata. Invalid cells are
+        # reported before duplicate ids, wherever they are in the notebook.
         ids = set([])
+        duplicate = None
         for cell in nb.cells:
 
             if 'nbgrader' not in cell.metadata:
                 continue
 
+            self.validate_cell(cell)
+
             grade = cell.metadata['nbgrader']['grade']
             solution = cell.metadata['nbgrader']['solution']
             locked = cell.metadata['nbgrader']['locked']
@@ -106,10 +123,13 @@ class MetadataValidatorV3(BaseMetadataValidator):
                 continue
 
             grade_id = cell.metadata['nbgrader']['grade_id']
-            if grade_id in ids:
-                raise ValidationError("Duplicate grade id: {}".format(grade_id))
+            if grade_id in ids and duplicate is None:
+                duplicate = grade_id
             ids.add(grade_id)
 
+        if duplicate is not None:
+            raise ValidationError("Duplicate grade id: {}".format(duplicate))
+
 
 def read_v3(source: typing.io.TextIO, as_version: int, **kwargs: typing.Any) -> NotebookNode:
     nb = _read(source, as_version, **kwargs)
@@ -128,6 +148,6 @@ def reads_v3(source: str, as_version: int, **kwargs: typing.Any) -> NotebookNode
     return nb
 
 
-def writes_v3(nb: NotebookNode, **kwargs: typing.Any) -> None:
+def writes_v3(nb: NotebookNode, **kwargs: typing.Any) -> str:
     MetadataValidatorV3().validate_nb(nb)
-    _writes(nb, **kwargs)
+    return _writes(nb, **kwargs)
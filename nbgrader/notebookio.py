@@ -0,0 +1,247 @@
+"""Reading and writing notebooks, for the places where nbgrader goes through
+many (or large) notebooks.
+
+The notebooks read and the files written are the same as with
+:func:`nbformat.reads` and :func:`nbformat.write`, except that:
+
+- the JSON is parsed with `orjson <https://github.com/ijl/orjson>`__ when it
+  is installed;
+- the notebooks written can be stamped with a digest of the file, once they
+  have passed the nbformat validation. When a stamped notebook is read back and
+  still matches its stamp, it is not validated again, as this is most of the
+  cost of reading a large notebook. A notebook that has been changed since it
+  was written no longer matches its stamp, and is validated as usual;
+- notebooks are not deep copied before being serialized, and are written to
+  disk as bytes, in a single write.
+
+"""
+
+import hashlib
+import json
+import re
+import typing
+from textwrap import dedent
+
+import nbformat
+from traitlets import Bool
+from nbformat import NO_CONVERT, NBFormatError, ValidationError, convert, validate, versions
+from nbformat.notebooknode import NotebookNode
+from nbformat.reader import get_version, parse_json
+from nbformat.v4.nbjson import BytesEncoder
+from nbformat.v4.rwbase import split_lines, strip_transient
+from nbconvert.exporters import Exporter, HTMLExporter, NotebookExporter
+from nbconvert.exporters.exporter import ResourcesDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# the stamp depends on the version of nbformat, as the schema the notebook was
+# validated against comes with it
+_STAMP_SALT = "nbgrader-stamp:{}:".format(nbformat.__version__).encode("ascii")
+_STAMP_PLACEHOLDER = "0" * 64
+_STAMP_REGEX = re.compile(r"[0-9a-f]{64}")
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(_STAMP_SALT + data).hexdigest()
+
+
+def _loads(data: typing.Union[str, bytes]) -> typing.Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # e.g. NaN or integers that don't fit in 64 bits, which the json
+            # module accepts
+            pass
+    return parse_json(data)
+
+
+def _has_valid_stamp(nb_dict: typing.Any, data: bytes) -> bool:
+    try:
+        stamp = nb_dict["metadata"]["nbgrader"]["stamp"]
+    except (KeyError, TypeError):
+        return False
+    if not isinstance(stamp, str) or not _STAMP_REGEX.fullmatch(stamp):
+        return False
+
+    quoted = '"{}"'.format(stamp).encode("ascii")
+    if data.count(quoted) != 1:
+        return False
+    placeholder = '"{}"'.format(_STAMP_PLACEHOLDER).encode("ascii")
+    return _digest(data.replace(quoted, placeholder)) == stamp
+
+
+def _remove_stamp(nb: NotebookNode) -> None:
+    meta = nb.metadata.get("nbgrader")
+    if isinstance(meta, dict) and "stamp" in meta:
+        del meta["stamp"]
+        if not meta:
+            del nb.metadata["nbgrader"]
+
+
+def reads(s: typing.Union[str, bytes], as_version: int = nbformat.current_nbformat) -> NotebookNode:
+    """Reads a notebook from a string, like :func:`nbformat.reads`.
+
+    Notebook format errors are logged, unless the notebook was written by
+    :func:`writes` and has not been changed since.
+
+    """
+    data = s.encode("utf-8") if isinstance(s, str) else s
+    nb_dict = _loads(data)
+    validated = _has_valid_stamp(nb_dict, data)
+
+    (major, minor) = get_version(nb_dict)
+    if major not in versions:
+        raise NBFormatError("Unsupported nbformat version %s" % major)
+    nb = versions[major].to_notebook_json(nb_dict, minor=minor)
+    _remove_stamp(nb)
+
+    if as_version is not NO_CONVERT and as_version != major:
+        nb = convert(nb, as_version)
+        validated = False
+
+    if not validated:
+        try:
+            validate(nb)
+        except ValidationError as e:
+            nbformat.get_logger().error("Notebook JSON is invalid: %s", e)
+
+    return nb
+
+
+def read(filename: str, as_version: int = nbformat.current_nbformat) -> NotebookNode:
+    """Reads a notebook from a file, like :func:`nbformat.read`."""
+    with open(filename, "rb") as fh:
+        return reads(fh.read(), as_version=as_version)
+
+
+def _copy_for_writing(nb: NotebookNode) -> NotebookNode:
+    """Copies the parts of a notebook that are changed when it is written,
+    which is much cheaper than copying the outputs."""
+    nb = NotebookNode(nb)
+    nb.metadata = NotebookNode(nb.metadata)
+    if isinstance(nb.metadata.get("nbgrader"), dict):
+        nb.metadata.nbgrader = NotebookNode(nb.metadata.nbgrader)
+
+    cells = []
+    for cell in nb.cells:
+        cell = NotebookNode(cell)
+        cell.metadata = NotebookNode(cell.metadata)
+        if "attachments" in cell:
+            cell.attachments = NotebookNode({
+                key: NotebookNode(attachment) for key, attachment in cell.attachments.items()})
+        if "outputs" in cell:
+            outputs = []
+            for output in cell.outputs:
+                output = NotebookNode(output)
+                if "data" in output:
+                    output.data = NotebookNode(output.data)
+                outputs.append(output)
+            cell.outputs = outputs
+        cells.append(cell)
+    nb.cells = cells
+
+    return nb
+
+
+def _dumps(nb: NotebookNode) -> bytes:
+    # the same format as nbformat.v4.nbjson.JSONWriter
+    output = json.dumps(
+        nb, cls=BytesEncoder, indent=1, sort_keys=True, separators=(",", ": "),
+        ensure_ascii=False)
+    return (output + "\n").encode("utf-8")
+
+
+def writes(nb: NotebookNode, stamp: bool = True) -> bytes:
+    """Writes a notebook to bytes, in the same format as :func:`nbformat.write`.
+
+    Notebook format errors are logged. If there are none and ``stamp`` is set,
+    the notebook is stamped, so that :func:`reads` doesn't validate it again.
+
+    """
+    version, _ = get_version(nb)
+    if version != 4:
+        output = nbformat.writes(nb)
+        if not output.endswith("\n"):
+            output += "\n"
+        return output.encode("utf-8")
+
+    try:
+        validate(nb)
+    except ValidationError as e:
+        nbformat.get_logger().error("Notebook JSON is invalid: %s", e)
+        stamp = False
+
+    nb = strip_transient(split_lines(_copy_for_writing(nb)))
+    # a notebook read with nbformat may still have the stamp of its file
+    _remove_stamp(nb)
+
+    if stamp and isinstance(nb.metadata.get("nbgrader", {}), dict):
+        nb.metadata.setdefault("nbgrader", NotebookNode())["stamp"] = _STAMP_PLACEHOLDER
+        data = _dumps(nb)
+        placeholder = '"{}"'.format(_STAMP_PLACEHOLDER).encode("ascii")
+        if data.count(placeholder) == 1:
+            return data.replace(placeholder, '"{}"'.format(_digest(data)).encode("ascii"))
+        # the placeholder also appears somewhere else in the notebook
+        _remove_stamp(nb)
+
+    return _dumps(nb)
+
+
+def write(nb: NotebookNode, filename: str, stamp: bool = True) -> None:
+    """Writes a notebook to a file, like :func:`nbformat.write`. See
+    :func:`writes`."""
+    data = writes(nb, stamp=stamp)
+    with open(filename, "wb") as fh:
+        fh.write(data)
+
+
+class NotebookIOMixin(object):
+    """Mixin for nbconvert exporters, making them read notebooks with
+    :func:`reads`."""
+
+    def from_file(self,
+                  file_stream: typing.TextIO,
+                  resources: typing.Optional[ResourcesDict] = None,
+                  **kw: typing.Any
+                  ) -> typing.Tuple[typing.Any, ResourcesDict]:
+        nb = reads(file_stream.read(), as_version=4)
+        return self.from_notebook_node(nb, resources=resources, **kw)
+
+
+class NotebookIOExporter(NotebookIOMixin, NotebookExporter):
+    """A :class:`~nbconvert.exporters.NotebookExporter` that reads and writes
+    notebooks with :func:`reads` and :func:`writes`."""
+
+    stamp = Bool(
+        False,
+        help=dedent(
+            """
+            Whether to stamp the notebooks written (see :func:`writes`). This
+            is only worth it for notebooks that nbgrader reads back itself,
+            such as the autograded ones; the stamp would only be noise in
+            the notebooks given to students.
+            """
+        )
+    ).tag(config=True)
+
+    def from_notebook_node(self,
+                           nb: NotebookNode,
+                           resources: typing.Optional[ResourcesDict] = None,
+                           **kw: typing.Any
+                           ) -> typing.Tuple[typing.Any, ResourcesDict]:
+        if self.nbformat_version != nb.nbformat:
+            return super(NotebookIOExporter, self).from_notebook_node(nb, resources, **kw)
+
+        nb_copy, resources = Exporter.from_notebook_node(self, nb, resources, **kw)
+        resources['output_suffix'] = '.nbconvert'
+        return writes(nb_copy, stamp=self.stamp), resources
+
+
+class NotebookIOHTMLExporter(NotebookIOMixin, HTMLExporter):
+    """An :class:`~nbconvert.exporters.HTMLExporter` that reads notebooks with
+    :func:`reads`."""
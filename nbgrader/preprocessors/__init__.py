@@ -16,6 +16,9 @@ from .latesubmissions import AssignLatePenalties
 from .clearhiddentests import ClearHiddenTests
 from .clearmarkingscheme import ClearMarkScheme
 from .overwritekernelspec import OverwriteKernelspec
+from .fused import FusedCellPreprocessor
+from .externalizeoutputs import ExternalizeOutputs
+from .resolveoutputs import ResolveOutputs
 
 __all__ = [
     "AssignLatePenalties",
@@ -35,4 +38,7 @@ __all__ = [
     "ClearHiddenTests",
     "ClearMarkScheme",
     "OverwriteKernelspec",
+    "FusedCellPreprocessor",
+    "ExternalizeOutputs",
+    "ResolveOutputs",
 ]
@@ -1,8 +1,34 @@
 from nbconvert.preprocessors import Preprocessor
+from nbconvert.exporters.exporter import ResourcesDict
+from nbformat.notebooknode import NotebookNode
 from traitlets import List, Unicode, Bool
+from typing import Tuple
 
 class NbGraderPreprocessor(Preprocessor):
 
     default_language = Unicode('ipython')
     display_data_priority = List(['text/html', 'application/pdf', 'text/latex', 'image/svg+xml', 'image/png', 'image/jpeg', 'text/plain'])
     enabled = Bool(True, help="Whether to use this preprocessor when running nbgrader").tag(config=True)
+
+    #: Whether the preprocessor only works on one cell at a time, so that it
+    #: can share a single pass over the cells with the preprocessors next to
+    #: it (see :class:`~nbgrader.preprocessors.FusedCellPreprocessor`). Its
+    #: ``preprocess_cell`` must only depend on the cell it is given and on
+    #: the previous cells it has processed, and it must not override
+    #: :meth:`preprocess`, only :meth:`begin_notebook` and :meth:`end_notebook`.
+    cell_level = False
+
+    def begin_notebook(self, nb: NotebookNode, resources: ResourcesDict) -> Tuple[NotebookNode, ResourcesDict]:
+        """Called before any cell is processed. This may only read and
+        change the notebook metadata and the resources, not the cells."""
+        return nb, resources
+
+    def end_notebook(self, nb: NotebookNode, resources: ResourcesDict) -> Tuple[NotebookNode, ResourcesDict]:
+        """Called after all the cells are processed. This may only read and
+        change the notebook metadata and the resources, not the cells."""
+        return nb, resources
+
+    def preprocess(self, nb: NotebookNode, resources: ResourcesDict) -> Tuple[NotebookNode, ResourcesDict]:
+        nb, resources = self.begin_notebook(nb, resources)
+        nb, resources = super(NbGraderPreprocessor, self).preprocess(nb, resources)
+        return self.end_notebook(nb, resources)
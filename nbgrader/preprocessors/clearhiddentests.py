@@ -12,6 +12,8 @@ from typing import Tuple
 
 class ClearHiddenTests(NbGraderPreprocessor):
 
+    cell_level = True
+
     begin_test_delimeter = Unicode(
         "BEGIN HIDDEN TESTS",
         help="The delimiter marking the beginning of hidden tests cases"
@@ -81,8 +83,7 @@ class ClearHiddenTests(NbGraderPreprocessor):
 
         return removed_test
 
-    def preprocess(self, nb: NotebookNode, resources: ResourcesDict) -> Tuple[NotebookNode, ResourcesDict]:
-        nb, resources = super(ClearHiddenTests, self).preprocess(nb, resources)
+    def end_notebook(self, nb: NotebookNode, resources: ResourcesDict) -> Tuple[NotebookNode, ResourcesDict]:
         if 'celltoolbar' in nb.metadata:
             del nb.metadata['celltoolbar']
         return nb, resources
@@ -12,6 +12,8 @@ from typing import Tuple
 
 class ClearMarkScheme(NbGraderPreprocessor):
 
+    cell_level = True
+
     begin_mark_scheme_delimeter = Unicode(
         "BEGIN MARK SCHEME",
         help="The delimiter marking the beginning of hidden tests cases"
@@ -81,8 +83,7 @@ class ClearMarkScheme(NbGraderPreprocessor):
 
         return removed_ms
 
-    def preprocess(self, nb: NotebookNode, resources: ResourcesDict) -> Tuple[NotebookNode, ResourcesDict]:
-        nb, resources = super(ClearMarkScheme, self).preprocess(nb, resources)
+    def end_notebook(self, nb: NotebookNode, resources: ResourcesDict) -> Tuple[NotebookNode, ResourcesDict]:
         if 'celltoolbar' in nb.metadata:
             del nb.metadata['celltoolbar']
         return nb, resources
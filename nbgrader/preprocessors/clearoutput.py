@@ -2,4 +2,5 @@ from nbconvert.preprocessors import ClearOutputPreprocessor
 from . import NbGraderPreprocessor
 
 class ClearOutput(NbGraderPreprocessor, ClearOutputPreprocessor):
-    pass
\ No newline at end of file
+
+    cell_level = True
@@ -13,6 +13,8 @@ from nbconvert.exporters.exporter import ResourcesDict
 
 class ClearSolutions(NbGraderPreprocessor):
 
+    cell_level = True
+
     code_stub = Dict(
         dict(python="# YOUR CODE HERE\nraise NotImplementedError()",
              matlab="% YOUR CODE HERE\nerror('No Answer Given!')",
@@ -126,7 +128,7 @@ class ClearSolutions(NbGraderPreprocessor):
 
         return replaced_solution
 
-    def preprocess(self, nb: NotebookNode, resources: ResourcesDict) -> Tuple[NotebookNode, ResourcesDict]:
+    def begin_notebook(self, nb: NotebookNode, resources: ResourcesDict) -> Tuple[NotebookNode, ResourcesDict]:
         language = nb.metadata.get("kernelspec", {}).get("language", "python")
         if language not in self.code_stub:
             raise ValueError(
@@ -134,7 +136,9 @@ class ClearSolutions(NbGraderPreprocessor):
                 "ClearSolutions.code_stub".format(language))
 
         resources["language"] = language
-        nb, resources = super(ClearSolutions, self).preprocess(nb, resources)
+        return nb, resources
+
+    def end_notebook(self, nb: NotebookNode, resources: ResourcesDict) -> Tuple[NotebookNode, ResourcesDict]:
         if 'celltoolbar' in nb.metadata:
             del nb.metadata['celltoolbar']
         return nb, resources
@@ -7,6 +7,8 @@ from typing import Tuple
 class ComputeChecksums(NbGraderPreprocessor):
     """A preprocessor to compute checksums of grade cells."""
 
+    cell_level = True
+
     def preprocess_cell(self,
                         cell: NotebookNode,
                         resources: ResourcesDict,
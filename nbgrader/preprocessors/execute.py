@@ -1,3 +1,5 @@
+import json
+
 from nbconvert.preprocessors import ExecutePreprocessor
 from traitlets import Bool, List, Integer
 from textwrap import dedent
@@ -33,6 +35,50 @@ class Execute(NbGraderPreprocessor, ExecutePreprocessor):
         """)
     ).tag(config=True)
 
+    max_stream_lines = Integer(
+        10000,
+        help=dedent(
+            """
+            The maximum number of lines of stream output (stdout and stderr)
+            kept for each cell while it executes. Later output is dropped as
+            soon as it arrives, and replaced with a single truncation message,
+            so that code printing without end can't use up the memory of the
+            autograder. -1 means no limit. LimitOutput still truncates the
+            output further once the notebook has executed.
+            """
+        )
+    ).tag(config=True)
+
+    max_stream_bytes = Integer(
+        10000000,
+        help=dedent(
+            """
+            The maximum size in bytes of the stream output (stdout and
+            stderr) kept for each cell while it executes, as for
+            `max_stream_lines`. -1 means no limit.
+            """
+        )
+    ).tag(config=True)
+
+    max_output_bytes = Integer(
+        10000000,
+        help=dedent(
+            """
+            The maximum size in bytes of the data of a single rich output
+            (e.g. an image or an HTML table). Larger outputs are replaced with
+            a message saying that they were removed as soon as they arrive.
+            -1 means no limit.
+            """
+        )
+    ).tag(config=True)
+
+    stream_truncated_message = "... Output truncated ...\n"
+
+    # stream output of the cell being executed
+    _stream_lines = 0
+    _stream_bytes = 0
+    _stream_truncated = False
+
     def preprocess(self,
                    nb: NotebookNode,
                    resources: ResourcesDict,
@@ -55,3 +101,89 @@ class Execute(NbGraderPreprocessor, ExecutePreprocessor):
                 return self.preprocess(nb, resources, retries=retries - 1)
 
         return output
+
+    def preprocess_cell(self,
+                        cell: NotebookNode,
+                        resources: ResourcesDict,
+                        cell_index: int,
+                        **kwargs: Any
+                        ) -> Tuple[NotebookNode, ResourcesDict]:
+        self._reset_stream_limits()
+        return super(Execute, self).preprocess_cell(cell, resources, cell_index, **kwargs)
+
+    def process_message(self, msg: dict, cell: NotebookNode, cell_index: int) -> Optional[NotebookNode]:
+        msg_type = msg['msg_type']
+        if msg_type == 'stream':
+            msg = self._limit_stream(msg, cell_index)
+            if msg is None:
+                return None
+        elif msg_type in ('display_data', 'execute_result', 'update_display_data'):
+            msg = self._limit_rich_output(msg)
+        elif msg_type == 'clear_output':
+            # the output so far is (about to be) cleared, so it doesn't count
+            self._reset_stream_limits()
+        return super(Execute, self).process_message(msg, cell, cell_index)
+
+    def _reset_stream_limits(self) -> None:
+        self._stream_lines = 0
+        self._stream_bytes = 0
+        self._stream_truncated = False
+
+    def _limit_stream(self, msg: dict, cell_index: int) -> Optional[dict]:
+        """Count the stream output of the cell, returning the message with
+        its text cut at the limits (followed by the truncation message), or
+        None if the limits were already reached."""
+        if self._stream_truncated:
+            return None
+
+        text = msg['content']['text']
+        lines = text.count("\n")
+        size = len(text.encode("utf-8", "replace"))
+        over_lines = self.max_stream_lines != -1 and self._stream_lines + lines > self.max_stream_lines
+        over_bytes = self.max_stream_bytes != -1 and self._stream_bytes + size > self.max_stream_bytes
+        if not over_lines and not over_bytes:
+            self._stream_lines += lines
+            self._stream_bytes += size
+            return msg
+
+        lines = text.split("\n")
+        if lines[-1] == "":
+            lines.pop()
+        kept = []
+        for line in lines:
+            if self.max_stream_lines != -1 and self._stream_lines >= self.max_stream_lines:
+                break
+            line += "\n"
+            line_size = len(line.encode("utf-8", "replace"))
+            if self.max_stream_bytes != -1 and self._stream_bytes + line_size > self.max_stream_bytes:
+                break
+            kept.append(line)
+            self._stream_lines += 1
+            self._stream_bytes += line_size
+
+        self._stream_truncated = True
+        self.log.warning(
+            "Output of cell %d exceeds Execute.max_stream_lines or Execute.max_stream_bytes, truncating it",
+            cell_index)
+        text = "".join(kept)
+        return dict(msg, content=dict(msg['content'], text=text + self.stream_truncated_message))
+
+    def _limit_rich_output(self, msg: dict) -> dict:
+        """Replace the data of a rich output larger than max_output_bytes
+        with a message saying it was removed."""
+        if self.max_output_bytes == -1:
+            return msg
+
+        data = msg['content'].get('data', {})
+        size = 0
+        for value in data.values():
+            if not isinstance(value, str):
+                value = json.dumps(value)
+            size += len(value)
+        if size <= self.max_output_bytes:
+            return msg
+
+        mimetypes = ", ".join(sorted(data))
+        self.log.warning("Removing output of %d bytes (%s), see Execute.max_output_bytes", size, mimetypes)
+        text = "... Output removed, it was too large ({} bytes of {}) ...".format(size, mimetypes)
+        return dict(msg, content=dict(msg['content'], data={'text/plain': text}, metadata={}))
@@ -0,0 +1,68 @@
+from . import NbGraderPreprocessor
+
+from textwrap import dedent
+from traitlets import Bool, Integer, default
+from nbformat.notebooknode import NotebookNode
+from nbconvert.exporters.exporter import ResourcesDict
+from typing import Tuple
+
+from ..blobstore import BlobStore
+
+
+class ExternalizeOutputs(NbGraderPreprocessor):
+    """Preprocessor for moving large outputs into the course's blob store,
+    leaving a reference to them in the notebook"""
+
+    cell_level = True
+
+    min_size = Integer(
+        100000,
+        help=dedent(
+            """
+            Size (in bytes) above which the data of an output is moved into
+            the blob store. The plain text representation of outputs is
+            always kept in the notebook.
+            """
+        )
+    ).tag(config=True)
+
+    @default("enabled")
+    def _enabled_default(self) -> bool:
+        return False
+
+    def begin_notebook(self,
+                       nb: NotebookNode,
+                       resources: ResourcesDict,
+                       ) -> Tuple[NotebookNode, ResourcesDict]:
+        self.store = BlobStore(resources['nbgrader']['blob_directory'])
+        return nb, resources
+
+    def _externalize_output(self, output: NotebookNode) -> None:
+        for mimetype in list(output.data.keys()):
+            if mimetype == 'text/plain':
+                continue
+
+            data = output.data[mimetype]
+            if not isinstance(data, str):
+                continue
+
+            data = data.encode('utf-8')
+            if len(data) <= self.min_size:
+                continue
+
+            digest = self.store.put(data)
+            blobs = output.metadata.setdefault('nbgrader', {}).setdefault('blobs', {})
+            blobs[mimetype] = digest
+            del output.data[mimetype]
+
+    def preprocess_cell(self,
+                        cell: NotebookNode,
+                        resources: ResourcesDict,
+                        cell_index: int
+                        ) -> Tuple[NotebookNode, ResourcesDict]:
+        if cell.cell_type == 'code':
+            for output in cell.outputs:
+                if output.output_type in ('display_data', 'execute_result'):
+                    self._externalize_output(output)
+
+        return cell, resources
@@ -0,0 +1,74 @@
+from traitlets import List, Instance
+from nbconvert.preprocessors import Preprocessor
+from nbconvert.exporters.exporter import ResourcesDict
+from nbformat.notebooknode import NotebookNode
+from typing import List as TypingList, Tuple
+
+from . import NbGraderPreprocessor
+
+
+class FusedCellPreprocessor(NbGraderPreprocessor):
+    """A preprocessor running several cell-level preprocessors (see
+    :attr:`NbGraderPreprocessor.cell_level`) in a single pass over the cells.
+
+    Each cell goes through every preprocessor in turn before moving on to the
+    next cell, which gives the same notebook as running the preprocessors
+    one after the other, as none of them looks at the other cells.
+
+    """
+
+    preprocessors = List(Instance(NbGraderPreprocessor))
+
+    def preprocess(self, nb: NotebookNode, resources: ResourcesDict) -> Tuple[NotebookNode, ResourcesDict]:
+        for pp in self.preprocessors:
+            self.log.debug("Applying preprocessor: %s", pp.__class__.__name__)
+            nb, resources = pp.begin_notebook(nb, resources)
+
+        steps = [pp.preprocess_cell for pp in self.preprocessors]
+        cells = nb.cells
+        for index, cell in enumerate(cells):
+            for step in steps:
+                cell, resources = step(cell, resources, index)
+            cells[index] = cell
+
+        for pp in self.preprocessors:
+            nb, resources = pp.end_notebook(nb, resources)
+        return nb, resources
+
+
+def is_cell_level(preprocessor: Preprocessor) -> bool:
+    """Whether the preprocessor can be run by a
+    :class:`FusedCellPreprocessor`."""
+    return (
+        isinstance(preprocessor, NbGraderPreprocessor)
+        and preprocessor.cell_level
+        # a subclass that overrides preprocess may do anything
+        and type(preprocessor).preprocess is NbGraderPreprocessor.preprocess)
+
+
+def fuse_preprocessors(preprocessors: TypingList[Preprocessor], parent=None) -> TypingList[Preprocessor]:
+    """Replace each run of consecutive cell-level preprocessors in a chain
+    by a :class:`FusedCellPreprocessor`. The other preprocessors, which work
+    on the whole notebook, are kept as they are, and separate the runs.
+    Disabled cell-level preprocessors are dropped, as they would do nothing.
+
+    """
+    fused = []
+    run = []
+
+    def end_run():
+        if len(run) == 1:
+            fused.append(run[0])
+        elif run:
+            fused.append(FusedCellPreprocessor(preprocessors=list(run), parent=parent))
+        del run[:]
+
+    for pp in preprocessors:
+        if is_cell_level(pp):
+            if pp.enabled:
+                run.append(pp)
+        else:
+            end_run()
+            fused.append(pp)
+    end_run()
+    return fused
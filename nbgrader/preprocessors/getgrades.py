@@ -2,10 +2,12 @@ from traitlets import List
 
 from nbconvert.exporters.exporter import ResourcesDict
 from nbformat.notebooknode import NotebookNode
-from typing import Optional, Any, Tuple
+from typing import Optional, Any, Tuple, Dict
 
 from .. import utils
-from ..api import Gradebook
+from ..api import (
+    Gradebook, MissingEntry, Assignment, Notebook, SubmittedAssignment,
+    SubmittedNotebook, Student, BaseCell, Grade, Comment)
 from . import NbGraderPreprocessor
 
 
@@ -28,10 +30,14 @@ class GetGrades(NbGraderPreprocessor):
         self.gradebook = Gradebook(self.db_url)
 
         with self.gradebook:
+            # load the totals, grades and comments of the notebook up front,
+            # rather than querying for every cell
+            notebook = self._load_notebook()
+            self.grades = self._load_grades(notebook.id)
+            self.comments = self._load_comments(notebook.id)
+
             # process the cells
             nb, resources = super(GetGrades, self).preprocess(nb, resources)
-            notebook = self.gradebook.find_submission_notebook(
-                self.notebook_id, self.assignment_id, self.student_id)
 
             late_penalty = notebook.late_submission_penalty
             if late_penalty is None:
@@ -44,6 +50,44 @@ class GetGrades(NbGraderPreprocessor):
 
         return nb, resources
 
+    def _load_notebook(self) -> Any:
+        """Loads the id and the totals of the submitted notebook."""
+        notebook = self.gradebook.db.query(
+            SubmittedNotebook.id, SubmittedNotebook.score, SubmittedNotebook.max_score,
+            SubmittedNotebook.late_submission_penalty)\
+            .join(Notebook, Notebook.id == SubmittedNotebook.notebook_id)\
+            .join(SubmittedAssignment, SubmittedAssignment.id == SubmittedNotebook.assignment_id)\
+            .join(Assignment, Assignment.id == SubmittedAssignment.assignment_id)\
+            .join(Student, Student.id == SubmittedAssignment.student_id)\
+            .filter(
+                Notebook.name == self.notebook_id,
+                Assignment.name == self.assignment_id,
+                Student.id == self.student_id)\
+            .one_or_none()
+        if notebook is None:
+            raise MissingEntry("No such submitted notebook: {}/{} for {}".format(
+                self.assignment_id, self.notebook_id, self.student_id))
+        return notebook
+
+    def _load_grades(self, notebook_id: str) -> Dict[str, Any]:
+        """Loads the score and max score of every grade of the submitted
+        notebook, keyed by cell name. Grade cells take precedence over task
+        cells with the same name, like in :meth:`Gradebook.find_grade`."""
+        grades = self.gradebook.db.query(
+            BaseCell.name, BaseCell.type, Grade.score, Grade.max_score)\
+            .join(BaseCell, BaseCell.id == Grade.cell_id)\
+            .filter(Grade.notebook_id == notebook_id)
+        return {x.name: x for x in sorted(grades, key=lambda x: x.type == 'GradeCell')}
+
+    def _load_comments(self, notebook_id: str) -> Dict[str, Optional[str]]:
+        """Loads every comment of the submitted notebook, keyed by cell name.
+        Solution cells take precedence over task cells with the same name,
+        like in :meth:`Gradebook.find_comment`."""
+        comments = self.gradebook.db.query(BaseCell.name, BaseCell.type, Comment.comment)\
+            .join(BaseCell, BaseCell.id == Comment.cell_id)\
+            .filter(Comment.notebook_id == notebook_id)
+        return {x.name: x.comment for x in sorted(comments, key=lambda x: x.type == 'SolutionCell')}
+
     def _get_comment(self, cell: NotebookNode, resources: ResourcesDict) -> None:
         """Graders can optionally add comments to the student's solutions, so
         add the comment information into the database if it doesn't
@@ -52,22 +96,20 @@ class GetGrades(NbGraderPreprocessor):
 
         """
 
-        # retrieve or create the comment object from the database
-        comment = self.gradebook.find_comment(
-            cell.metadata['nbgrader']['grade_id'],
-            self.notebook_id,
-            self.assignment_id,
-            self.student_id)
+        grade_id = cell.metadata['nbgrader']['grade_id']
+        if grade_id not in self.comments:
+            raise MissingEntry("No such comment: {}/{}/{} for {}".format(
+                self.assignment_id, self.notebook_id, grade_id, self.student_id))
 
         # save it in the notebook
-        cell.metadata.nbgrader['comment'] = comment.comment
+        cell.metadata.nbgrader['comment'] = self.comments[grade_id]
 
     def _get_score(self, cell: NotebookNode, resources: ResourcesDict) -> None:
-        grade = self.gradebook.find_grade(
-            cell.metadata['nbgrader']['grade_id'],
-            self.notebook_id,
-            self.assignment_id,
-            self.student_id)
+        grade_id = cell.metadata['nbgrader']['grade_id']
+        grade = self.grades.get(grade_id)
+        if grade is None:
+            raise MissingEntry("No such grade: {}/{}/{} for {}".format(
+                self.assignment_id, self.notebook_id, grade_id, self.student_id))
 
         cell.metadata.nbgrader['score'] = grade.score
         cell.metadata.nbgrader['points'] = grade.max_score
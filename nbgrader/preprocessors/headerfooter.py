@@ -41,7 +41,6 @@ class IncludeHeaderFooter(NbGraderPreprocessor):
             new_cells.extend(footer_nb.cells)
 
         nb.cells = new_cells
-        super(IncludeHeaderFooter, self).preprocess(nb, resources)
 
         return nb, resources
 
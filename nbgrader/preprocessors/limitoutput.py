@@ -9,6 +9,8 @@ from typing import Tuple
 class LimitOutput(NbGraderPreprocessor):
     """Preprocessor for limiting cell output"""
 
+    cell_level = True
+
     max_lines = Integer(
         1000,
         help="maximum number of lines of output (-1 means no limit)"
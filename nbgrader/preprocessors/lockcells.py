@@ -9,6 +9,8 @@ from typing import Tuple
 class LockCells(NbGraderPreprocessor):
     """A preprocessor for making cells undeletable."""
 
+    cell_level = True
+
     lock_solution_cells = Bool(
         True,
         help="Whether solution cells are locked (non-deletable and non-editable)"
@@ -2,6 +2,7 @@ from nbformat.v4.nbbase import validate
 
 from .. import utils
 from ..api import Gradebook, MissingEntry
+from ..master import load_master_cells
 from . import NbGraderPreprocessor
 from nbconvert.exporters.exporter import ResourcesDict
 from nbformat.notebooknode import NotebookNode
@@ -17,13 +18,16 @@ class OverwriteCells(NbGraderPreprocessor):
         self.assignment_id = resources['nbgrader']['assignment']
         self.db_url = resources['nbgrader']['db_url']
 
-        # connect to the database
-        self.gradebook = Gradebook(self.db_url)
+        # the master notebook is the same for every submission, so the
+        # converter may have loaded it already
+        master = resources['nbgrader'].get('master')
+        if master is not None:
+            self.master_cells = master.cells
+        else:
+            with Gradebook(self.db_url) as gb:
+                self.master_cells = load_master_cells(gb, self.notebook_id, self.assignment_id)
 
-        with self.gradebook:
-            nb, resources = super(OverwriteCells, self).preprocess(nb, resources)
-
-        return nb, resources
+        return super(OverwriteCells, self).preprocess(nb, resources)
 
     def update_cell_type(self, cell: NotebookNode, cell_type: str) -> None:
         if cell.cell_type == cell_type:
@@ -54,12 +58,8 @@ class OverwriteCells(NbGraderPreprocessor):
         if grade_id is None:
             return cell, resources
 
-        try:
-            source_cell = self.gradebook.find_source_cell(
-                grade_id,
-                self.notebook_id,
-                self.assignment_id)
-        except MissingEntry:
+        source_cell = self.master_cells.get(grade_id)
+        if source_cell is None:
             self.log.warning("Cell '{}' does not exist in the database".format(grade_id))
             del cell.metadata.nbgrader['grade_id']
             return cell, resources
@@ -76,11 +76,10 @@ class OverwriteCells(NbGraderPreprocessor):
 
         # if it's a grade cell, check that the max score hasn't changed
         if utils.is_grade(cell):
-            grade_cell = self.gradebook.find_graded_cell(
-                grade_id,
-                self.notebook_id,
-                self.assignment_id)
-            old_points = float(grade_cell.max_score)
+            if source_cell.max_score is None:
+                raise MissingEntry("No such grade cell: {}/{}/{}".format(
+                    self.assignment_id, self.notebook_id, grade_id))
+            old_points = float(source_cell.max_score)
             new_points = float(cell.metadata.nbgrader["points"])
 
             if old_points != new_points:
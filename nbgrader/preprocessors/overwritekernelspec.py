@@ -16,18 +16,24 @@ class OverwriteKernelspec(NbGraderPreprocessor):
         assignment_id = resources['nbgrader']['assignment']
         db_url = resources['nbgrader']['db_url']
 
-        with Gradebook(db_url) as gb:
-            kernelspec = json.loads(
-                gb.find_notebook(notebook_id, assignment_id).kernelspec)
-            self.log.debug("Source notebook kernelspec: {}".format(kernelspec))
+        # the converter may have loaded the master notebook already
+        master = resources['nbgrader'].get('master')
+        if master is not None:
+            kernelspec = master.kernelspec
+        else:
+            with Gradebook(db_url) as gb:
+                kernelspec = gb.find_notebook(notebook_id, assignment_id).kernelspec
+
+        kernelspec = json.loads(kernelspec)
+        self.log.debug("Source notebook kernelspec: {}".format(kernelspec))
+        self.log.debug(
+            "Submitted notebook kernelspec: {}"
+            "".format(nb.metadata.get('kernelspec', None))
+        )
+        if kernelspec:
             self.log.debug(
-                "Submitted notebook kernelspec: {}"
-                "".format(nb.metadata.get('kernelspec', None))
+                "Overwriting submitted notebook kernelspec: {}"
+                "".format(kernelspec)
             )
-            if kernelspec:
-                self.log.debug(
-                    "Overwriting submitted notebook kernelspec: {}"
-                    "".format(kernelspec)
-                )
-                nb.metadata['kernelspec'] = kernelspec
+            nb.metadata['kernelspec'] = kernelspec
         return nb, resources
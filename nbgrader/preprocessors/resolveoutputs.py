@@ -0,0 +1,74 @@
+from . import NbGraderPreprocessor
+
+from textwrap import dedent
+from traitlets import Unicode
+from nbformat.notebooknode import NotebookNode
+from nbconvert.exporters.exporter import ResourcesDict
+from typing import Tuple
+
+from ..blobstore import BlobStore, blob_references
+
+
+class ResolveOutputs(NbGraderPreprocessor):
+    """Preprocessor for restoring outputs that were moved into the blob store
+    by :class:`~nbgrader.preprocessors.ExternalizeOutputs`"""
+
+    cell_level = True
+
+    #: Mimetypes that can be linked to with ``blob_url``, and the extension
+    #: of their URL.
+    linkable_mimetypes = {
+        'image/png': 'png',
+        'image/jpeg': 'jpg',
+    }
+
+    blob_url = Unicode(
+        "",
+        help=dedent(
+            """
+            If set, images in the blob store are linked to as
+            <blob_url>/<digest>.<extension> instead of being embedded in the
+            notebook, so that they are only loaded when they are displayed.
+            Other outputs are always embedded.
+            """
+        )
+    ).tag(config=True)
+
+    def begin_notebook(self,
+                       nb: NotebookNode,
+                       resources: ResourcesDict,
+                       ) -> Tuple[NotebookNode, ResourcesDict]:
+        self.store = BlobStore(resources['nbgrader']['blob_directory'])
+        return nb, resources
+
+    def _resolve_output(self, output: NotebookNode) -> None:
+        blobs = blob_references(output)
+        for mimetype, digest in blobs.items():
+            if self.blob_url and mimetype in self.linkable_mimetypes:
+                url = "{}/{}.{}".format(
+                    self.blob_url.rstrip('/'), digest, self.linkable_mimetypes[mimetype])
+                output.metadata.setdefault('filenames', {})[mimetype] = url
+                output.data[mimetype] = ""
+                continue
+
+            try:
+                output.data[mimetype] = self.store.get(digest).decode('utf-8')
+            except (OSError, ValueError) as e:
+                self.log.warning("Could not load %s output from the blob store: %s", mimetype, e)
+
+        if blobs:
+            del output.metadata['nbgrader']['blobs']
+            if not output.metadata['nbgrader']:
+                del output.metadata['nbgrader']
+
+    def preprocess_cell(self,
+                        cell: NotebookNode,
+                        resources: ResourcesDict,
+                        cell_index: int
+                        ) -> Tuple[NotebookNode, ResourcesDict]:
+        if cell.cell_type == 'code':
+            for output in cell.outputs:
+                if output.output_type in ('display_data', 'execute_result'):
+                    self._resolve_output(output)
+
+        return cell, resources
@@ -3,8 +3,8 @@ import os
 
 from tornado import web
 
-from .base import BaseApiHandler, check_xsrf, check_notebook_dir
-from ...api import MissingEntry
+from .base import BaseApiHandler, check_xsrf, check_notebook_dir, check_revision
+from ...api import MissingEntry, InvalidEntry, StaleEntry
 from ...exchange import ExchangeList
 
 
@@ -19,6 +19,7 @@ class GradeCollectionHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
+    @check_revision
     def get(self):
         submission_id = self.get_argument("submission_id")
         try:
@@ -32,6 +33,7 @@ class CommentCollectionHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
+    @check_revision
     def get(self):
         submission_id = self.get_argument("submission_id")
         try:
@@ -45,6 +47,7 @@ class GradeHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
+    @check_revision
     def get(self, grade_id):
         try:
             grade = self.gradebook.find_grade_by_id(grade_id)
@@ -61,6 +64,8 @@ class GradeHandler(BaseApiHandler):
         except MissingEntry:
             raise web.HTTPError(404)
 
+        self.check_version(grade)
+        revision = self.gradebook.revision_key
         data = self.get_json_body()
         grade.manual_score = data.get("manual_score", None)
         grade.extra_credit = data.get("extra_credit", None)
@@ -69,6 +74,7 @@ class GradeHandler(BaseApiHandler):
         else:
             grade.needs_manual_grade = False
         self.gradebook.db.commit()
+        self.navigation_index.grades_changed(revision, self.gradebook.revision_key)
         self.write(json.dumps(grade.to_dict()))
 
 
@@ -76,6 +82,7 @@ class CommentHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
+    @check_revision
     def get(self, grade_id):
         try:
             comment = self.gradebook.find_comment_by_id(grade_id)
@@ -92,12 +99,47 @@ class CommentHandler(BaseApiHandler):
         except MissingEntry:
             raise web.HTTPError(404)
 
+        self.check_version(comment)
+        revision = self.gradebook.revision_key
         data = self.get_json_body()
         comment.manual_comment = data.get("manual_comment", None)
         self.gradebook.db.commit()
+        self.navigation_index.grades_changed(revision, self.gradebook.revision_key)
         self.write(json.dumps(comment.to_dict()))
 
 
+class GradeBatchHandler(BaseApiHandler):
+    @web.authenticated
+    @check_xsrf
+    @check_notebook_dir
+    def put(self):
+        data = self.get_json_body() or {}
+        grades = data.get("grades", [])
+        comments = data.get("comments", [])
+        if not isinstance(grades, list) or not isinstance(comments, list):
+            raise web.HTTPError(400, "Expected lists of grades and comments")
+        for update in grades + comments:
+            if not isinstance(update, dict) or "version" not in update:
+                raise web.HTTPError(400, "Every update must include a version")
+
+        revision = self.gradebook.revision_key
+        try:
+            grades, comments = self.gradebook.update_grades_and_comments(
+                grades=grades, comments=comments)
+        except MissingEntry as e:
+            raise web.HTTPError(404, str(e))
+        except InvalidEntry as e:
+            raise web.HTTPError(400, str(e))
+        except StaleEntry as e:
+            raise web.HTTPError(409, str(e))
+
+        self.navigation_index.grades_changed(revision, self.gradebook.revision_key)
+        self.write(json.dumps({
+            "grades": [g.to_dict() for g in grades],
+            "comments": [c.to_dict() for c in comments]
+        }))
+
+
 class FlagSubmissionHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
@@ -338,6 +380,8 @@ default_handlers = [
     (r"/formgrader/api/grades", GradeCollectionHandler),
     (r"/formgrader/api/grade/([^/]+)", GradeHandler),
 
+    (r"/formgrader/api/batch", GradeBatchHandler),
+
     (r"/formgrader/api/comments", CommentCollectionHandler),
     (r"/formgrader/api/comment/([^/]+)", CommentHandler),
 
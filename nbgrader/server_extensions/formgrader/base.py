@@ -1,13 +1,110 @@
 import os
 import json
+import bisect
+import hashlib
 import functools
 
 from tornado import web
 from notebook.base.handlers import IPythonHandler
-from ...api import Gradebook
+from ...api import gradebook_factory
 from ...apps.api import NbGraderAPI
 
 
+class NotebookNavigation(object):
+    """Ordered submissions of one notebook, along with which of them have
+    failed tests, so that the next and previous (incorrect) submission can be
+    looked up without querying the gradebook."""
+
+    def __init__(self, revision, submissions):
+        #: Gradebook revision this navigation was built from
+        self.revision = revision
+        submissions = sorted(submissions, key=lambda x: x.id)
+        #: Sorted ids of the submissions
+        self.ids = [x.id for x in submissions]
+        self._positions = {x: i for i, x in enumerate(self.ids)}
+
+        # for each position, the nearest submission with failed tests at or
+        # after it, and at or before it
+        n = len(self.ids)
+        self._next_failed = [None] * (n + 1)
+        self._prev_failed = [None] * (n + 1)
+        for i in range(n - 1, -1, -1):
+            failed = submissions[i].failed_tests
+            self._next_failed[i] = i if failed else self._next_failed[i + 1]
+        for i in range(n):
+            failed = submissions[i].failed_tests
+            self._prev_failed[i + 1] = i if failed else self._prev_failed[i]
+
+    def _after(self, submission_id):
+        # position of the first submission after the given one
+        if submission_id in self._positions:
+            return self._positions[submission_id] + 1
+        return bisect.bisect_right(self.ids, submission_id)
+
+    def _before(self, submission_id):
+        # position just after the last submission before the given one
+        if submission_id in self._positions:
+            return self._positions[submission_id]
+        return bisect.bisect_left(self.ids, submission_id)
+
+    def next(self, submission_id, incorrect=False):
+        """Return the id of the submission after the given one, or None if
+        it is the last one."""
+        ix = self._after(submission_id)
+        if incorrect:
+            ix = self._next_failed[ix]
+        if ix is None or ix >= len(self.ids):
+            return None
+        return self.ids[ix]
+
+    def prev(self, submission_id, incorrect=False):
+        """Return the id of the submission before the given one, or None if
+        it is the first one."""
+        ix = self._before(submission_id) - 1
+        if incorrect:
+            ix = self._prev_failed[ix + 1]
+        if ix is None or ix < 0:
+            return None
+        return self.ids[ix]
+
+
+class NavigationIndex(object):
+    """Navigation between submissions of each notebook in the formgrader.
+
+    Each notebook's navigation is built once and reused for as long as the
+    gradebook revision it was built from is current. Manual grades and
+    comments do not change the order of submissions or which of them failed
+    tests, so writing them carries the navigation over to the new revision
+    rather than forcing it to be rebuilt.
+
+    """
+
+    def __init__(self):
+        self._notebooks = {}
+
+    def get(self, gradebook, assignment_id, notebook_id, load_submissions):
+        """Return the :class:`NotebookNavigation` of a notebook. If the
+        gradebook has changed since it was last built, it is rebuilt from the
+        submissions returned by ``load_submissions()``."""
+        revision = gradebook.revision_key
+        navigation = self._notebooks.get((assignment_id, notebook_id))
+        if navigation is None or navigation.revision != revision:
+            navigation = NotebookNavigation(revision, load_submissions())
+            self._notebooks[(assignment_id, notebook_id)] = navigation
+        return navigation
+
+    def grades_changed(self, old_revision, new_revision):
+        """Carry navigation that was current at ``old_revision`` over to
+        ``new_revision``, if the only change in between was a single write of
+        grades and comments."""
+        db_id, value = old_revision
+        if new_revision != (db_id, value + 1):
+            return
+        for navigation in self._notebooks.values():
+            if navigation.revision == old_revision:
+                navigation.revision = new_revision
+
+
 class BaseHandler(IPythonHandler):
 
     @property
@@ -35,10 +132,18 @@ class BaseHandler(IPythonHandler):
         gb = self.settings['nbgrader_gradebook']
         if gb is None:
             self.log.debug("creating gradebook")
-            gb = Gradebook(self.db_url, self.coursedir.course_id)
+            gb = gradebook_factory(self.db_url, self.coursedir.course_id)
             self.settings['nbgrader_gradebook'] = gb
         return gb
 
+    @property
+    def navigation_index(self):
+        index = self.settings['nbgrader_navigation_index']
+        if index is None:
+            index = NavigationIndex()
+            self.settings['nbgrader_navigation_index'] = index
+        return index
+
     @property
     def mathjax_url(self):
         return self.settings['mathjax_url']
@@ -100,6 +205,21 @@ class BaseApiHandler(BaseHandler):
             raise web.HTTPError(400, 'Invalid JSON in body of request')
         return model
 
+    def check_version(self, entry):
+        """If the request has a ``version`` argument, make sure it is the
+        current version of the grade or comment being updated, so that
+        changes made by another grader are not silently overwritten."""
+        version = self.get_argument("version", None)
+        if version is None:
+            return
+        try:
+            version = int(version)
+        except ValueError:
+            raise web.HTTPError(400, "Invalid version: {}".format(version))
+        if version != entry.version:
+            raise web.HTTPError(409, "{} {} has been modified (version is {}, expected {})".format(
+                entry.__tablename__, entry.id, entry.version, version))
+
 
 def check_xsrf(f):
     @functools.wraps(f)
@@ -116,3 +236,19 @@ def check_notebook_dir(f):
             return self.write_error(500)
         return f(self, *args, **kwargs)
     return wrapper
+
+
+def check_revision(f):
+    """Answer GET requests for data that only comes from the gradebook with
+    304 Not Modified if the gradebook has not changed since the client last
+    fetched it."""
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        db_id, revision = self.gradebook.revision_key
+        key = "{}:{}:{}".format(db_id, revision, self.request.uri)
+        self.set_header("Etag", '"{}"'.format(hashlib.sha1(key.encode("utf-8")).hexdigest()))
+        if self.check_etag_header():
+            self.set_status(304)
+            return
+        return f(self, *args, **kwargs)
+    return wrapper
@@ -10,6 +10,8 @@ from notebook.utils import url_path_join as ujoin
 
 from . import handlers, apihandlers
 from ...apps.baseapp import NbGrader
+from ...preprocessors import ResolveOutputs
+from ...notebookio import NotebookIOHTMLExporter
 
 
 class FormgradeExtension(NbGrader):
@@ -46,13 +48,21 @@ class FormgradeExtension(NbGrader):
         else:
             nbgrader_bad_setup = False
 
+        # Outputs that autograde moved into the blob store are put back when
+        # a submission is rendered, with images linked to rather than embedded
+        exporter = NotebookIOHTMLExporter(config=self.config)
+        exporter.register_preprocessor(ResolveOutputs(
+            parent=exporter,
+            blob_url=ujoin(webapp.settings['base_url'], 'formgrader', 'blobs')), enabled=True)
+
         # Configure the formgrader settings
         tornado_settings = dict(
             nbgrader_url_prefix=os.path.relpath(self.coursedir.root, self.parent.notebook_dir),
             nbgrader_coursedir=self.coursedir,
             nbgrader_authenticator=self.authenticator,
-            nbgrader_exporter=HTMLExporter(config=self.config),
+            nbgrader_exporter=exporter,
             nbgrader_gradebook=None,
+            nbgrader_navigation_index=None,
             nbgrader_db_url=self.coursedir.db_url,
             nbgrader_jinja2_env=jinja_env,
             nbgrader_bad_setup=nbgrader_bad_setup
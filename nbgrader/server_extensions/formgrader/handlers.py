@@ -1,11 +1,13 @@
 import os
 import re
 import sys
+import base64
 
 from tornado import web
 
 from .base import BaseHandler, check_xsrf, check_notebook_dir
 from ...api import MissingEntry
+from ...blobstore import BlobStore
 
 
 class ManageAssignmentsHandler(BaseHandler):
@@ -111,7 +113,10 @@ class SubmissionHandler(BaseHandler):
             'student': student_id,
             'last_name': submission.student.last_name,
             'first_name': submission.student.first_name,
-            'notebook_path': self.url_prefix + '/' + relative_path
+            'notebook_path': self.url_prefix + '/' + relative_path,
+            'nbgrader': {
+                'blob_directory': self.coursedir.blob_directory
+            }
         }
 
         if not os.path.exists(filename):
@@ -138,54 +143,44 @@ class SubmissionNavigationHandler(BaseHandler):
         else:
             return url
 
-    def _get_submission_ids(self, assignment_id, notebook_id):
+    def _get_submissions(self, assignment_id, notebook_id):
         notebooks = self.gradebook.notebook_submissions(notebook_id, assignment_id)
-        submissions = self.api._filter_existing_notebooks(assignment_id, notebooks)
-        return sorted([x.id for x in submissions])
+        return self.api._filter_existing_notebooks(assignment_id, notebooks)
 
-    def _get_incorrect_submission_ids(self, assignment_id, notebook_id, submission):
-        notebooks = self.gradebook.notebook_submissions(notebook_id, assignment_id)
-        submissions = self.api._filter_existing_notebooks(assignment_id, notebooks)
-        incorrect_ids = set([x.id for x in submissions if x.failed_tests])
-        incorrect_ids.add(submission.id)
-        incorrect_ids = sorted(incorrect_ids)
-        return incorrect_ids
+    def _navigation(self, assignment_id, notebook_id):
+        return self.navigation_index.get(
+            self.gradebook, assignment_id, notebook_id,
+            lambda: self._get_submissions(assignment_id, notebook_id))
 
-    def _next(self, assignment_id, notebook_id, submission):
-        # find next submission
-        submission_ids = self._get_submission_ids(assignment_id, notebook_id)
-        ix = submission_ids.index(submission.id)
-        if ix == (len(submission_ids) - 1):
+    def _redirect_url(self, assignment_id, notebook_id, submission_id):
+        if submission_id is None:
             return self._assignment_notebook_list_url(assignment_id, notebook_id)
         else:
-            return self._submission_url(submission_ids[ix + 1])
+            return self._submission_url(submission_id)
+
+    def _next(self, assignment_id, notebook_id, submission):
+        # find next submission
+        navigation = self._navigation(assignment_id, notebook_id)
+        return self._redirect_url(
+            assignment_id, notebook_id, navigation.next(submission.id))
 
     def _prev(self, assignment_id, notebook_id, submission):
         # find previous submission
-        submission_ids = self._get_submission_ids(assignment_id, notebook_id)
-        ix = submission_ids.index(submission.id)
-        if ix == 0:
-            return self._assignment_notebook_list_url(assignment_id, notebook_id)
-        else:
-            return self._submission_url(submission_ids[ix - 1])
+        navigation = self._navigation(assignment_id, notebook_id)
+        return self._redirect_url(
+            assignment_id, notebook_id, navigation.prev(submission.id))
 
     def _next_incorrect(self, assignment_id, notebook_id, submission):
         # find next incorrect submission
-        submission_ids = self._get_incorrect_submission_ids(assignment_id, notebook_id, submission)
-        ix_incorrect = submission_ids.index(submission.id)
-        if ix_incorrect == (len(submission_ids) - 1):
-            return self._assignment_notebook_list_url(assignment_id, notebook_id)
-        else:
-            return self._submission_url(submission_ids[ix_incorrect + 1])
+        navigation = self._navigation(assignment_id, notebook_id)
+        return self._redirect_url(
+            assignment_id, notebook_id, navigation.next(submission.id, incorrect=True))
 
     def _prev_incorrect(self, assignment_id, notebook_id, submission):
         # find previous incorrect submission
-        submission_ids = self._get_incorrect_submission_ids(assignment_id, notebook_id, submission)
-        ix_incorrect = submission_ids.index(submission.id)
-        if ix_incorrect == 0:
-            return self._assignment_notebook_list_url(assignment_id, notebook_id)
-        else:
-            return self._submission_url(submission_ids[ix_incorrect - 1])
+        navigation = self._navigation(assignment_id, notebook_id)
+        return self._redirect_url(
+            assignment_id, notebook_id, navigation.prev(submission.id, incorrect=True))
 
     @web.authenticated
     @check_xsrf
@@ -229,6 +224,31 @@ class SubmissionFilesHandler(web.StaticFileHandler, BaseHandler):
         return super(SubmissionFilesHandler, self).get(*args, **kwargs)
 
 
+class BlobHandler(BaseHandler):
+    """Serves the images that autograde moved into the blob store, which
+    the submission pages link to instead of embedding them."""
+
+    content_types = {
+        'png': 'image/png',
+        'jpg': 'image/jpeg',
+    }
+
+    @web.authenticated
+    @check_xsrf
+    @check_notebook_dir
+    def get(self, digest, extension):
+        store = BlobStore(self.coursedir.blob_directory)
+        try:
+            data = store.get(digest)
+        except FileNotFoundError:
+            raise web.HTTPError(404, "Invalid blob: {}".format(digest))
+
+        # blobs never change, so they can be cached forever
+        self.set_header('Content-Type', self.content_types[extension])
+        self.set_header('Cache-Control', 'private, max-age=31536000, immutable')
+        self.write(base64.b64decode(data))
+
+
 class ManageStudentsHandler(BaseHandler):
     @web.authenticated
     @check_xsrf
@@ -299,5 +319,7 @@ default_handlers = [
     (r"/formgrader/submissions/(?P<submission_id>[^/]+)/%s/?" % _navigation_regex, SubmissionNavigationHandler),
     (r"/formgrader/submissions/(.*)", SubmissionFilesHandler),
 
+    (r"/formgrader/blobs/([0-9a-f]{64})\.(png|jpg)", BlobHandler),
+
     (r"/formgrader/fonts/(.*)", web.StaticFileHandler, {'path': fonts_path}),
 ]
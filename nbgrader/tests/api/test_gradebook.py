@@ -1,9 +1,11 @@
+import os
 import pytest
 
 from datetime import datetime, timedelta
 from ... import api
 from ... import utils
-from ...api import InvalidEntry, MissingEntry
+from ...api import InvalidEntry, MissingEntry, StaleEntry
+from sqlalchemy import event
 from _pytest.fixtures import SubRequest
 from nbgrader.api import Gradebook
 
@@ -204,6 +206,80 @@ def test_init(gradebook: Gradebook) -> None:
     assert gradebook.assignments == []
 
 
+def test_gradebook_factory(tmpdir):
+    db_url = "sqlite:///{}".format(tmpdir.join("gradebook.db"))
+    factory = api.GradebookFactory()
+
+    with factory(db_url) as gb:
+        gb.add_student("hacker123")
+        engine = gb.engine
+
+    # the engine is shared, and survives the gradebook being closed
+    with factory(db_url) as gb:
+        assert gb.engine is engine
+        assert [x.id for x in gb.students] == ["hacker123"]
+    assert engine.pool.checkedout() == 0
+
+    factory.dispose()
+    with factory(db_url) as gb:
+        assert gb.engine is not engine
+        assert [x.id for x in gb.students] == ["hacker123"]
+    factory.dispose()
+
+
+def test_gradebook_factory_initializes_once(tmpdir):
+    db_url = "sqlite:///{}".format(tmpdir.join("gradebook.db"))
+    factory = api.GradebookFactory()
+    with factory(db_url) as gb:
+        engine = gb.engine
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        with factory(db_url):
+            pass
+        assert statements == []
+
+        # another course still gets created
+        with factory(db_url, course_id="other") as gb:
+            assert gb.db.query(api.Course).filter(api.Course.id == "other").count() == 1
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+        factory.dispose()
+
+
+def test_gradebook_factory_replaced_database(tmpdir):
+    db_path = str(tmpdir.join("gradebook.db"))
+    db_url = "sqlite:///{}".format(db_path)
+    factory = api.GradebookFactory()
+
+    with factory(db_url) as gb:
+        gb.add_student("hacker123")
+        engine = gb.engine
+
+    # the database is deleted, and the factory creates a new one
+    os.remove(db_path)
+    with factory(db_url) as gb:
+        assert gb.engine is not engine
+        assert gb.students == []
+        gb.add_student("bitdiddle")
+        engine = gb.engine
+
+    # the database is replaced by another one
+    with api.Gradebook("sqlite:///{}".format(tmpdir.join("other.db"))) as gb:
+        gb.add_student("foo")
+    os.replace(str(tmpdir.join("other.db")), db_path)
+    with factory(db_url) as gb:
+        assert gb.engine is not engine
+        assert [x.id for x in gb.students] == ["foo"]
+
+    factory.dispose()
+
+
 # Test students
 
 def test_add_student(gradebook):
@@ -838,6 +914,87 @@ def test_find_comment_by_id(assignment):
         assignment.find_comment_by_id('12345')
 
 
+def test_update_grades_and_comments(assignment):
+    assignment.add_student('hacker123')
+    assignment.add_student('bitdiddle')
+    assignment.add_submission('foo', 'hacker123')
+    assignment.add_submission('foo', 'bitdiddle')
+
+    g1 = assignment.find_grade('test1', 'p1', 'foo', 'hacker123')
+    g2 = assignment.find_grade('test1', 'p1', 'foo', 'bitdiddle')
+    c1 = assignment.find_comment('solution1', 'p1', 'foo', 'hacker123')
+    assert g1.version == 1
+    assert c1.version == 1
+
+    grades, comments = assignment.update_grades_and_comments(
+        grades=[
+            {'id': g1.id, 'manual_score': 1, 'version': 1},
+            {'id': g2.id, 'manual_score': '0.5', 'extra_credit': 0.25}],
+        comments=[{'id': c1.id, 'manual_comment': 'great job'}])
+
+    assert grades == [g1, g2]
+    assert comments == [c1]
+    assert g1.manual_score == 1
+    assert g1.extra_credit is None
+    assert not g1.needs_manual_grade
+    assert g1.version == 2
+    assert g2.manual_score == 0.5
+    assert g2.extra_credit == 0.25
+    assert c1.manual_comment == 'great job'
+    assert c1.version == 2
+
+    # unsetting the score means it needs to be graded again
+    assignment.update_grades_and_comments(grades=[{'id': g1.id, 'manual_score': None}])
+    assert g1.manual_score is None
+    assert g1.needs_manual_grade
+
+
+def test_update_grades_and_comments_invalid(assignment):
+    assignment.add_student('hacker123')
+    assignment.add_submission('foo', 'hacker123')
+    g1 = assignment.find_grade('test1', 'p1', 'foo', 'hacker123')
+    g2 = assignment.find_grade('test2', 'p1', 'foo', 'hacker123')
+    c1 = assignment.find_comment('solution1', 'p1', 'foo', 'hacker123')
+
+    with pytest.raises(MissingEntry):
+        assignment.update_grades_and_comments(
+            grades=[{'id': g1.id, 'manual_score': 1}, {'id': '12345', 'manual_score': 1}])
+    with pytest.raises(InvalidEntry):
+        assignment.update_grades_and_comments(
+            grades=[{'id': g1.id, 'manual_score': 1}, {'id': g2.id, 'manual_score': 'foo'}])
+    with pytest.raises(InvalidEntry):
+        assignment.update_grades_and_comments(
+            grades=[{'id': g1.id, 'manual_score': 1}, {'id': g1.id, 'manual_score': 2}])
+    with pytest.raises(InvalidEntry):
+        assignment.update_grades_and_comments(comments=[{'id': c1.id, 'manual_comment': 5}])
+    with pytest.raises(InvalidEntry):
+        assignment.update_grades_and_comments(comments=[{'manual_comment': 'foo'}])
+
+    # nothing should have been changed
+    assert g1.manual_score is None
+    assert g1.version == 1
+    assert c1.manual_comment is None
+
+
+def test_update_grades_and_comments_stale(assignment):
+    assignment.add_student('hacker123')
+    assignment.add_submission('foo', 'hacker123')
+    g1 = assignment.find_grade('test1', 'p1', 'foo', 'hacker123')
+    g2 = assignment.find_grade('test2', 'p1', 'foo', 'hacker123')
+
+    # somebody else grades the first cell
+    assignment.update_grades_and_comments(grades=[{'id': g1.id, 'manual_score': 1, 'version': 1}])
+
+    with pytest.raises(StaleEntry):
+        assignment.update_grades_and_comments(grades=[
+            {'id': g2.id, 'manual_score': 2, 'version': 1},
+            {'id': g1.id, 'manual_score': 0, 'version': 1}])
+
+    assert g1.manual_score == 1
+    assert g2.manual_score is None
+    assert g2.version == 1
+
+
 # Test average scores
 
 def test_average_assignment_score(assignment):
@@ -932,6 +1089,84 @@ def test_student_dicts_zero_points(gradebook):
     assert gradebook.student_dicts() == [s.to_dict()]
 
 
+def test_revision(assignment):
+    revision = assignment.revision
+    assignment.find_notebook("p1", "foo")
+    assignment.student_dicts()
+    assert assignment.revision == revision
+
+    assignment.add_student('hacker123')
+    assert assignment.revision == revision + 1
+
+    assignment.add_submission('foo', 'hacker123')
+    grade = assignment.find_grade("test1", "p1", "foo", "hacker123")
+    revision = assignment.revision
+    grade.manual_score = 0.5
+    assignment.db.commit()
+    assert assignment.revision == revision + 1
+
+    # several flushes in one transaction are a single revision
+    revision = assignment.revision
+    grade.manual_score = 1
+    assignment.db.flush()
+    grade.extra_credit = 1
+    assignment.db.commit()
+    assert assignment.revision == revision + 1
+
+
+def test_revision_bulk_and_raw_writes(assignment):
+    assignment.add_student('hacker123')
+    assignment.add_submission('foo', 'hacker123')
+
+    revision = assignment.revision
+    assignment.db.query(api.Grade).update({"manual_score": 0.5})
+    assignment.db.commit()
+    assert assignment.revision == revision + 1
+
+    assignment.db.execute("UPDATE grade SET extra_credit = 1")
+    assignment.db.commit()
+    assert assignment.revision == revision + 2
+
+    # reading doesn't change the revision
+    assignment.db.execute("SELECT * FROM grade").fetchall()
+    assignment.db.commit()
+    assert assignment.revision == revision + 2
+
+
+def test_student_dicts_cached(assignment):
+    assignment.add_student('hacker123')
+    assignment.add_submission('foo', 'hacker123')
+
+    students = assignment.student_dicts()
+    assert students[0]["score"] == 0
+    students[0]["score"] = 10
+    assert assignment.student_dicts()[0]["score"] == 0
+
+    grade = assignment.find_grade("test1", "p1", "foo", "hacker123")
+    grade.manual_score = 0.5
+    assignment.db.commit()
+    assert assignment.student_dicts()[0]["score"] == 0.5
+
+
+def test_student_dicts_not_cached_when_rolled_back(assignment):
+    assignment.add_student('hacker123')
+    assignment.add_submission('foo', 'hacker123')
+    revision = assignment.revision
+
+    # computed from uncommitted (and already flushed) changes
+    grade = assignment.find_grade("test1", "p1", "foo", "hacker123")
+    grade.manual_score = 0.5
+    assignment.db.flush()
+    assert assignment.student_dicts()[0]["score"] == 0.5
+    assignment.db.rollback()
+    assert assignment.revision == revision
+
+    # the next commit gets the revision the rolled back changes had
+    assignment.add_student('bitdiddle')
+    assert assignment.revision == revision + 1
+    assert assignment.student_dicts()[0]["score"] == 0
+
+
 def test_notebook_submission_dicts(assignment):
     assignment.add_student('hacker123')
     assignment.add_student('bitdiddle')
@@ -1305,6 +1540,15 @@ def test_submission_dicts_multiple_students(FiveStudents):
     assert a == b
 
 
+def test_student_submission_dicts(FiveStudents):
+    assign = FiveStudents
+    for student in assign.students:
+        a = sorted(assign.student_submission_dicts(student.id), key=lambda x: x["id"])
+        b = sorted([x.to_dict() for x in student.submissions], key=lambda x: x["id"])
+        assert len(a) > 0
+        assert a == b
+
+
 def test_submission_dicts_multiple_notebooks(FiveNotebooks):
     assign = FiveNotebooks
     a = sorted(assign.submission_dicts("a1"), key=lambda x: x["id"])
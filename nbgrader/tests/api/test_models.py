@@ -1239,7 +1239,7 @@ def test_grade_to_dict(submissions):
         assert set(gd.keys()) == {
             'id', 'name', 'notebook', 'assignment', 'student', 'auto_score',
             'manual_score', 'max_score', 'needs_manual_grade', 'failed_tests',
-            'cell_type', 'extra_credit'}
+            'cell_type', 'extra_credit', 'version'}
 
         assert gd['id'] == g.id
         assert gd['name'] == g.name
@@ -1264,7 +1264,7 @@ def test_comment_to_dict(submissions):
         cd = c.to_dict()
         assert set(cd.keys()) == {
             'id', 'name', 'notebook', 'assignment', 'student', 'auto_comment',
-            'manual_comment'}
+            'manual_comment', 'version'}
 
         assert cd['id'] == c.id
         assert cd['name'] == c.name
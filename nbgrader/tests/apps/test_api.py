@@ -603,6 +603,33 @@ class TestNbGraderAPI(BaseTestApp):
 
         assert api.get_student_submissions("foo") == [api.get_submission("ps1", "foo")]
 
+    def test_get_student_submissions_multiple(self, api, course_dir, db):
+        self._copy_file(join("files", "submitted-unchanged.ipynb"), join(course_dir, "source", "ps1", "p1.ipynb"))
+        self._copy_file(join("files", "submitted-unchanged.ipynb"), join(course_dir, "source", "ps2", "p1.ipynb"))
+        self._copy_file(join("files", "submitted-unchanged.ipynb"), join(course_dir, "source", "ps3", "p1.ipynb"))
+        run_nbgrader(["generate_assignment", "ps1", "--db", db])
+        run_nbgrader(["generate_assignment", "ps2", "--db", db])
+        run_nbgrader(["generate_assignment", "ps3", "--db", db])
+
+        # ps1 is autograded, ps2 is submitted but not autograded, ps3 is not submitted
+        self._copy_file(join("files", "submitted-changed.ipynb"), join(course_dir, "submitted", "foo", "ps1", "p1.ipynb"))
+        self._make_file(join(course_dir, "submitted", "foo", "ps1", "timestamp.txt"), contents="2017-07-05T12:32:56.123456")
+        run_nbgrader(["autograde", "ps1", "--no-execute", "--force", "--db", db])
+        self._copy_file(join("files", "submitted-changed.ipynb"), join(course_dir, "submitted", "foo", "ps2", "p1.ipynb"))
+        self._make_file(join(course_dir, "submitted", "foo", "ps2", "timestamp.txt"), contents="2017-07-06T12:32:56.123456")
+
+        submissions = api.get_student_submissions("foo")
+        assert [x["name"] for x in submissions] == ["ps1", "ps2", "ps3"]
+        assert [x["autograded"] for x in submissions] == [True, False, False]
+        assert [x["submitted"] for x in submissions] == [True, True, False]
+        assert submissions == [api.get_submission(x, "foo") for x in ["ps1", "ps2", "ps3"]]
+
+        # a newer submission means the autograded version is out of date
+        self._make_file(join(course_dir, "submitted", "foo", "ps1", "timestamp.txt"), contents="2017-07-07T12:32:56.123456")
+        submissions = api.get_student_submissions("foo")
+        assert [x["autograded"] for x in submissions] == [False, False, False]
+        assert submissions == [api.get_submission(x, "foo") for x in ["ps1", "ps2", "ps3"]]
+
     def test_get_student_notebook_submissions(self, api, course_dir, db):
         assert api.get_student_notebook_submissions("foo", "ps1") == []
 
@@ -1,6 +1,9 @@
 import os
+import json
 import time
+import shutil
 import pytest
+import threading
 
 from os.path import join
 
@@ -8,6 +11,8 @@ from .. import run_nbgrader
 from .base import BaseTestApp
 from .conftest import notwindows
 from ...utils import parse_utc, get_username
+from ...exchange.exchange import reflink
+from ...exchange.collect import ExchangeCollect, BufferedLog
 
 
 @notwindows
@@ -102,6 +107,316 @@ class TestNbGraderCollect(BaseTestApp):
         self._collect("ps1", exchange, ["--update"])
         assert self._read_timestamp(root) != timestamp
 
+    def test_collect_with_index(self, exchange, course_dir, cache):
+        self._release_and_fetch("ps1", exchange, course_dir)
+        self._submit("ps1", exchange, cache)
+        run_nbgrader([
+            "list", "--inbound", "--rebuild-index",
+            "--course", "abc101",
+            "--Exchange.root={}".format(exchange)
+        ])
+        assert os.path.isfile(os.path.join(exchange, "abc101", "inbound.manifest"))
+
+        root = os.path.join(course_dir, "submitted", get_username(), "ps1")
+        self._collect("ps1", exchange)
+        assert os.path.isfile(os.path.join(root, "p1.ipynb"))
+        timestamp = self._read_timestamp(root)
+
+        # a new submission is found through the index
+        time.sleep(1)
+        self._submit("ps1", exchange, cache)
+        self._collect("ps1", exchange, ["--update"])
+        assert self._read_timestamp(root) > timestamp
+
+        # changes to the inbound directory are picked up without rebuilding the index
+        inbound = os.path.join(exchange, "abc101", "inbound")
+        filename = sorted(os.listdir(inbound))[-1]
+        new_filename = filename.replace(filename.split("+")[2], "2099-01-01 00:00:00.000000 UTC")
+        os.rename(os.path.join(inbound, filename), os.path.join(inbound, new_filename))
+        self._make_file(os.path.join(inbound, new_filename, "extra.txt"))
+        self._collect("ps1", exchange, ["--update"])
+        assert os.path.isfile(os.path.join(root, "extra.txt"))
+
+        # the index can't be read or changed by students
+        mode = os.stat(os.path.join(exchange, "abc101", "inbound.manifest")).st_mode
+        assert mode & 0o777 == 0o600
+
+    def test_collect_hardlink(self, exchange, course_dir, cache):
+        self._release_and_fetch("ps1", exchange, course_dir)
+        self._submit("ps1", exchange, cache, ["--Exchange.copy_strategy=hardlink"])
+        self._collect("ps1", exchange, ["--Exchange.copy_strategy=hardlink"])
+
+        inbound = os.path.join(exchange, "abc101", "inbound")
+        filename, = os.listdir(inbound)
+        src = os.path.join(inbound, filename, "p1.ipynb")
+        dest = os.path.join(course_dir, "submitted", get_username(), "ps1", "p1.ipynb")
+        with open(src, "rb") as fh:
+            contents = fh.read()
+        with open(dest, "rb") as fh:
+            assert fh.read() == contents
+
+        # if the filesystem can't clone files, they are hard linked instead
+        try:
+            reflink(src, os.path.join(course_dir, "reflink-test"))
+        except OSError:
+            assert os.path.samefile(src, dest)
+        else:
+            assert not os.path.samefile(src, dest)
+
+        # files that other users can change, such as submissions owned by
+        # students, are never hard linked
+        os.chmod(src, 0o666)
+        shutil.rmtree(os.path.join(course_dir, "submitted"))
+        self._collect("ps1", exchange, ["--Exchange.copy_strategy=hardlink"])
+        assert not os.path.samefile(src, dest)
+        with open(dest, "rb") as fh:
+            assert fh.read() == contents
+
+        # the cache isn't read-only, so it is never hard linked
+        cached, = os.listdir(os.path.join(cache, "abc101"))
+        assert not os.path.samefile(
+            os.path.join(cache, "abc101", cached, "p1.ipynb"),
+            os.path.join("ps1", "p1.ipynb"))
+
+    @pytest.mark.skipif(not hasattr(os, "getuid") or os.getuid() != 0,
+                        reason="changing the owner of files requires root")
+    def test_collect_hardlink_student_owned(self, exchange, course_dir, cache):
+        self._release_and_fetch("ps1", exchange, course_dir)
+        self._submit("ps1", exchange, cache)
+
+        # the submission is owned by a student, as with a shared exchange
+        inbound = os.path.join(exchange, "abc101", "inbound")
+        filename, = os.listdir(inbound)
+        src = os.path.join(inbound, filename, "p1.ipynb")
+        os.chown(src, os.getuid() + 1, -1)
+        os.chmod(src, 0o644)
+
+        # it is cloned or copied, but never hard linked
+        self._collect("ps1", exchange, ["--Exchange.copy_strategy=hardlink"])
+        dest = os.path.join(course_dir, "submitted", get_username(), "ps1", "p1.ipynb")
+        assert not os.path.samefile(src, dest)
+        assert os.stat(src).st_nlink == 1
+        with open(src, "rb") as fh:
+            contents = fh.read()
+        with open(dest, "rb") as fh:
+            assert fh.read() == contents
+
+    def test_collect_parallel(self, exchange, course_dir, cache):
+        self._release_and_fetch("ps1", exchange, course_dir)
+        students = ["student{}".format(i) for i in range(5)]
+        for student in students:
+            self._submit("ps1", exchange, cache, flags=["--student={}".format(student)])
+
+        # one submission can't be collected, but the others still are
+        self._make_file(os.path.join(course_dir, "submitted", "student2", "ps1"))
+        out = self._collect("ps1", exchange, flags=[
+            "--ExchangeCollect.max_workers=4",
+            "--ExchangeCollect.check_owner=False"
+        ], retcode=1)
+        assert "Failed to collect submission: student2 ps1" in out
+        for student in students:
+            root = os.path.join(course_dir, "submitted", student, "ps1")
+            assert os.path.isfile(os.path.join(root, "p1.ipynb")) == (student != "student2")
+
+        # the output about each submission is kept together
+        os.remove(os.path.join(course_dir, "submitted", "student2", "ps1"))
+        out = self._collect("ps1", exchange, flags=["--ExchangeCollect.max_workers=4"])
+        lines = [x for x in out.splitlines() if "student" in x]
+        assert len(lines) == 10
+        for warning, info in zip(lines[::2], lines[1::2]):
+            student = warning.split("claims to be submitted by ")[1].split(" ")[0]
+            assert info.endswith(": {} ps1".format(student))
+        assert "Collecting submission: student2 ps1" in out
+        assert os.path.isfile(os.path.join(course_dir, "submitted", "student2", "ps1", "p1.ipynb"))
+
+    @pytest.mark.parametrize("max_workers", [1, 4])
+    def test_collect_log_flushed(self, exchange, course_dir, cache, monkeypatch, max_workers):
+        self._release_and_fetch("ps1", exchange, course_dir)
+        students = ["student{}".format(i) for i in range(3)]
+        for student in students:
+            self._submit("ps1", exchange, cache, flags=["--student={}".format(student)])
+
+        # the messages about each submission are emitted as soon as it has
+        # been collected, rather than once all of them have
+        events = []
+        flushed = threading.Event()
+        copy_record = ExchangeCollect._copy_record
+        flush = BufferedLog.flush
+
+        def _copy_record(self, rec, log):
+            if max_workers > 1 and rec['username'] == students[-1]:
+                # the other submissions are reported while this one is
+                # still being collected
+                events.append(("waited", flushed.wait(10)))
+            copy_record(self, rec, log)
+            events.append(("collected", rec['username']))
+
+        def _flush(self, log):
+            events.append(("flushed", len(self.messages)))
+            flushed.set()
+            flush(self, log)
+
+        monkeypatch.setattr(ExchangeCollect, "_copy_record", _copy_record)
+        monkeypatch.setattr(BufferedLog, "flush", _flush)
+        self._collect("ps1", exchange, flags=[
+            "--ExchangeCollect.max_workers={}".format(max_workers),
+            "--ExchangeCollect.check_owner=False"])
+
+        if max_workers == 1:
+            assert [x[0] for x in events] == ["collected", "flushed"] * 3
+            assert [x[1] for x in events[::2]] == sorted(students)
+        else:
+            assert ("waited", True) in events
+        assert all(x[1] > 0 for x in events if x[0] == "flushed")
+
+    def _tree(self, root):
+        tree = {}
+        for dirname, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirname, filename)
+                st = os.stat(path)
+                with open(path, "rb") as fh:
+                    tree[os.path.relpath(path, root)] = (fh.read(), st.st_mode, st.st_mtime_ns)
+        return tree
+
+    def test_collect_delta(self, exchange, course_dir, cache):
+        self._release_and_fetch("ps1", exchange, course_dir)
+        self._make_file(os.path.join("ps1", "data.csv"), contents="1,2,3\n" * 1000)
+        self._make_file(os.path.join("ps1", "old.txt"), contents="old")
+        self._make_file(os.path.join("ps1", "sub", "a.txt"), contents="a")
+        self._submit("ps1", exchange, cache)
+        self._collect("ps1", exchange)
+
+        root = os.path.join(course_dir, "submitted", get_username(), "ps1")
+        data_ctime = os.stat(os.path.join(root, "data.csv")).st_ctime_ns
+        a_ctime = os.stat(os.path.join(root, "sub", "a.txt")).st_ctime_ns
+
+        time.sleep(1)
+        self._make_file(os.path.join("ps1", "sub", "a.txt"), contents="changed")
+        self._make_file(os.path.join("ps1", "new.txt"), contents="new")
+        os.remove(os.path.join("ps1", "old.txt"))
+        self._submit("ps1", exchange, cache)
+        self._collect("ps1", exchange, ["--update", "--delta"])
+
+        # the result is the same as copying the latest submission
+        inbound = os.path.join(exchange, "abc101", "inbound")
+        latest = sorted(os.listdir(inbound))[-1]
+        assert self._tree(root) == self._tree(os.path.join(inbound, latest))
+        assert not os.path.exists(os.path.join(root, "old.txt"))
+
+        # but unchanged files weren't copied again
+        assert os.stat(os.path.join(root, "data.csv")).st_ctime_ns == data_ctime
+        assert os.stat(os.path.join(root, "sub", "a.txt")).st_ctime_ns != a_ctime
+
+    def test_collect_packed(self, exchange, course_dir, cache):
+        self._release_and_fetch("ps1", exchange, course_dir)
+        self._make_file(os.path.join("ps1", "old.txt"), contents="old")
+        self._make_file(os.path.join("ps1", "sub", "a.txt"), contents="a")
+        self._submit("ps1", exchange, cache, flags=["--packed"])
+
+        # the submission is a single archive and its manifest
+        inbound = os.path.join(exchange, "abc101", "inbound")
+        submission, = os.listdir(inbound)
+        assert sorted(os.listdir(os.path.join(inbound, submission))) == ["submission.json", "submission.tar.gz"]
+
+        # which are unpacked into the same files as a loose submission
+        self._collect("ps1", exchange)
+        root = os.path.join(course_dir, "submitted", get_username(), "ps1")
+        cached, = os.listdir(os.path.join(cache, "abc101"))
+        contents = lambda tree: {k: v[0] for k, v in tree.items()}
+        assert contents(self._tree(root)) == contents(self._tree(os.path.join(cache, "abc101", cached)))
+        assert self._read_timestamp(root) == parse_utc(submission.split("+")[2])
+
+        # updating a packed submission in delta mode
+        time.sleep(1)
+        self._make_file(os.path.join("ps1", "sub", "a.txt"), contents="changed")
+        os.remove(os.path.join("ps1", "old.txt"))
+        self._submit("ps1", exchange, cache, flags=["--packed"])
+        self._collect("ps1", exchange, ["--update", "--delta"])
+        cached = sorted(os.listdir(os.path.join(cache, "abc101")))[-1]
+        assert contents(self._tree(root)) == contents(self._tree(os.path.join(cache, "abc101", cached)))
+        assert sorted(os.listdir(os.path.dirname(root))) == ["ps1"]
+
+    def test_collect_packed_invalid(self, exchange, course_dir, cache):
+        self._release_and_fetch("ps1", exchange, course_dir)
+        self._submit("ps1", exchange, cache, flags=["--packed"])
+
+        # a submission that doesn't match its manifest isn't collected
+        inbound = os.path.join(exchange, "abc101", "inbound")
+        submission, = os.listdir(inbound)
+        manifest_path = os.path.join(inbound, submission, "submission.json")
+        with open(manifest_path) as fh:
+            manifest = json.load(fh)
+        manifest["files"]["p1.ipynb"]["md5"] = "0" * 32
+        with open(manifest_path, "w") as fh:
+            json.dump(manifest, fh)
+        self._collect("ps1", exchange, retcode=1)
+        assert not os.path.exists(os.path.join(course_dir, "submitted", get_username(), "ps1"))
+
+    def test_collect_not_packed(self, exchange, course_dir, cache):
+        self._release_and_fetch("ps1", exchange, course_dir)
+        self._make_file(os.path.join("ps1", "submission.json"), contents='{"files": {}}')
+        self._submit("ps1", exchange, cache)
+
+        # a student's own submission.json doesn't make a submission packed
+        self._collect("ps1", exchange)
+        root = os.path.join(course_dir, "submitted", get_username(), "ps1")
+        assert os.path.isfile(os.path.join(root, "p1.ipynb"))
+        with open(os.path.join(root, "submission.json")) as fh:
+            assert fh.read() == '{"files": {}}'
+
+        # and neither does an archive next to it
+        self._make_file(os.path.join("ps1", "submission.tar.gz"))
+        time.sleep(1)
+        self._submit("ps1", exchange, cache)
+        self._collect("ps1", exchange, ["--update"])
+        assert os.path.isfile(os.path.join(root, "submission.tar.gz"))
+
+    def test_collect_object_store(self, exchange, course_dir, cache):
+        storage = ["--Exchange.storage_class=nbgrader.exchange.storage.ObjectStoreStorage"]
+        self._copy_file(os.path.join("files", "test.ipynb"), os.path.join(course_dir, "release", "ps1", "p1.ipynb"))
+        run_nbgrader(["release_assignment", "ps1", "--course", "abc101", "--Exchange.root={}".format(exchange)] + storage)
+        run_nbgrader(["fetch_assignment", "ps1", "--course", "abc101", "--Exchange.root={}".format(exchange)] + storage)
+        assert os.path.isfile(os.path.join("ps1", "p1.ipynb"))
+        self._make_file(os.path.join("ps1", "sub", "a.txt"), contents="a")
+        self._submit("ps1", exchange, cache, flags=storage)
+        time.sleep(1)
+        self._submit("ps1", exchange, cache, flags=storage + ["--packed"])
+
+        # the exchange only holds objects and keys
+        assert sorted(os.listdir(exchange)) == ["keys", "objects"]
+        output = run_nbgrader(["list", "--inbound", "--course", "abc101", "--Exchange.root={}".format(exchange)] + storage)
+        assert output.count("abc101 {} ps1".format(get_username())) == 2
+
+        self._collect("ps1", exchange, flags=storage)
+        root = os.path.join(course_dir, "submitted", get_username(), "ps1")
+        cached = sorted(os.listdir(os.path.join(cache, "abc101")))[-1]
+        assert self._read_timestamp(root) == parse_utc(cached.split("+")[2])
+        with open(os.path.join(root, "sub", "a.txt")) as fh:
+            assert fh.read() == "a"
+
+    def test_collect_staging(self, exchange, course_dir, cache):
+        self._release_and_fetch("ps1", exchange, course_dir)
+        self._submit("ps1", exchange, cache)
+        inbound = os.path.join(exchange, "abc101", "inbound")
+        submission, = os.listdir(inbound)
+
+        # unfinished submissions are ignored, and removed once they are old
+        recent = os.path.join(inbound, ".{}+ps1+2099-01-01 00:00:00.000000 UTC.staging-abc".format(get_username()))
+        old = os.path.join(inbound, ".{}+ps1+2099-01-01 00:00:00.000000 UTC.staging-def".format(get_username()))
+        for path in [recent, old]:
+            self._make_file(os.path.join(path, "p1.ipynb"), contents="partial")
+        os.utime(old, (0, 0))
+
+        output = run_nbgrader(["list", "--inbound", "--course", "abc101", "--Exchange.root={}".format(exchange)])
+        assert output.count("abc101 {} ps1".format(get_username())) == 1
+
+        self._collect("ps1", exchange)
+        root = os.path.join(course_dir, "submitted", get_username(), "ps1")
+        assert self._read_timestamp(root) == parse_utc(submission.split("+")[2])
+        assert os.path.isdir(recent)
+        assert not os.path.exists(old)
+
     def test_collect_assignment_flag(self, exchange, course_dir, cache):
         self._release_and_fetch("ps1", exchange, course_dir)
         self._submit("ps1", exchange, cache)
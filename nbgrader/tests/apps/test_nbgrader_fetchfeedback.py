@@ -1,8 +1,9 @@
 import os
 import sys
+import json
 from os.path import join, exists, isfile
 
-from ...utils import remove, notebook_hash
+from ...utils import remove, notebook_hash, make_unique_key
 from .. import run_nbgrader
 from .base import BaseTestApp
 from .conftest import notwindows
@@ -91,3 +92,109 @@ class TestNbGraderFetchFeedback(BaseTestApp):
         assert os.path.isdir(join("ps1", "feedback", timestamp))
         assert os.path.isfile(join("ps1", "feedback", timestamp, 'p1.html'))
         assert os.path.isfile(join("ps1", "feedback", timestamp, 'p1.html'))
+
+    @notwindows
+    def test_hash_cache(self, db, course_dir, exchange, cache):
+        self._copy_file(join("files", "test.ipynb"), join(course_dir, "source", "ps1", "p1.ipynb"))
+        run_nbgrader(["db", "assignment", "add", "ps1", "--db", db])
+        self._generate_assignment("ps1", course_dir, db)
+        self._release_and_fetch("ps1", exchange, cache, course_dir)
+        self._submit("ps1", exchange, cache)
+
+        # release feedback for the cached submission by hand
+        submission, = os.listdir(join(cache, "abc101"))
+        timestamp = submission.split("+")[-1]
+        notebook = join(cache, "abc101", submission, "p1.ipynb")
+        os.utime(notebook, (0, 0))
+        unique_key = make_unique_key("abc101", "ps1", "p1", "foo", timestamp)
+        os.makedirs(join(exchange, "abc101", "feedback"))
+        with open(join(exchange, "abc101", "feedback", "{}.html".format(notebook_hash(notebook, unique_key))), "w") as fh:
+            fh.write("feedback")
+
+        flags = ["--Exchange.root={}".format(exchange), "--Exchange.cache={}".format(cache), "--course", "abc101", "--student", "foo"]
+        run_nbgrader(["fetch_feedback", "ps1"] + flags)
+        assert isfile(join("ps1", "feedback", timestamp, "p1.html"))
+
+        # the hash of the notebook is cached, and used while the notebook is unchanged
+        with open(join(cache, "hashes.json")) as fh:
+            hashes = json.load(fh)
+        assert [x[2] for x in hashes.values()] == [notebook_hash(notebook, unique_key)]
+        for value in hashes.values():
+            value[2] = "cached"
+        with open(join(cache, "hashes.json"), "w") as fh:
+            json.dump(hashes, fh)
+        with open(join(exchange, "abc101", "feedback", "cached.html"), "w") as fh:
+            fh.write("cached feedback")
+        run_nbgrader(["fetch_feedback", "ps1"] + flags)
+        with open(join("ps1", "feedback", timestamp, "p1.html")) as fh:
+            assert fh.read() == "cached feedback"
+
+        # modifying the notebook invalidates the cached hash
+        os.utime(notebook, (1, 1))
+        run_nbgrader(["fetch_feedback", "ps1"] + flags)
+        with open(join("ps1", "feedback", timestamp, "p1.html")) as fh:
+            assert fh.read() == "feedback"
+
+    @notwindows
+    def test_feedback_unchanged(self, db, course_dir, exchange, cache):
+        self._copy_file(join("files", "test.ipynb"), join(course_dir, "source", "ps1", "p1.ipynb"))
+        run_nbgrader(["db", "assignment", "add", "ps1", "--db", db])
+        self._generate_assignment("ps1", course_dir, db)
+        self._release_and_fetch("ps1", exchange, cache, course_dir)
+        self._submit("ps1", exchange, cache)
+
+        submission, = os.listdir(join(cache, "abc101"))
+        timestamp = submission.split("+")[-1]
+        notebook = join(cache, "abc101", submission, "p1.ipynb")
+        nb_hash = notebook_hash(notebook, make_unique_key("abc101", "ps1", "p1", "foo", timestamp))
+        feedback_path = join(exchange, "abc101", "feedback", "{}.html".format(nb_hash))
+        self._make_file(feedback_path, contents="feedback")
+        os.utime(feedback_path, (0, 0))
+
+        # students don't use the manifest of the released feedback
+        with open(join(exchange, "abc101", "feedback.manifest"), "w") as fh:
+            json.dump({}, fh)
+        os.chmod(join(exchange, "abc101", "feedback.manifest"), 0o000)
+
+        flags = ["--Exchange.root={}".format(exchange), "--Exchange.cache={}".format(cache), "--course", "abc101", "--student", "foo"]
+        run_nbgrader(["fetch_feedback", "ps1"] + flags)
+        local_path = join("ps1", "feedback", timestamp, "p1.html")
+        with open(local_path) as fh:
+            assert fh.read() == "feedback"
+
+        # unchanged feedback isn't fetched again
+        ctime = os.stat(local_path).st_ctime_ns
+        run_nbgrader(["fetch_feedback", "ps1"] + flags)
+        assert os.stat(local_path).st_ctime_ns == ctime
+
+        # but updated feedback is
+        self._make_file(feedback_path, contents="new feedback")
+        run_nbgrader(["fetch_feedback", "ps1"] + flags)
+        with open(local_path) as fh:
+            assert fh.read() == "new feedback"
+
+    @notwindows
+    def test_object_store(self, db, course_dir, exchange, cache):
+        storage = ["--Exchange.storage_class=nbgrader.exchange.storage.ObjectStoreStorage"]
+        self._copy_file(join("files", "test.ipynb"), join(course_dir, "source", "ps1", "p1.ipynb"))
+        run_nbgrader(["db", "assignment", "add", "ps1", "--db", db])
+        self._generate_assignment("ps1", course_dir, db)
+        run_nbgrader(["release_assignment", "ps1", "--course", "abc101", "--Exchange.root={}".format(exchange)] + storage)
+        self._fetch("ps1", exchange, cache, flags=storage)
+        self._submit("ps1", exchange, cache, flags=storage + ["--student", "foo"])
+        self._collect("ps1", exchange, flags=storage)
+
+        # release feedback for the collected submission, through the object store
+        submitted = join(course_dir, "submitted", "foo", "ps1")
+        self._copy_file(join(submitted, "timestamp.txt"), join(course_dir, "feedback", "foo", "ps1", "timestamp.txt"))
+        self._make_file(join(course_dir, "feedback", "foo", "ps1", "p1.html"), contents="feedback")
+        run_nbgrader(["release_feedback", "ps1", "--course", "abc101", "--Exchange.root={}".format(exchange)] + storage)
+        assert sorted(os.listdir(exchange)) == ["keys", "objects"]
+
+        run_nbgrader([
+            "fetch_feedback", "ps1", "--course", "abc101", "--student", "foo",
+            "--Exchange.root={}".format(exchange), "--Exchange.cache={}".format(cache)] + storage)
+        with open(join(submitted, "timestamp.txt")) as fh:
+            timestamp = fh.read()
+        with open(join("ps1", "feedback", timestamp, "p1.html")) as fh:
+            assert fh.read() == "feedback"
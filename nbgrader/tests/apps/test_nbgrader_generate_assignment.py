@@ -47,6 +47,10 @@ class TestNbGraderGenerateAssignment(BaseTestApp):
         run_nbgrader(["generate_assignment", "ps1"])
         assert os.path.isfile(join(course_dir, "release", "ps1", "foo.ipynb"))
 
+        # the released notebook isn't stamped
+        with open(join(course_dir, "release", "ps1", "foo.ipynb"), "r") as fh:
+            assert '"stamp": ' not in fh.read()
+
     def test_deprecation(self, course_dir, temp_cwd):
         """Can a single file be assigned?"""
         self._empty_notebook(join(course_dir, 'source', 'ps1', 'foo.ipynb'))
@@ -1,5 +1,7 @@
 import os
+import json
 import time
+import shutil
 
 from textwrap import dedent
 
@@ -7,7 +9,7 @@ from .. import run_nbgrader
 from .base import BaseTestApp
 from .conftest import notwindows
 
-from ...utils import get_username
+from ...utils import get_username, notebook_hash, make_unique_key
 
 
 @notwindows
@@ -234,6 +236,79 @@ class TestNbGraderList(BaseTestApp):
             """.format(get_username(), timestamps[0], get_username(), timestamps[1])
         ).lstrip()
 
+    def test_list_inbound_packed(self, exchange, cache, course_dir):
+        self._release("ps1", exchange, cache, course_dir)
+        self._fetch("ps1", exchange, cache)
+        self._submit("ps1", exchange, cache, flags=["--packed"])
+        filename, = os.listdir(os.path.join(exchange, "abc101", "inbound"))
+        timestamp = filename.split("+")[2]
+        assert self._list(exchange, cache, "ps1", flags=["--inbound"]) == dedent(
+            """
+            [ListApp | INFO] Submitted assignments:
+            [ListApp | INFO] abc101 {} ps1 {} (no feedback available)
+            """.format(get_username(), timestamp)
+        ).lstrip()
+
+        # feedback is looked up with the hashes in the manifest of the submission
+        cached, = os.listdir(os.path.join(cache, "abc101"))
+        unique_key = make_unique_key("abc101", "ps1", "p1", get_username(), timestamp)
+        nb_hash = notebook_hash(os.path.join(cache, "abc101", cached, "p1.ipynb"), unique_key)
+        self._make_file(os.path.join(exchange, "abc101", "feedback", "{}.html".format(nb_hash)))
+        assert self._list(exchange, cache, "ps1", flags=["--inbound"]) == dedent(
+            """
+            [ListApp | INFO] Submitted assignments:
+            [ListApp | INFO] abc101 {} ps1 {} (feedback ready to be fetched)
+            """.format(get_username(), timestamp)
+        ).lstrip()
+
+    def test_list_inbound_index(self, exchange, cache, course_dir):
+        self._release("ps1", exchange, cache, course_dir)
+        self._fetch("ps1", exchange, cache)
+        self._submit("ps1", exchange, cache)
+        manifest = os.path.join(exchange, "abc101", "inbound.manifest")
+        assert not os.path.exists(manifest)
+
+        # create the index from the existing submission
+        filename, = os.listdir(os.path.join(exchange, "abc101", "inbound"))
+        timestamp = filename.split("+")[2]
+        assert self._list(exchange, cache, "ps1", flags=["--inbound", "--rebuild-index", "--course", "abc101"]) == dedent(
+            """
+            [ListApp | INFO] Rebuilt index of 1 submissions: {}
+            [ListApp | INFO] Submitted assignments:
+            [ListApp | INFO] abc101 {} ps1 {} (no feedback available)
+            """.format(manifest, get_username(), timestamp)
+        ).lstrip()
+        with open(manifest, "r") as fh:
+            assert json.load(fh)["names"] == [filename]
+        assert os.stat(manifest).st_mode & 0o777 == 0o600
+
+        # new submissions are added to the index when listing
+        time.sleep(1)
+        self._submit("ps1", exchange, cache)
+        filenames = sorted(os.listdir(os.path.join(exchange, "abc101", "inbound")))
+        timestamps = [x.split("+")[2] for x in filenames]
+        assert self._list(exchange, cache, "ps1", flags=["--inbound", "--course", "abc101"]) == dedent(
+            """
+            [ListApp | INFO] Submitted assignments:
+            [ListApp | INFO] abc101 {} ps1 {} (no feedback available)
+            [ListApp | INFO] abc101 {} ps1 {} (no feedback available)
+            """.format(get_username(), timestamps[0], get_username(), timestamps[1])
+        ).lstrip()
+        with open(manifest, "r") as fh:
+            assert json.load(fh)["names"] == filenames
+
+        # removed submissions are skipped
+        shutil.rmtree(os.path.join(exchange, "abc101", "inbound", filenames[0]))
+        assert self._list(exchange, cache, "ps1", flags=["--inbound", "--course", "abc101"]) == dedent(
+            """
+            [ListApp | INFO] Submitted assignments:
+            [ListApp | INFO] abc101 {} ps1 {} (no feedback available)
+            """.format(get_username(), timestamps[1])
+        ).lstrip()
+
+        # rebuilding only works with --inbound
+        self._list(exchange, cache, "ps1", flags=["--rebuild-index", "--course", "abc101"], retcode=1)
+
     def test_list_inbound_no_random_string(self, exchange, cache, course_dir):
         self._release("ps1", exchange, cache, course_dir)
 
@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 from os.path import join, exists, isfile
 import pytest
 
@@ -136,3 +137,37 @@ class TestNbGraderReleaseFeedback(BaseTestApp):
         assert self._get_permissions(feedback_dir) == dirperms
         os.system("find %s -ls"%feedback_dir)
         assert self._get_permissions(join(feedback_dir, nb_hash+".html")) == perms
+
+    @notwindows
+    def test_manifest(self, course_dir, exchange, cache):
+        """Is released feedback recorded in the manifest, and not released again if unchanged?"""
+        nb_path = join(course_dir, "submitted", "foo", "ps1", "p1.ipynb")
+        self._copy_file(join("files", "submitted-unchanged.ipynb"), nb_path)
+        self._copy_file(join("files", "timestamp.txt"), join(course_dir, "submitted", "foo", "ps1", "timestamp.txt"))
+        self._copy_file(join("files", "timestamp.txt"), join(course_dir, "feedback", "foo", "ps1", "timestamp.txt"))
+        self._make_file(join(course_dir, "feedback", "foo", "ps1", "p1.html"), contents="feedback")
+
+        flags = ["--Exchange.root={}".format(exchange), "--Exchange.cache={}".format(cache), "--course", "abc101"]
+        run_nbgrader(["release_feedback", "ps1"] + flags)
+        unique_key = make_unique_key("abc101", "ps1", "p1", "foo", "2019-05-30 11:44:01.911849 UTC")
+        nb_hash = notebook_hash(nb_path, unique_key)
+        feedback_path = join(exchange, "abc101", "feedback", "{}.html".format(nb_hash))
+        with open(join(exchange, "abc101", "feedback.manifest")) as fh:
+            assert json.load(fh) == {nb_hash: notebook_hash(feedback_path)}
+
+        # the manifest lists the names of all the feedback files, so students
+        # can't read it
+        assert self._get_permissions(join(exchange, "abc101", "feedback.manifest")) == "600"
+
+        # unchanged feedback isn't copied again
+        ctime = os.stat(feedback_path).st_ctime_ns
+        run_nbgrader(["release_feedback", "ps1"] + flags)
+        assert os.stat(feedback_path).st_ctime_ns == ctime
+
+        # changed feedback is
+        self._make_file(join(course_dir, "feedback", "foo", "ps1", "p1.html"), contents="new feedback")
+        run_nbgrader(["release_feedback", "ps1"] + flags)
+        with open(feedback_path) as fh:
+            assert fh.read() == "new feedback"
+        with open(join(exchange, "abc101", "feedback.manifest")) as fh:
+            assert json.load(fh) == {nb_hash: notebook_hash(feedback_path)}
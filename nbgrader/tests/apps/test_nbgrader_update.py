@@ -29,6 +29,10 @@ class TestNbGraderUpdate(BaseTestApp):
         self._copy_file(join("files", "test-v0.ipynb"), "p1.ipynb")
         run_nbgrader(["update", "p1.ipynb"])
 
+        # the updated notebook isn't stamped
+        with open("p1.ipynb", "r") as fh:
+            assert '"stamp": ' not in fh.read()
+
     def test_single_notebook_v1(self):
         """Does it work with just a single notebook?"""
         self._copy_file(join("files", "test-v1.ipynb"), "p1.ipynb")
@@ -4,7 +4,7 @@ import pytest
 import tempfile
 from nbformat import current_nbformat, read
 from nbformat.v4 import new_notebook
-from ...nbgraderformat.common import SchemaMismatchError, ValidationError
+from ...nbgraderformat.common import SchemaMismatchError, ValidationError, schema_validator
 from ...nbgraderformat.v3 import (
     MetadataValidatorV3, read_v3, reads_v3, write_v3, writes_v3)
 from .. import (
@@ -269,6 +269,31 @@ def test_duplicate_cells():
         validator.validate_nb(nb)
 
 
+def test_duplicate_and_invalid_cells():
+    # invalid cells are reported before duplicate grade ids
+    validator = MetadataValidatorV3()
+    nb = new_notebook()
+    cell1 = create_grade_cell("", "code", "foo", 5, 3)
+    cell2 = create_grade_cell("", "code", "foo", 5, 3)
+    cell3 = create_grade_cell("", "code", "bar", 5, 3)
+    cell3.metadata.nbgrader["points"] = "abc"
+    nb.cells = [cell1, cell2, cell3]
+    with pytest.raises(ValidationError) as e:
+        validator.validate_nb(nb)
+    assert "Duplicate grade id" not in str(e.value)
+
+    nb.cells = [cell1, cell2]
+    with pytest.raises(ValidationError, match="Duplicate grade id: foo"):
+        validator.validate_nb(nb)
+
+
+def test_schema_validator():
+    # the compiled schema is shared by all validators
+    assert schema_validator(3) is schema_validator(3)
+    assert MetadataValidatorV3()._validator is schema_validator(3)
+    assert MetadataValidatorV3().schema["properties"]["schema_version"]
+
+
 def test_celltype_changed(caplog):
     cell = create_solution_cell("", "code", "foo", 3)
     cell.metadata.nbgrader["cell_type"] = "code"
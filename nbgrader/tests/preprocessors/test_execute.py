@@ -0,0 +1,84 @@
+import pytest
+
+from ...preprocessors import Execute
+from .base import BaseTestPreprocessor
+from .. import create_code_cell
+
+
+@pytest.fixture
+def preprocessor():
+    pp = Execute()
+    pp._display_id_map = {}
+    pp.clear_before_next_output = False
+    return pp
+
+
+def _msg(msg_type, **content):
+    return {
+        "header": {"msg_type": msg_type},
+        "msg_type": msg_type,
+        "parent_header": {},
+        "content": content,
+    }
+
+
+def _stream(text, name="stdout"):
+    return _msg("stream", name=name, text=text)
+
+
+class TestExecute(BaseTestPreprocessor):
+
+    def _process(self, pp, cell, msgs):
+        pp._reset_stream_limits()
+        cell.outputs = []
+        for msg in msgs:
+            pp.process_message(msg, cell, 0)
+        return "".join(x.text for x in cell.outputs if x.output_type == "stream")
+
+    def test_stream_under_limits(self, preprocessor):
+        preprocessor.max_stream_lines = 5
+        cell = create_code_cell()
+        text = self._process(preprocessor, cell, [_stream("a\nb\n"), _stream("c\n", name="stderr")])
+        assert text == "a\nb\nc\n"
+        assert len(cell.outputs) == 2
+
+    def test_stream_max_lines(self, preprocessor):
+        preprocessor.max_stream_lines = 5
+        cell = create_code_cell()
+        msgs = [_stream("{}\n".format(i)) for i in range(3)] + [_stream("3\n4\n5\n6\n")] + [_stream("7\n")] * 1000
+        text = self._process(preprocessor, cell, msgs)
+        assert text == "0\n1\n2\n3\n4\n... Output truncated ...\n"
+        assert len(cell.outputs) == 4
+
+    def test_stream_max_bytes(self, preprocessor):
+        preprocessor.max_stream_bytes = 10
+        cell = create_code_cell()
+        text = self._process(preprocessor, cell, [_stream("abcd\nefgh\nijkl\n"), _stream("x\n")])
+        assert text == "abcd\nefgh\n... Output truncated ...\n"
+
+    def test_stream_no_limit(self, preprocessor):
+        preprocessor.max_stream_lines = -1
+        preprocessor.max_stream_bytes = -1
+        cell = create_code_cell()
+        text = self._process(preprocessor, cell, [_stream("x\n" * 20000)])
+        assert text == "x\n" * 20000
+
+    def test_clear_output_resets_limits(self, preprocessor):
+        preprocessor.max_stream_lines = 2
+        cell = create_code_cell()
+        msgs = []
+        for i in range(10):
+            msgs.extend([_msg("clear_output", wait=False), _stream("{}\n".format(i))])
+        text = self._process(preprocessor, cell, msgs)
+        assert text == "9\n"
+
+    def test_rich_output(self, preprocessor):
+        preprocessor.max_output_bytes = 100
+        cell = create_code_cell()
+        small = _msg("display_data", data={"text/plain": "x" * 10}, metadata={})
+        large = _msg("display_data", data={"image/png": "x" * 1000, "text/plain": "<Figure>"}, metadata={"image/png": {}})
+        self._process(preprocessor, cell, [small, large])
+        assert cell.outputs[0].data == {"text/plain": "x" * 10}
+        assert cell.outputs[1].data == {
+            "text/plain": "... Output removed, it was too large (1008 bytes of image/png, text/plain) ..."}
+        assert cell.outputs[1].metadata == {}
@@ -0,0 +1,105 @@
+import os
+import copy
+import base64
+import pytest
+
+from nbformat import validate
+from nbformat.v4 import new_notebook, new_output
+
+from ...blobstore import BlobStore, blob_references
+from ...preprocessors import ExternalizeOutputs, ResolveOutputs
+from .base import BaseTestPreprocessor
+from .. import create_code_cell
+
+
+@pytest.fixture
+def resources(tmpdir):
+    return {'nbgrader': {'blob_directory': str(tmpdir.join("blobs"))}}
+
+
+def _notebook(png, html="<b>small</b>"):
+    cell = create_code_cell()
+    cell.outputs = [
+        new_output("display_data", data={"image/png": png, "text/plain": "<Figure>"}),
+        new_output("execute_result", data={"text/html": html, "text/plain": "table"}, execution_count=1),
+        new_output("stream", name="stdout", text="x" * 1000),
+    ]
+    return new_notebook(cells=[cell])
+
+
+class TestExternalizeOutputs(BaseTestPreprocessor):
+
+    def test_disabled_by_default(self, resources):
+        nb = _notebook("x" * 1000)
+        nb, resources = ExternalizeOutputs(min_size=10)(nb, resources)
+        assert nb.cells[0].outputs[0].data["image/png"] == "x" * 1000
+        assert not os.path.exists(resources['nbgrader']['blob_directory'])
+
+    def test_externalize(self, resources):
+        png = base64.b64encode(b"\x89PNG" * 100).decode("ascii")
+        nb = _notebook(png)
+        pp = ExternalizeOutputs(enabled=True, min_size=100)
+        nb, resources = pp(nb, resources)
+        validate(nb)
+
+        display, result, stream = nb.cells[0].outputs
+        assert display.data == {"text/plain": "<Figure>"}
+        assert blob_references(display) == {"image/png": BlobStore.digest(png.encode("ascii"))}
+        assert result.data == {"text/html": "<b>small</b>", "text/plain": "table"}
+        assert blob_references(result) == {}
+        assert stream.text == "x" * 1000
+
+        store = BlobStore(resources['nbgrader']['blob_directory'])
+        assert store.get(blob_references(display)["image/png"]) == png.encode("ascii")
+
+    def test_identical_outputs_stored_once(self, resources):
+        pp = ExternalizeOutputs(enabled=True, min_size=100)
+        for _ in range(3):
+            pp(_notebook("x" * 1000, html="y" * 1000), resources)
+
+        root = resources['nbgrader']['blob_directory']
+        blobs = [name for _, _, filenames in os.walk(root) for name in filenames]
+        assert len(blobs) == 2
+
+    def test_resolve(self, resources):
+        nb = _notebook("x" * 1000, html="y" * 1000)
+        expected = copy.deepcopy(nb.cells[0].outputs)
+        nb, resources = ExternalizeOutputs(enabled=True, min_size=100)(nb, resources)
+        nb, resources = ResolveOutputs()(nb, resources)
+        assert nb.cells[0].outputs == expected
+
+    def test_resolve_linked(self, resources):
+        png = "x" * 1000
+        nb, resources = ExternalizeOutputs(enabled=True, min_size=100)(_notebook(png, html="y" * 1000), resources)
+        nb, resources = ResolveOutputs(blob_url="/formgrader/blobs/")(nb, resources)
+
+        display, result, _ = nb.cells[0].outputs
+        digest = BlobStore.digest(png.encode("ascii"))
+        assert display.data == {"image/png": "", "text/plain": "<Figure>"}
+        assert display.metadata == {"filenames": {"image/png": "/formgrader/blobs/{}.png".format(digest)}}
+        assert result.data["text/html"] == "y" * 1000
+
+    def test_resolve_missing(self, resources):
+        nb, resources = ExternalizeOutputs(enabled=True, min_size=100)(_notebook("x" * 1000), resources)
+        for dirname, _, filenames in os.walk(resources['nbgrader']['blob_directory']):
+            for name in filenames:
+                os.remove(os.path.join(dirname, name))
+
+        nb, resources = ResolveOutputs()(nb, resources)
+        display = nb.cells[0].outputs[0]
+        assert display.data == {"text/plain": "<Figure>"}
+        assert display.metadata == {}
+
+
+def test_blob_store(tmpdir):
+    store = BlobStore(str(tmpdir))
+    digest = store.put(b"data")
+    assert store.put(b"data") == digest
+    assert digest in store
+    assert store.get(digest) == b"data"
+    assert os.listdir(os.path.join(str(tmpdir), digest[:2])) == [digest[2:]]
+
+    with pytest.raises(FileNotFoundError):
+        store.get("0" * 64)
+    with pytest.raises(ValueError):
+        store.get("../../etc/passwd")
@@ -0,0 +1,79 @@
+import os
+import copy
+import pytest
+
+from nbformat import writes
+
+from ...preprocessors import (
+    IncludeHeaderFooter,
+    LockCells,
+    ClearSolutions,
+    ClearOutput,
+    CheckCellMetadata,
+    ComputeChecksums,
+    ClearHiddenTests,
+    ClearMarkScheme,
+    FusedCellPreprocessor,
+)
+from ...preprocessors.fused import fuse_preprocessors
+from .base import BaseTestPreprocessor
+
+
+def _chain():
+    # the generate_assignment chain, without SaveCells which needs a database
+    return [
+        IncludeHeaderFooter(),
+        LockCells(),
+        ClearSolutions(),
+        ClearOutput(),
+        CheckCellMetadata(),
+        ComputeChecksums(),
+        ClearHiddenTests(),
+        ClearMarkScheme(),
+        ComputeChecksums(),
+        CheckCellMetadata(),
+    ]
+
+
+def _run(preprocessors, nb):
+    resources = {}
+    for pp in preprocessors:
+        nb, resources = pp(nb, resources)
+    return nb, resources
+
+
+class TestFusedCellPreprocessor(BaseTestPreprocessor):
+
+    def test_fuse_preprocessors(self):
+        chain = _chain()
+        fused = fuse_preprocessors(chain)
+        assert [type(pp) for pp in fused] == [
+            IncludeHeaderFooter,
+            FusedCellPreprocessor,
+            CheckCellMetadata,
+            FusedCellPreprocessor,
+            CheckCellMetadata,
+        ]
+        assert fused[1].preprocessors == chain[1:4]
+        assert fused[3].preprocessors == chain[5:9]
+
+    def test_fuse_disabled_and_overridden(self):
+        class CustomLockCells(LockCells):
+            def preprocess(self, nb, resources):
+                return nb, resources
+
+        chain = [LockCells(), ClearOutput(enabled=False), CustomLockCells(), ComputeChecksums(), ClearOutput()]
+        fused = fuse_preprocessors(chain)
+        assert [type(pp) for pp in fused] == [LockCells, CustomLockCells, FusedCellPreprocessor]
+        assert fused[2].preprocessors == chain[3:]
+
+    @pytest.mark.parametrize("filename", ["test.ipynb", "test_taskcell.ipynb", "long-output.ipynb"])
+    def test_same_output(self, filename):
+        nb = self._read_nb(os.path.join("files", filename))
+        nb.metadata["celltoolbar"] = "Create Assignment"
+
+        expected, expected_resources = _run(_chain(), copy.deepcopy(nb))
+        actual, actual_resources = _run(fuse_preprocessors(_chain()), copy.deepcopy(nb))
+        assert writes(actual) == writes(expected)
+        assert actual_resources == expected_resources
+        assert "celltoolbar" not in actual.metadata
@@ -1,5 +1,8 @@
 import pytest
 
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
 from nbformat.v4 import new_notebook, new_output
 
 from ...preprocessors import SaveCells, SaveAutoGrades, GetGrades
@@ -7,7 +10,8 @@ from ...api import Gradebook
 from ...utils import compute_checksum
 from .base import BaseTestPreprocessor
 from .. import (
-    create_grade_cell, create_solution_cell, create_grade_and_solution_cell)
+    create_grade_cell, create_solution_cell, create_grade_and_solution_cell,
+    create_task_cell)
 
 
 @pytest.fixture
@@ -131,3 +135,41 @@ class TestGetGrades(BaseTestPreprocessor):
         assert cell.metadata.nbgrader['points'] == 1
 
         assert cell.metadata.nbgrader['comment'] is None
+
+    def test_totals_and_query_count(self, preprocessors, gradebook, resources):
+        """Are the grades loaded with a fixed number of queries?"""
+        nb = new_notebook()
+        for i in range(20):
+            nb.cells.append(create_grade_and_solution_cell("hello", "code", "foo{}".format(i), 1))
+            nb.cells.append(create_task_cell("world", "markdown", "bar{}".format(i), 2))
+        for cell in nb.cells:
+            cell.metadata.nbgrader['checksum'] = compute_checksum(cell)
+        preprocessors[0].preprocess(nb, resources)
+        gradebook.add_submission("ps0", "bar")
+        preprocessors[1].preprocess(nb, resources)
+
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(Engine, "before_cursor_execute", count)
+        try:
+            nb, resources = preprocessors[2].preprocess(nb, resources)
+        finally:
+            event.remove(Engine, "before_cursor_execute", count)
+
+        # opening the gradebook takes a few queries of its own, and then there
+        # is one each for the totals, grades and comments
+        selects = [x for x in statements if x.lstrip().upper().startswith("SELECT")]
+        assert len(selects) <= 8
+        assert resources['nbgrader']['score'] == 0
+        assert resources['nbgrader']['max_score'] == 60
+        assert resources['nbgrader']['late_penalty'] == 0
+        for i in range(20):
+            assert nb.cells[2 * i].metadata.nbgrader['score'] == 0
+            assert nb.cells[2 * i].metadata.nbgrader['points'] == 1
+            assert nb.cells[2 * i].metadata.nbgrader['comment'] == "No response."
+            assert nb.cells[2 * i + 1].metadata.nbgrader['score'] == 0
+            assert nb.cells[2 * i + 1].metadata.nbgrader['points'] == 2
+            assert nb.cells[2 * i + 1].metadata.nbgrader['comment'] is None
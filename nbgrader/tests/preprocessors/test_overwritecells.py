@@ -1,14 +1,17 @@
+import copy
 import pytest
 
 from nbformat.v4 import new_notebook
 
 from ...preprocessors import SaveCells, OverwriteCells
+from ...master import MasterCell, load_master_cells, load_master_assignment
+from ...api import MissingEntry
 from ...api import Gradebook
 from ...utils import compute_checksum
 from .base import BaseTestPreprocessor
 from .. import (
     create_grade_cell, create_solution_cell, create_grade_and_solution_cell,
-    create_locked_cell)
+    create_locked_cell, create_task_cell)
 
 
 @pytest.fixture
@@ -215,3 +218,64 @@ class TestOverwriteCells(BaseTestPreprocessor):
         nb, resources = preprocessors[1].preprocess(nb, resources)
         assert 'grade_id' not in cell.metadata.nbgrader
 
+
+    def test_load_master_cells(self, preprocessors, resources, gradebook):
+        """Are the master cells loaded with the points of grade and task cells?"""
+        nb = new_notebook()
+        nb.cells.append(create_grade_cell("hello", "code", "foo", 1))
+        nb.cells.append(create_task_cell("world", "markdown", "bar", 2))
+        nb.cells.append(create_locked_cell("locked", "code", "baz"))
+        for cell in nb.cells:
+            cell.metadata.nbgrader['checksum'] = compute_checksum(cell)
+        nb, resources = preprocessors[0].preprocess(nb, resources)
+
+        master_cells = load_master_cells(gradebook, "test", "ps0")
+        assert sorted(master_cells) == ["bar", "baz", "foo"]
+        assert master_cells["foo"] == MasterCell(
+            "foo", "code", True, "hello", nb.cells[0].metadata.nbgrader["checksum"], 1)
+        assert master_cells["bar"].max_score == 2
+        assert master_cells["baz"].locked
+        assert master_cells["baz"].max_score is None
+
+    def test_load_master_assignment(self, preprocessors, resources, gradebook):
+        """Is the master version of every notebook of the assignment loaded?"""
+        for notebook in ["test", "other"]:
+            nb = new_notebook()
+            nb.metadata["kernelspec"] = {"name": notebook}
+            nb.cells.append(create_grade_cell("hello", "code", "foo", 1))
+            nb.cells.append(create_locked_cell(notebook, "code", "bar"))
+            for cell in nb.cells:
+                cell.metadata.nbgrader['checksum'] = compute_checksum(cell)
+            resources['nbgrader']['notebook'] = notebook
+            nb, resources = preprocessors[0].preprocess(nb, resources)
+
+        master = load_master_assignment(gradebook, "ps0")
+        assert master.name == "ps0"
+        assert sorted(master.notebooks) == ["other", "test"]
+        for notebook in ["test", "other"]:
+            assert master.notebooks[notebook].name == notebook
+            assert master.notebooks[notebook].kernelspec == '{"name": "%s"}' % notebook
+            assert master.notebooks[notebook].cells == load_master_cells(gradebook, notebook, "ps0")
+            assert master.notebooks[notebook].cells["bar"].source == notebook
+        assert master.notebooks["test"].cells["foo"].max_score == 1
+
+        assert copy.deepcopy(master) is master
+        with pytest.raises(TypeError):
+            master.notebooks["test"].cells["baz"] = None
+        with pytest.raises(MissingEntry):
+            load_master_assignment(gradebook, "ps1")
+
+    def test_master_cells_from_resources(self, preprocessors, resources, gradebook):
+        """Are the master cells given by the converter used instead of the database?"""
+        cell = create_locked_cell("hello", "code", "foo")
+        cell.metadata.nbgrader['checksum'] = compute_checksum(cell)
+        nb = new_notebook()
+        nb.cells.append(cell)
+        nb, resources = preprocessors[0].preprocess(nb, resources)
+
+        master = load_master_assignment(gradebook, "ps0")
+        cell.source = "hello!"
+        resources['nbgrader']['db_url'] = "sqlite:////nonexistent/gradebook.db"
+        resources['nbgrader']['master'] = master.notebooks["test"]
+        nb, resources = preprocessors[1].preprocess(nb, resources)
+        assert cell.source == "hello"
@@ -6,6 +6,7 @@ from nbformat.v4 import new_notebook
 
 from ...preprocessors import SaveCells, OverwriteKernelspec
 from ...api import Gradebook
+from ...master import load_master_assignment
 from .base import BaseTestPreprocessor
 
 
@@ -57,3 +58,22 @@ class TestOverwriteKernelSpec(BaseTestPreprocessor):
         notebook = gradebook.find_notebook("test", "ps0")
         assert nb.metadata['kernelspec'] == kernelspec
         assert json.loads(notebook.kernelspec) == kernelspec
+
+    def test_overwrite_kernelspec_from_master(self, preprocessors, resources, gradebook):
+        kernelspec = dict(
+            display_name='blarg',
+            name='python3',
+            language='python',
+        )
+
+        nb = new_notebook()
+        nb.metadata['kernelspec'] = kernelspec
+        nb, resources = preprocessors[0].preprocess(nb, resources)
+
+        resources['nbgrader']['master'] = load_master_assignment(gradebook, "ps0").notebooks["test"]
+        resources['nbgrader']['db_url'] = "sqlite:////nonexistent/gradebook.db"
+        nb.metadata['kernelspec'] = {}
+        nb, resources = preprocessors[1].preprocess(nb, resources)
+
+        validate(nb)
+        assert nb.metadata['kernelspec'] == kernelspec
@@ -1,6 +1,9 @@
 import json
 import pytest
 
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
 from nbformat import validate
 from nbformat.v4 import new_notebook
 
@@ -309,3 +312,48 @@ class TestSaveCells(BaseTestPreprocessor):
         validate(nb)
         notebook = gradebook.find_notebook("test", "ps0")
         assert json.loads(notebook.kernelspec) == kernelspec
+
+    def test_resave_many_cells(self, preprocessor, gradebook, resources):
+        """Are many cells saved with a fixed number of queries, keeping the
+        ids of the existing cells?"""
+        nb = new_notebook()
+        for i in range(50):
+            nb.cells.append(create_grade_and_solution_cell("hello", "code", "foo{}".format(i), 1))
+            nb.cells.append(create_locked_cell("world", "markdown", "bar{}".format(i)))
+        nb, resources = preprocessor.preprocess(nb, resources)
+
+        notebook = gradebook.find_notebook("test", "ps0")
+        notebook_id = notebook.id
+        ids = {(type(x), x.name): x.id for x in notebook.grade_cells + notebook.source_cells}
+        assert len(notebook.grade_cells) == 50
+        assert len(notebook.solution_cells) == 50
+        assert len(notebook.source_cells) == 100
+
+        # turn the first grade cell into a solution cell only, and drop the
+        # last locked cell
+        nb.cells[0] = create_solution_cell("goodbye", "code", "foo0")
+        nb.cells.pop()
+
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(Engine, "before_cursor_execute", count)
+        try:
+            nb, resources = preprocessor.preprocess(nb, resources)
+        finally:
+            event.remove(Engine, "before_cursor_execute", count)
+
+        selects = [x for x in statements if x.lstrip().upper().startswith("SELECT")]
+        assert len(selects) <= 10
+
+        gradebook.db.expire_all()
+        notebook = gradebook.find_notebook("test", "ps0")
+        assert notebook.id == notebook_id
+        assert sorted(x.name for x in notebook.grade_cells) == sorted("foo{}".format(i) for i in range(1, 50))
+        assert len(notebook.solution_cells) == 50
+        assert len(notebook.source_cells) == 99
+        for cell in notebook.grade_cells + notebook.source_cells:
+            assert cell.id == ids[(type(cell), cell.name)]
+        assert gradebook.find_source_cell("foo0", "test", "ps0").source == "goodbye"
@@ -0,0 +1,68 @@
+import os
+import pytest
+
+from ..exchange.exchange import copy_tree
+
+
+@pytest.fixture
+def src(tmpdir):
+    path = str(tmpdir.mkdir("src"))
+    os.makedirs(os.path.join(path, "sub", ".ipynb_checkpoints"))
+    for name, size in [("a.ipynb", 1), ("big.ipynb", 3000), ("b.txt", 1),
+                       (os.path.join("sub", "c.ipynb"), 1),
+                       (os.path.join("sub", ".ipynb_checkpoints", "c.ipynb"), 1)]:
+        with open(os.path.join(path, name), "w") as fh:
+            fh.write("x" * size)
+    os.chmod(os.path.join(path, "a.ipynb"), 0o600)
+    os.symlink("a.ipynb", os.path.join(path, "link.ipynb"))
+    return path
+
+
+def _tree(root):
+    tree = {}
+    for dirname, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            path = os.path.join(dirname, name)
+            relpath = os.path.relpath(path, root)
+            if os.path.islink(path):
+                tree[relpath] = "link"
+            else:
+                tree[relpath] = os.stat(path).st_mode & 0o7777
+    return tree
+
+
+def test_copy_tree(src, tmpdir):
+    dest = os.path.join(str(tmpdir), "dest")
+    copy_tree(src, dest, exclude=[".ipynb_checkpoints"], include=["*.ipynb"], max_file_size=2)
+    assert _tree(dest) == {
+        "a.ipynb": 0o600,
+        "link.ipynb": "link",
+        "sub": os.stat(os.path.join(src, "sub")).st_mode & 0o7777,
+        os.path.join("sub", "c.ipynb"): os.stat(os.path.join(src, "sub", "c.ipynb")).st_mode & 0o7777,
+    }
+    assert os.readlink(os.path.join(dest, "link.ipynb")) == "a.ipynb"
+
+    with pytest.raises(FileExistsError):
+        copy_tree(src, dest)
+
+
+def test_copy_tree_perms(src, tmpdir):
+    dest = os.path.join(str(tmpdir), "dest")
+    copy_tree(src, dest, exclude=[".ipynb_checkpoints"], fileperms=0o444, dirperms=0o555)
+    tree = _tree(dest)
+    assert tree.pop("link.ipynb") == "link"
+    assert set(tree) == {"a.ipynb", "big.ipynb", "b.txt", "sub", os.path.join("sub", "c.ipynb")}
+    assert tree.pop("sub") == 0o555
+    assert set(tree.values()) == {0o444}
+    assert os.stat(dest).st_mode & 0o7777 == 0o555
+    for dirname, _, _ in os.walk(dest):
+        os.chmod(dirname, 0o755)
+
+
+def test_copy_tree_groupshared(src, tmpdir):
+    dest = os.path.join(str(tmpdir), "dest")
+    copy_tree(src, dest, groupshared=True)
+    tree = _tree(dest)
+    assert tree["a.ipynb"] == 0o660
+    assert tree["sub"] & 0o2770 == 0o2770
+    assert os.stat(dest).st_mode & 0o2770 == 0o2770
@@ -0,0 +1,91 @@
+import os
+import json
+import pytest
+
+from ..exchange.manifest import InboundManifest
+
+
+@pytest.fixture
+def manifest(tmpdir):
+    course_path = str(tmpdir.mkdir("abc101"))
+    for name in ["foo+ps1+1", "foo+ps2+1", "bar+ps1+1"]:
+        os.makedirs(os.path.join(course_path, "inbound", name))
+    return InboundManifest(course_path)
+
+
+def _settle(manifest):
+    # make the index look like it was written well after the last change to
+    # the inbound directory
+    mtime_ns = os.stat(manifest.inbound_path).st_mtime_ns
+    os.utime(manifest.path, ns=(mtime_ns + manifest.racy_ns, mtime_ns + manifest.racy_ns))
+
+
+def _set_names(manifest, names):
+    with open(manifest.path, "r") as fh:
+        index = json.load(fh)
+    index["names"] = names
+    with open(manifest.path, "w") as fh:
+        json.dump(index, fh)
+
+
+def test_rebuild(manifest):
+    assert not manifest.available()
+    assert manifest.rebuild() == 3
+    assert manifest.available()
+    assert os.stat(manifest.path).st_mode & 0o777 == 0o600
+    assert manifest.glob("foo", "*") == [
+        os.path.join(manifest.inbound_path, "foo+ps1+1"),
+        os.path.join(manifest.inbound_path, "foo+ps2+1")]
+    assert manifest.glob("*", "ps1") == [
+        os.path.join(manifest.inbound_path, "bar+ps1+1"),
+        os.path.join(manifest.inbound_path, "foo+ps1+1")]
+
+
+def test_groupshared_mode(manifest):
+    manifest.groupshared = True
+    manifest.rebuild()
+    assert os.stat(manifest.path).st_mode & 0o777 == 0o660
+
+
+def test_trusted(manifest):
+    manifest.rebuild()
+    _set_names(manifest, ["foo+ps3+1"])
+    _settle(manifest)
+
+    # the inbound directory hasn't changed, so it isn't listed
+    assert manifest.glob("foo", "*") == [os.path.join(manifest.inbound_path, "foo+ps3+1")]
+
+
+def test_inbound_changed(manifest):
+    manifest.rebuild()
+    _settle(manifest)
+    os.makedirs(os.path.join(manifest.inbound_path, "foo+ps1+2"))
+    os.rmdir(os.path.join(manifest.inbound_path, "foo+ps2+1"))
+    mtime_ns = os.stat(manifest.inbound_path).st_mtime_ns + 10**9
+    os.utime(manifest.inbound_path, ns=(mtime_ns, mtime_ns))
+
+    assert manifest.glob("foo", "*") == [
+        os.path.join(manifest.inbound_path, "foo+ps1+1"),
+        os.path.join(manifest.inbound_path, "foo+ps1+2")]
+    with open(manifest.path, "r") as fh:
+        assert json.load(fh) == {
+            "mtime_ns": mtime_ns, "names": ["bar+ps1+1", "foo+ps1+1", "foo+ps1+2"]}
+
+
+def test_racy(manifest):
+    manifest.rebuild()
+    mtime_ns = os.stat(manifest.inbound_path).st_mtime_ns
+    os.utime(manifest.path, ns=(mtime_ns, mtime_ns))
+    _set_names(manifest, [])
+
+    # the index was written right after the last change to the inbound
+    # directory, which might have been followed by another one in the same tick
+    assert len(manifest.glob()) == 3
+
+
+def test_invalid(manifest):
+    with open(manifest.path, "w") as fh:
+        fh.write("foo+ps1+1\n")
+    assert len(manifest.glob()) == 3
+    with open(manifest.path, "r") as fh:
+        assert len(json.load(fh)["names"]) == 3
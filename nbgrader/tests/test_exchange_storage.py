@@ -0,0 +1,268 @@
+import os
+import time
+import pytest
+
+from ..exchange.storage import FileSystemStorage, ObjectStoreStorage, is_staging
+
+
+@pytest.fixture(params=[FileSystemStorage, ObjectStoreStorage])
+def storage(request, tmpdir):
+    root = str(tmpdir.mkdir("exchange"))
+    return request.param(root=root)
+
+
+@pytest.fixture
+def src(tmpdir):
+    path = str(tmpdir.mkdir("src"))
+    os.makedirs(os.path.join(path, "sub", "empty"))
+    with open(os.path.join(path, "a.txt"), "w") as fh:
+        fh.write("a")
+    with open(os.path.join(path, "sub", "b.txt"), "w") as fh:
+        fh.write("b")
+    os.chmod(os.path.join(path, "sub", "b.txt"), 0o600)
+    os.symlink("a.txt", os.path.join(path, "link"))
+    return path
+
+
+def _tree(root):
+    tree = {}
+    for dirname, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            path = os.path.join(dirname, name)
+            relpath = os.path.relpath(path, root)
+            if os.path.islink(path):
+                tree[relpath] = ("link", os.readlink(path))
+            elif os.path.isdir(path):
+                tree[relpath] = ("dir",)
+            else:
+                with open(path) as fh:
+                    tree[relpath] = (fh.read(), os.stat(path).st_mode & 0o777)
+    return tree
+
+
+def test_put_get_tree(storage, src, tmpdir):
+    path = os.path.join(storage.root, "course", "outbound", "ps1")
+    storage.put_tree(src, path)
+    assert storage.isdir(path)
+    assert storage.isdir(os.path.join(storage.root, "course"))
+    assert not storage.isfile(path)
+    assert storage.isfile(os.path.join(path, "sub", "b.txt"))
+    assert storage.listdir(path) == ["a.txt", "link", "sub"]
+    assert storage.list(path) == ["a.txt", "link", os.path.join("sub", "b.txt")]
+
+    dest = os.path.join(str(tmpdir), "dest")
+    storage.get_tree(path, dest)
+    assert _tree(dest) == _tree(src)
+
+
+def test_ignore(storage, src, tmpdir):
+    path = os.path.join(storage.root, "ps1")
+    storage.put_tree(src, path, ignore=lambda d, names: [x for x in names if x == "a.txt"])
+    assert not storage.isfile(os.path.join(path, "a.txt"))
+    assert storage.isfile(os.path.join(path, "sub", "b.txt"))
+
+    dest = os.path.join(str(tmpdir), "dest")
+    storage.get_tree(path, dest, ignore=lambda d, names: [x for x in names if x == "sub"])
+    assert sorted(os.listdir(dest)) == ["link"]
+
+
+def test_glob(storage, src):
+    for name in ["foo+ps1+1", "foo+ps1+2", "bar+ps1+1", "foo+ps2+1"]:
+        storage.put_tree(src, os.path.join(storage.root, "course", "inbound", name))
+    storage.makedirs(os.path.join(storage.root, "other", "inbound"))
+
+    pattern = os.path.join(storage.root, "*", "inbound", "foo+ps1+*")
+    assert storage.glob(pattern) == [
+        os.path.join(storage.root, "course", "inbound", x) for x in ["foo+ps1+1", "foo+ps1+2"]]
+    # wildcards don't match across directories
+    assert storage.glob(os.path.join(storage.root, "*+ps1+1")) == []
+    assert storage.glob(os.path.join(storage.root, "*", "inbound")) == [
+        os.path.join(storage.root, x, "inbound") for x in ["course", "other"]]
+
+
+def test_files(storage, src, tmpdir):
+    storage.makedirs(os.path.join(storage.root, "course", "feedback"))
+    assert storage.isdir(os.path.join(storage.root, "course", "feedback"))
+    assert storage.listdir(os.path.join(storage.root, "course", "feedback")) == []
+
+    path = os.path.join(storage.root, "course", "feedback", "abc.html")
+    storage.put_file(os.path.join(src, "a.txt"), path)
+    assert storage.read(path) == b"a"
+    assert storage.stat(path).st_size == 1
+
+    storage.write(path, b"hello")
+    dest = os.path.join(str(tmpdir), "abc.html")
+    storage.get_file(path, dest)
+    with open(dest) as fh:
+        assert fh.read() == "hello"
+
+    with pytest.raises(FileNotFoundError):
+        storage.stat(os.path.join(storage.root, "course", "feedback", "missing.html"))
+
+
+def test_delete_rename(storage, src):
+    path = os.path.join(storage.root, "course", "inbound", "foo+ps1+1")
+    storage.put_tree(src, path)
+
+    new_path = os.path.join(storage.root, "course", "inbound", "foo+ps1+2")
+    storage.rename(path, new_path)
+    assert not storage.isdir(path)
+    assert storage.read(os.path.join(new_path, "sub", "b.txt")) == b"b"
+
+    storage.write(os.path.join(new_path, "x.tmp"), b"x")
+    storage.rename(os.path.join(new_path, "x.tmp"), os.path.join(new_path, "a.txt"))
+    assert storage.read(os.path.join(new_path, "a.txt")) == b"x"
+
+    storage.delete(new_path)
+    assert not storage.isdir(new_path)
+    assert storage.isdir(os.path.join(storage.root, "course", "inbound"))
+
+
+def test_object_store(tmpdir, src):
+    storage = ObjectStoreStorage(root=str(tmpdir.mkdir("exchange")))
+    storage.put_tree(src, os.path.join(storage.root, "ps1"))
+    storage.put_tree(src, os.path.join(storage.root, "ps2"))
+
+    # keys are flat, and contents are stored once
+    assert sorted(os.listdir(storage.root)) == ["keys", "objects"]
+    assert all(os.path.isfile(os.path.join(storage.keys_path, x)) for x in os.listdir(storage.keys_path))
+    objects = [x for _, _, filenames in os.walk(storage.objects_path) for x in filenames]
+    assert len(objects) == 2
+
+    storage.delete(os.path.join(storage.root, "ps1"))
+    assert storage.prune(min_age=0) == 0
+    storage.delete(os.path.join(storage.root, "ps2"))
+    # objects that were just stored may be about to get a key
+    assert storage.prune() == 0
+    assert storage.prune(min_age=0) == 2
+
+
+def test_object_store_prune_reused(tmpdir, src):
+    storage = ObjectStoreStorage(root=str(tmpdir.mkdir("exchange")))
+    storage.write(os.path.join(storage.root, "a.txt"), b"a")
+    storage.delete(os.path.join(storage.root, "a.txt"))
+    objects = [os.path.join(dirname, x) for dirname, _, filenames in os.walk(storage.objects_path)
+               for x in filenames]
+    for path in objects:
+        os.utime(path, (time.time() - 7200, time.time() - 7200))
+
+    # storing the same contents again makes the object recent again
+    with open(os.path.join(str(tmpdir), "a.txt"), "wb") as fh:
+        fh.write(b"a")
+    with open(os.path.join(str(tmpdir), "a.txt"), "rb") as fh:
+        storage._store(fh)
+    assert storage.prune() == 0
+
+
+def test_object_store_long_keys(tmpdir, src):
+    storage = ObjectStoreStorage(root=str(tmpdir.mkdir("exchange")))
+    # quoting makes each of these characters 6 times longer
+    name = "\u00e9" * 60
+    long_path = os.path.join(storage.root, "ps1", name)
+    storage.put_tree(src, long_path)
+    storage.write(os.path.join(long_path, name + ".txt"), b"x")
+    storage.write(os.path.join(storage.root, "ps1", "short.txt"), b"y")
+
+    assert all(len(x) <= storage.max_record_name for x in os.listdir(storage.keys_path))
+    assert storage.listdir(os.path.join(storage.root, "ps1")) == ["short.txt", name]
+    assert storage.list(long_path) == [
+        "a.txt", "link", os.path.join("sub", "b.txt"), name + ".txt"]
+    assert storage.read(os.path.join(long_path, name + ".txt")) == b"x"
+    assert storage.glob(os.path.join(storage.root, "ps1", "*")) == [
+        os.path.join(storage.root, "ps1", "short.txt"), long_path]
+
+    # keys can be renamed between long and short names
+    storage.rename(os.path.join(long_path, name + ".txt"), os.path.join(long_path, "c.txt"))
+    storage.rename(os.path.join(long_path, "a.txt"), os.path.join(long_path, name + ".md"))
+    assert storage.list(long_path) == [
+        "c.txt", "link", os.path.join("sub", "b.txt"), name + ".md"]
+    storage.rename(long_path, os.path.join(storage.root, "ps2"))
+    assert storage.list(os.path.join(storage.root, "ps2")) == [
+        "c.txt", "link", os.path.join("sub", "b.txt"), name + ".md"]
+    assert storage.listdir(os.path.join(storage.root, "ps1")) == ["short.txt"]
+
+
+def test_object_store_rename(tmpdir, src, monkeypatch):
+    storage = ObjectStoreStorage(root=str(tmpdir.mkdir("exchange")))
+    path = os.path.join(storage.root, "ps1")
+    new_path = os.path.join(storage.root, "ps2")
+    storage.put_tree(src, path)
+    storage.write(os.path.join(new_path, "old.txt"), b"old")
+
+    # a rename that fails halfway through leaves the source complete
+    set_record = storage._set_record
+    calls = []
+
+    def failing_set_record(key, record):
+        calls.append(key)
+        if len(calls) == 3:
+            raise OSError("failed")
+        set_record(key, record)
+
+    monkeypatch.setattr(storage, "_set_record", failing_set_record)
+    with pytest.raises(OSError):
+        storage.rename(path, new_path)
+    monkeypatch.undo()
+    assert storage.list(path) == ["a.txt", "link", os.path.join("sub", "b.txt")]
+
+    # and can be done again
+    storage.rename(path, new_path)
+    assert not storage.isdir(path)
+    # without the files that were in the destination
+    assert storage.list(new_path) == ["a.txt", "link", os.path.join("sub", "b.txt")]
+    assert storage.isdir(os.path.join(new_path, "sub", "empty"))
+
+
+def test_object_store_listing(tmpdir, src):
+    storage = ObjectStoreStorage(root=str(tmpdir.mkdir("exchange")))
+    path = os.path.join(storage.root, "ps1")
+    storage.put_tree(src, path)
+    mtime_ns = os.stat(storage.keys_path).st_mtime_ns - 10 * 10**9
+    os.utime(storage.keys_path, ns=(mtime_ns, mtime_ns))
+    assert storage.listdir(path) == ["a.txt", "link", "sub"]
+
+    # the listing of the key directory is kept while it is unchanged
+    with open(os.path.join(storage.keys_path, "ps1%2Fc.txt"), "w") as fh:
+        fh.write("{}")
+    os.utime(storage.keys_path, ns=(mtime_ns, mtime_ns))
+    assert storage.listdir(path) == ["a.txt", "link", "sub"]
+
+    # and listed again once it changes
+    storage.write(os.path.join(path, "d.txt"), b"d")
+    assert storage.listdir(path) == ["a.txt", "c.txt", "d.txt", "link", "sub"]
+
+
+def test_filesystem_staging(tmpdir, src):
+    storage = FileSystemStorage(root=str(tmpdir.mkdir("exchange")))
+    inbound = os.path.join(storage.root, "inbound")
+    storage.makedirs(inbound)
+    path = os.path.join(inbound, "foo+ps1+1")
+
+    # the directory is staged next to its destination, and renamed into place
+    with storage.staging(path) as staged_path:
+        assert os.path.dirname(staged_path) == inbound
+        assert is_staging(staged_path)
+        storage.put_tree(src, staged_path)
+        assert not os.path.exists(path)
+    assert os.listdir(inbound) == ["foo+ps1+1"]
+    assert storage.isfile(os.path.join(path, "sub", "b.txt"))
+
+    # a failed transfer leaves nothing behind
+    with pytest.raises(RuntimeError):
+        with storage.staging(os.path.join(inbound, "foo+ps1+2")) as staged_path:
+            storage.put_tree(src, staged_path)
+            raise RuntimeError
+    assert os.listdir(inbound) == ["foo+ps1+1"]
+
+    # an existing destination isn't replaced
+    with pytest.raises(FileExistsError):
+        with storage.staging(path) as staged_path:
+            os.makedirs(staged_path)
+    assert os.listdir(inbound) == ["foo+ps1+1"]
+
+    for name, mtime in [(".foo+ps1+3.staging-a", None), (".foo+ps1+4.staging-b", 0)]:
+        os.makedirs(os.path.join(inbound, name))
+        if mtime is not None:
+            os.utime(os.path.join(inbound, name), (mtime, mtime))
+    assert storage.clean_staging(inbound, 3600) == 1
+    assert sorted(os.listdir(inbound)) == [".foo+ps1+3.staging-a", "foo+ps1+1"]
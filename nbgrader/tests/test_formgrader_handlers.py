@@ -0,0 +1,260 @@
+import os
+import json
+import base64
+import asyncio
+import threading
+import pytest
+import requests
+import nbformat
+
+from nbformat.v4 import new_notebook, new_code_cell, new_output
+
+from tornado import web
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from traitlets.config import Config
+from notebook.notebookapp import NotebookApp
+
+from ..api import Gradebook
+from ..blobstore import BlobStore
+from ..server_extensions.formgrader.formgrader import FormgradeExtension
+
+
+class FormgraderServer(object):
+    """The formgrader handlers of a course, served by tornado in a separate
+    thread."""
+
+    def __init__(self, root):
+        self.root = root
+        self.course_dir = os.path.join(root, "course")
+        os.makedirs(self.course_dir)
+        self.db_url = "sqlite:///" + os.path.join(self.course_dir, "gradebook.db")
+
+        config = Config()
+        config.CourseDirectory.root = self.course_dir
+        config.CourseDirectory.db_url = self.db_url
+        nbapp = NotebookApp(config=config, notebook_dir=root)
+        self.formgrader = FormgradeExtension(parent=nbapp)
+        self.formgrader.initialize([])
+
+        self.loop = asyncio.new_event_loop()
+        self.webapp = web.Application(base_url="/", mathjax_url="")
+        self.formgrader.init_tornado_settings(self.webapp)
+        self.formgrader.init_handlers(self.webapp)
+        self.server = HTTPServer(self.webapp)
+        self._thread = None
+
+    def start(self):
+        sockets = []
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            sockets.extend(bind_sockets(0, "127.0.0.1"))
+            self.server.add_sockets(sockets)
+            started.set()
+            self.loop.run_forever()
+
+        started = threading.Event()
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        self.url = "http://127.0.0.1:{}/formgrader".format(sockets[0].getsockname()[1])
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.server.stop)
+        asyncio.run_coroutine_threadsafe(self.server.close_all_connections(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+    def get(self, path, **kwargs):
+        return requests.get(self.url + path, allow_redirects=False, **kwargs)
+
+    def put(self, path, data, **kwargs):
+        return requests.put(self.url + path, data=json.dumps(data), **kwargs)
+
+
+@pytest.fixture
+def formgrader(request, tmpdir):
+    server = FormgraderServer(str(tmpdir))
+    with Gradebook(server.db_url) as gb:
+        gb.add_assignment("ps1")
+        gb.add_notebook("p1", "ps1")
+        gb.add_grade_cell("test1", "p1", "ps1", max_score=1, cell_type="code")
+        gb.add_grade_cell("test2", "p1", "ps1", max_score=2, cell_type="markdown")
+        gb.add_solution_cell("test2", "p1", "ps1")
+        gb.add_source_cell("test1", "p1", "ps1", cell_type="code")
+        gb.add_source_cell("test2", "p1", "ps1", cell_type="markdown")
+        for student in ["hacker123", "bitdiddle"]:
+            gb.add_student(student)
+            gb.add_submission("ps1", student)
+
+    server.start()
+    request.addfinalizer(server.stop)
+    return server
+
+
+def _find_grade(server, grade_cell, student):
+    with Gradebook(server.db_url) as gb:
+        return gb.find_grade(grade_cell, "p1", "ps1", student).to_dict()
+
+
+def _find_comment(server, solution_cell, student):
+    with Gradebook(server.db_url) as gb:
+        return gb.find_comment(solution_cell, "p1", "ps1", student).to_dict()
+
+
+def _autograde(server, student, nb=None):
+    path = os.path.join(server.course_dir, "autograded", student, "ps1")
+    os.makedirs(path, exist_ok=True)
+    nbformat.write(nb or new_notebook(), os.path.join(path, "p1.ipynb"))
+
+
+def test_batch_update(formgrader):
+    grade = _find_grade(formgrader, "test1", "hacker123")
+    comment = _find_comment(formgrader, "test2", "hacker123")
+
+    response = formgrader.put("/api/batch", {
+        "grades": [{"id": grade["id"], "manual_score": 1, "version": grade["version"]}],
+        "comments": [{"id": comment["id"], "manual_comment": "good", "version": comment["version"]}]})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["grades"][0]["manual_score"] == 1
+    assert data["grades"][0]["version"] == grade["version"] + 1
+    assert data["comments"][0]["manual_comment"] == "good"
+    assert _find_grade(formgrader, "test1", "hacker123")["manual_score"] == 1
+
+
+def test_batch_update_invalid(formgrader):
+    grade = _find_grade(formgrader, "test1", "hacker123")
+
+    # updates have to include the version they were made from
+    response = formgrader.put("/api/batch", {
+        "grades": [{"id": grade["id"], "manual_score": 1}]})
+    assert response.status_code == 400
+    response = formgrader.put("/api/batch", {
+        "grades": [{"id": grade["id"], "manual_score": "foo", "version": grade["version"]}]})
+    assert response.status_code == 400
+    response = formgrader.put("/api/batch", {"grades": {}})
+    assert response.status_code == 400
+
+    assert _find_grade(formgrader, "test1", "hacker123") == grade
+
+
+def test_batch_update_missing(formgrader):
+    grade = _find_grade(formgrader, "test1", "hacker123")
+    response = formgrader.put("/api/batch", {
+        "grades": [
+            {"id": grade["id"], "manual_score": 1, "version": grade["version"]},
+            {"id": "foo", "manual_score": 1, "version": 1}]})
+    assert response.status_code == 404
+    assert _find_grade(formgrader, "test1", "hacker123") == grade
+
+
+def test_batch_update_stale(formgrader):
+    grade1 = _find_grade(formgrader, "test1", "hacker123")
+    grade2 = _find_grade(formgrader, "test2", "hacker123")
+
+    # another grader changes the first grade in the meantime
+    response = formgrader.put("/api/batch", {
+        "grades": [{"id": grade1["id"], "manual_score": 0, "version": grade1["version"]}]})
+    assert response.status_code == 200
+
+    response = formgrader.put("/api/batch", {
+        "grades": [
+            {"id": grade2["id"], "manual_score": 2, "version": grade2["version"]},
+            {"id": grade1["id"], "manual_score": 1, "version": grade1["version"]}]})
+    assert response.status_code == 409
+    assert _find_grade(formgrader, "test1", "hacker123")["manual_score"] == 0
+    assert _find_grade(formgrader, "test2", "hacker123") == grade2
+
+
+def test_update_grade_version(formgrader):
+    grade = _find_grade(formgrader, "test1", "hacker123")
+    url = "/api/grade/{}".format(grade["id"])
+
+    # the version is optional
+    response = formgrader.put(url, {"manual_score": 1})
+    assert response.status_code == 200
+    assert response.json()["version"] == grade["version"] + 1
+
+    response = formgrader.put(url, {"manual_score": 0}, params={"version": grade["version"]})
+    assert response.status_code == 409
+    response = formgrader.put(url, {"manual_score": 0}, params={"version": "foo"})
+    assert response.status_code == 400
+    assert _find_grade(formgrader, "test1", "hacker123")["manual_score"] == 1
+
+    response = formgrader.put(url, {"manual_score": 0}, params={"version": grade["version"] + 1})
+    assert response.status_code == 200
+    assert _find_grade(formgrader, "test1", "hacker123")["manual_score"] == 0
+
+
+def test_update_comment_version(formgrader):
+    comment = _find_comment(formgrader, "test2", "hacker123")
+    url = "/api/comment/{}".format(comment["id"])
+
+    response = formgrader.put(url, {"manual_comment": "good"}, params={"version": comment["version"]})
+    assert response.status_code == 200
+    response = formgrader.put(url, {"manual_comment": "bad"}, params={"version": comment["version"]})
+    assert response.status_code == 409
+    assert _find_comment(formgrader, "test2", "hacker123")["manual_comment"] == "good"
+
+
+def test_submission_navigation(formgrader):
+    with Gradebook(formgrader.db_url) as gb:
+        for student in ["louisreasoner", "alyssa"]:
+            gb.add_student(student)
+            gb.add_submission("ps1", student)
+        submissions = {x.student.id: x.id for x in gb.notebook_submissions("p1", "ps1")}
+
+    # alyssa's notebook is missing, so she is skipped
+    for student in ["hacker123", "bitdiddle", "louisreasoner"]:
+        _autograde(formgrader, student)
+    ids = sorted(submissions[x] for x in ["hacker123", "bitdiddle", "louisreasoner"])
+
+    urls = ["/formgrader/submissions/{}".format(x) for x in ids]
+    for i, submission_id in enumerate(ids):
+        response = formgrader.get("/submissions/{}/next".format(submission_id))
+        assert response.status_code == 302
+        assert response.headers["Location"] == (urls + ["/formgrader/gradebook/ps1/p1"])[i + 1]
+
+        response = formgrader.get("/submissions/{}/prev".format(submission_id))
+        assert response.status_code == 302
+        assert response.headers["Location"] == (["/formgrader/gradebook/ps1/p1"] + urls)[i]
+
+    # the submissions around the missing one are still found
+    missing = submissions["alyssa"]
+    after = [url for x, url in zip(ids, urls) if x > missing]
+    response = formgrader.get("/submissions/{}/next".format(missing))
+    assert response.headers["Location"] == (after + ["/formgrader/gradebook/ps1/p1"])[0]
+
+
+def test_blobs(formgrader):
+    # a submission whose plot autograde moved into the blob store
+    png = b"\x89PNG\r\n\x1a\nfake image"
+    store = BlobStore(os.path.join(formgrader.course_dir, "blobs"))
+    digest = store.put(base64.b64encode(png))
+    output = new_output(
+        "display_data", data={"text/plain": "<Figure>"},
+        metadata={"nbgrader": {"blobs": {"image/png": digest}}})
+    _autograde(formgrader, "hacker123", new_notebook(cells=[
+        new_code_cell("plot()", outputs=[output])]))
+    with Gradebook(formgrader.db_url) as gb:
+        submission_id = gb.find_submission_notebook("p1", "ps1", "hacker123").id
+
+    # the page links to the image rather than embedding it
+    response = formgrader.get("/submissions/{}/".format(submission_id))
+    assert response.status_code == 200
+    assert '<img src="/formgrader/blobs/{}.png"'.format(digest) in response.text
+    assert base64.b64encode(png).decode("ascii") not in response.text
+
+    response = formgrader.get("/blobs/{}.png".format(digest))
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "image/png"
+    assert response.content == png
+
+    response = formgrader.get("/blobs/{}.jpg".format(digest))
+    assert response.headers["Content-Type"] == "image/jpeg"
+
+    response = formgrader.get("/blobs/{}.png".format("0" * 64))
+    assert response.status_code == 404
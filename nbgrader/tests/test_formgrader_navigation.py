@@ -0,0 +1,207 @@
+import pytest
+
+from collections import namedtuple
+
+from ..api import Gradebook
+from ..server_extensions.formgrader.base import NotebookNavigation, NavigationIndex
+
+
+Submission = namedtuple("Submission", ["id", "failed_tests"])
+
+
+class FakeGradebook(object):
+
+    def __init__(self):
+        self.revision_key = ("db", 0)
+
+    def commit(self):
+        db_id, value = self.revision_key
+        self.revision_key = (db_id, value + 1)
+
+
+@pytest.fixture
+def submissions():
+    # b and d have failed tests; the gradebook doesn't return submissions in
+    # any particular order
+    return [
+        Submission("c", False),
+        Submission("a", False),
+        Submission("e", False),
+        Submission("d", True),
+        Submission("b", True),
+    ]
+
+
+class Loader(object):
+    """Loads the submissions of a notebook, counting how many times it was
+    called."""
+
+    def __init__(self, submissions):
+        self.submissions = submissions
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.submissions
+
+
+@pytest.fixture
+def load(submissions):
+    return Loader(submissions)
+
+
+@pytest.fixture
+def navigation(submissions):
+    return NotebookNavigation(("db", 0), submissions)
+
+
+class TestNotebookNavigation(object):
+
+    def test_sorted(self, navigation):
+        assert navigation.ids == ["a", "b", "c", "d", "e"]
+
+    def test_next_prev(self, navigation):
+        assert navigation.next("a") == "b"
+        assert navigation.next("c") == "d"
+        assert navigation.prev("c") == "b"
+        assert navigation.prev("e") == "d"
+
+    def test_next_prev_incorrect(self, navigation):
+        assert navigation.next("a", incorrect=True) == "b"
+        assert navigation.next("b", incorrect=True) == "d"
+        assert navigation.next("c", incorrect=True) == "d"
+        assert navigation.prev("e", incorrect=True) == "d"
+        assert navigation.prev("d", incorrect=True) == "b"
+        assert navigation.prev("c", incorrect=True) == "b"
+
+    def test_ends(self, navigation):
+        # there is no wrapping around: the formgrader goes back to the list of
+        # submissions at both ends
+        assert navigation.next("e") is None
+        assert navigation.prev("a") is None
+        assert navigation.next("d", incorrect=True) is None
+        assert navigation.next("e", incorrect=True) is None
+        assert navigation.prev("b", incorrect=True) is None
+        assert navigation.prev("a", incorrect=True) is None
+
+    def test_no_incorrect(self):
+        navigation = NotebookNavigation(("db", 0), [Submission("b", False), Submission("a", False)])
+        assert navigation.next("a", incorrect=True) is None
+        assert navigation.prev("b", incorrect=True) is None
+
+    def test_empty(self):
+        navigation = NotebookNavigation(("db", 0), [])
+        assert navigation.next("a") is None
+        assert navigation.prev("a") is None
+        assert navigation.next("a", incorrect=True) is None
+        assert navigation.prev("a", incorrect=True) is None
+
+    def test_unknown_submission(self, navigation):
+        # e.g. a submission whose notebook has been removed since
+        assert navigation.next("bb") == "c"
+        assert navigation.prev("bb") == "b"
+        assert navigation.next("bb", incorrect=True) == "d"
+        assert navigation.prev("bb", incorrect=True) == "b"
+        assert navigation.next("0") == "a"
+        assert navigation.prev("z") == "e"
+
+
+class TestNavigationIndex(object):
+
+    def test_reused(self, load):
+        gradebook = FakeGradebook()
+        index = NavigationIndex()
+        navigation = index.get(gradebook, "ps1", "p1", load)
+        assert index.get(gradebook, "ps1", "p1", load) is navigation
+        assert load.calls == 1
+
+        # another notebook gets its own navigation
+        index.get(gradebook, "ps1", "p2", load)
+        assert load.calls == 2
+
+    def test_grades_changed(self, load):
+        gradebook = FakeGradebook()
+        index = NavigationIndex()
+        navigation = index.get(gradebook, "ps1", "p1", load)
+        old_revision = gradebook.revision_key
+        gradebook.commit()
+        index.grades_changed(old_revision, gradebook.revision_key)
+
+        assert index.get(gradebook, "ps1", "p1", load) is navigation
+        assert navigation.revision == gradebook.revision_key
+        assert load.calls == 1
+
+    def test_rebuilt_after_other_change(self, load):
+        gradebook = FakeGradebook()
+        index = NavigationIndex()
+        navigation = index.get(gradebook, "ps1", "p1", load)
+
+        # something else changed the gradebook
+        gradebook.commit()
+        assert index.get(gradebook, "ps1", "p1", load) is not navigation
+        assert load.calls == 2
+
+    def test_rebuilt_after_other_change_and_grades(self, load):
+        gradebook = FakeGradebook()
+        index = NavigationIndex()
+        navigation = index.get(gradebook, "ps1", "p1", load)
+
+        # an unrelated change, and then grades are written: the navigation is
+        # not carried over, as it was not current before the grades changed
+        gradebook.commit()
+        old_revision = gradebook.revision_key
+        gradebook.commit()
+        index.grades_changed(old_revision, gradebook.revision_key)
+        assert index.get(gradebook, "ps1", "p1", load) is not navigation
+        assert load.calls == 2
+
+    def test_not_carried_over_several_revisions(self, load):
+        gradebook = FakeGradebook()
+        index = NavigationIndex()
+        navigation = index.get(gradebook, "ps1", "p1", load)
+
+        # grades were written, but something else changed the gradebook too
+        old_revision = gradebook.revision_key
+        gradebook.commit()
+        gradebook.commit()
+        index.grades_changed(old_revision, gradebook.revision_key)
+        assert navigation.revision == old_revision
+        assert index.get(gradebook, "ps1", "p1", load) is not navigation
+        assert load.calls == 2
+
+
+def test_gradebook_navigation():
+    with Gradebook("sqlite:///:memory:") as gb:
+        gb.add_assignment("ps1")
+        gb.add_notebook("p1", "ps1")
+        gb.add_grade_cell("test1", "p1", "ps1", max_score=1, cell_type="code")
+        gb.add_source_cell("test1", "p1", "ps1", cell_type="code")
+        for student in ("s1", "s2", "s3"):
+            gb.add_student(student)
+            gb.add_submission("ps1", student)
+        gb.find_grade("test1", "p1", "ps1", "s2").auto_score = 0
+        for student in ("s1", "s3"):
+            gb.find_grade("test1", "p1", "ps1", student).auto_score = 1
+        gb.db.commit()
+
+        def load():
+            return gb.notebook_submissions("p1", "ps1")
+
+        index = NavigationIndex()
+        navigation = index.get(gb, "ps1", "p1", load)
+        ids = navigation.ids
+        assert ids == sorted(x.id for x in gb.notebook_submissions("p1", "ps1"))
+        failed = gb.find_submission_notebook("p1", "ps1", "s2").id
+        assert [navigation.next(x, incorrect=True) for x in ids[:ids.index(failed)]] == \
+            [failed] * ids.index(failed)
+
+        # writing a grade carries the navigation over
+        old_revision = gb.revision_key
+        gb.update_grades_and_comments(grades=[{
+            "id": gb.find_grade("test1", "p1", "ps1", "s1").id, "manual_score": 0.5}])
+        index.grades_changed(old_revision, gb.revision_key)
+        assert index.get(gb, "ps1", "p1", load) is navigation
+
+        # but adding a student does not
+        gb.add_student("s4")
+        assert index.get(gb, "ps1", "p1", load) is not navigation
@@ -0,0 +1,116 @@
+import pytest
+import nbformat
+
+from nbformat.v4 import new_notebook, new_output, new_markdown_cell
+
+from .. import notebookio
+from . import create_code_cell, create_grade_and_solution_cell
+
+
+@pytest.fixture
+def nb():
+    cell = create_code_cell()
+    cell.metadata.trusted = True
+    cell.outputs = [
+        new_output("stream", name="stdout", text="héllo\nworld\n"),
+        new_output("display_data", data={"text/plain": "a\nb", "image/png": "abc"}),
+    ]
+    cells = [
+        cell,
+        create_grade_and_solution_cell("print('hi')\n", "code", "foo", 1),
+        new_markdown_cell("some\ntext", attachments={"a.png": {"image/png": "abc"}}),
+    ]
+    nb = new_notebook(cells=cells)
+    nb.metadata.kernelspec = {"display_name": "Python", "language": "python", "name": "python"}
+    return nb
+
+
+@pytest.fixture
+def validations(monkeypatch):
+    calls = []
+    validate = notebookio.validate
+
+    def counting_validate(nb):
+        calls.append(nb)
+        validate(nb)
+
+    monkeypatch.setattr(notebookio, "validate", counting_validate)
+    return calls
+
+
+def test_writes_unstamped(nb):
+    expected = nbformat.writes(nb)
+    assert notebookio.writes(nb, stamp=False) == (expected + "\n").encode("utf-8")
+    # the notebook itself is not changed
+    assert nbformat.writes(nb) == expected
+
+
+def test_round_trip(nb):
+    data = notebookio.writes(nb)
+    assert b'"stamp": ' in data
+    assert notebookio.reads(data) == nbformat.reads(notebookio.writes(nb, stamp=False), as_version=4)
+    assert notebookio.reads(data.decode("utf-8")) == notebookio.reads(data)
+
+
+def test_write_read(nb, tmpdir):
+    filename = str(tmpdir.join("nb.ipynb"))
+    notebookio.write(nb, filename)
+    with open(filename, "rb") as fh:
+        assert fh.read() == notebookio.writes(nb)
+    assert notebookio.read(filename) == notebookio.reads(notebookio.writes(nb))
+
+
+def test_exporter_stamp(nb):
+    # only the notebooks nbgrader reads back itself are stamped
+    output, _ = notebookio.NotebookIOExporter().from_notebook_node(nb)
+    assert output == notebookio.writes(nb, stamp=False)
+    output, _ = notebookio.NotebookIOExporter(stamp=True).from_notebook_node(nb)
+    assert output == notebookio.writes(nb)
+
+
+def test_stamped_not_validated(nb, validations):
+    data = notebookio.writes(nb)
+    assert len(validations) == 1
+    notebookio.reads(data)
+    assert len(validations) == 1
+
+
+def test_changed_validated(nb, validations):
+    data = notebookio.writes(nb)
+    changed = data.replace(b"world", b"there")
+    read_nb = notebookio.reads(changed)
+    assert len(validations) == 2
+    assert "stamp" not in read_nb.metadata.get("nbgrader", {})
+    assert read_nb.cells[0].outputs[0].text == "héllo\nthere\n"
+
+    # the old stamp is replaced when the notebook is written again
+    assert notebookio.writes(read_nb) == notebookio.writes(nbformat.reads(changed, as_version=4))
+
+
+def test_invalid_not_stamped(nb, validations):
+    del nb.cells[0]["execution_count"]
+    data = notebookio.writes(nb)
+    assert b'"stamp": ' not in data
+    notebookio.reads(data)
+    assert len(validations) == 2
+
+
+def test_other_nbgrader_metadata_kept(nb):
+    nb.metadata.nbgrader = {"foo": "bar"}
+    read_nb = notebookio.reads(notebookio.writes(nb))
+    assert read_nb.metadata.nbgrader == {"foo": "bar"}
+    assert "nbgrader" not in notebookio.reads(notebookio.writes(new_notebook())).metadata
+
+
+def test_placeholder_in_notebook(nb):
+    nb.cells[0].outputs[0].text = "0" * 64
+    data = notebookio.writes(nb)
+    assert b'"stamp": ' not in data
+    assert data == notebookio.writes(nb, stamp=False)
+
+
+def test_json_fallback():
+    # NaN is not valid JSON, but is accepted by the json module
+    data = nbformat.writes(new_notebook()).replace('"metadata": {}', '"metadata": {"x": NaN}')
+    nb = notebookio.reads(data)
+    assert nb.metadata.x != nb.metadata.x
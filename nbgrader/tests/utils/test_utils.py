@@ -315,6 +315,39 @@ def test_compute_checksum_utf8():
     utils.compute_checksum(create_solution_cell("\u03b8", "markdown", "foo"))
     utils.compute_checksum(create_solution_cell(u'$$\\int^\u221e_0 x^2dx$$', "markdown", "foo"))
 
+
+def test_compute_checksum_memoized():
+    # is the checksum of a mutated cell recomputed?
+    cell = create_grade_and_solution_cell("hello", "code", "foo", 1)
+    checksums = set()
+    checksums.add(utils.compute_checksum(cell))
+    assert utils.compute_checksum(cell) in checksums
+
+    mutations = [
+        lambda: setattr(cell, "source", "hello!"),
+        lambda: setattr(cell, "cell_type", "markdown"),
+        lambda: cell.metadata.nbgrader.__setitem__("points", 2),
+        lambda: cell.metadata.nbgrader.__setitem__("grade_id", "bar"),
+        lambda: cell.metadata.nbgrader.__setitem__("solution", False),
+        lambda: cell.metadata.nbgrader.__setitem__("grade", False),
+        lambda: cell.metadata.nbgrader.__setitem__("locked", True),
+    ]
+    for mutate in mutations:
+        mutate()
+        checksum = utils.compute_checksum(cell)
+        assert checksum not in checksums
+        checksums.add(checksum)
+
+        # the memoized checksum is the same as a fresh one
+        utils._checksum.cache_clear()
+        assert utils.compute_checksum(cell) == checksum
+
+    # truthy values that aren't booleans still give distinct checksums
+    cell1 = create_grade_cell("hello", "code", "foo", 1)
+    cell2 = create_grade_cell("hello", "code", "foo", 1)
+    cell2.metadata.nbgrader["grade"] = 1
+    assert utils.compute_checksum(cell1) != utils.compute_checksum(cell2)
+
 def test_ignore_patterns(temp_cwd):
     dir = "foo"
     os.mkdir(dir)
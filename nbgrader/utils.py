@@ -10,6 +10,7 @@ import logging
 import traceback
 import contextlib
 import fnmatch
+import functools
 
 from setuptools.archive_util import unpack_archive
 from setuptools.archive_util import unpack_tarfile
@@ -135,27 +136,50 @@ def to_bytes(string: str) -> bytes:
     return bytes(string.encode('utf-8'))
 
 
-def compute_checksum(cell: NotebookNode) -> str:
+@functools.lru_cache(maxsize=4096)
+def _checksum(source: str, cell_type: str, grade: str, solution: str, locked: str,
+              grade_id: str, points: Optional[str]) -> str:
     m = hashlib.md5()
     # add the cell source and type
-    m.update(to_bytes(cell.source))
-    m.update(to_bytes(cell.cell_type))
+    m.update(to_bytes(source))
+    m.update(to_bytes(cell_type))
 
     # add whether it's a grade cell and/or solution cell
-    m.update(to_bytes(str(is_grade(cell))))
-    m.update(to_bytes(str(is_solution(cell))))
-    m.update(to_bytes(str(is_locked(cell))))
+    m.update(to_bytes(grade))
+    m.update(to_bytes(solution))
+    m.update(to_bytes(locked))
 
     # include the cell id
-    m.update(to_bytes(cell.metadata.nbgrader['grade_id']))
+    m.update(to_bytes(grade_id))
 
     # include the number of points that the cell is worth, if it is a grade cell
-    if is_grade(cell):
-        m.update(to_bytes(str(float(cell.metadata.nbgrader['points']))))
+    if points is not None:
+        m.update(to_bytes(points))
 
     return m.hexdigest()
 
 
+def compute_checksum(cell: NotebookNode) -> str:
+    # the same cells get checksummed several times while processing a
+    # notebook, so the checksums are memoized, keyed by everything that goes
+    # into them: a cell that is changed in any of these ways gets a new key.
+    # The metadata is read once as plain dicts, as going through is_grade,
+    # is_solution and is_locked costs more than hashing the cell.
+    nbgrader = cell.metadata.nbgrader
+    grade = nbgrader.get('grade', False)
+    solution = nbgrader.get('solution', False)
+    if solution:
+        locked = False
+    elif grade:
+        locked = True
+    else:
+        locked = nbgrader.get('locked', False)
+    points = str(float(nbgrader['points'])) if grade else None
+    return _checksum(
+        cell['source'], cell['cell_type'], str(grade), str(solution), str(locked),
+        nbgrader['grade_id'], points)
+
+
 def parse_utc(ts: Union[datetime, str]) -> datetime:
     """Parses a timestamp into datetime format, converting it to UTC if necessary."""
     if ts is None:
@@ -3,12 +3,13 @@ import os
 
 from traitlets.config import LoggingConfigurable
 from traitlets import List, Unicode, Integer, Bool
-from nbformat import current_nbformat, read as read_nb
+from nbformat import current_nbformat
 from textwrap import fill, dedent
 from nbconvert.filters import ansi2html, strip_ansi
 
 from .preprocessors import Execute, ClearOutput, CheckCellMetadata
 from . import utils
+from .notebookio import read as read_nb
 from nbformat.notebooknode import NotebookNode
 import typing
 
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Benchmark reading and writing a large notebook with many outputs, with
+nbformat and with nbgrader.notebookio.
+
+The notebook is read back both as written by nbformat (so it is validated)
+and as written by nbgrader.notebookio (so it is stamped and not validated
+again). The notebooks read are checked to be the same.
+
+"""
+import argparse
+import base64
+import os
+import random
+import tempfile
+import time
+
+import nbformat
+from nbformat import v4
+
+from nbgrader import notebookio
+
+
+def make_notebook(ncells, image_size):
+    rng = random.Random(0)
+    cells = []
+    for i in range(ncells):
+        cell = v4.new_code_cell("for i in range({0}):\n    print(i)\nplot({0})\n".format(i))
+        cell.outputs = [
+            v4.new_output("stream", name="stdout", text="".join("{}\n".format(j) for j in range(50))),
+            v4.new_output("display_data", data={
+                "image/png": base64.b64encode(bytes(rng.getrandbits(8) for _ in range(image_size))).decode("ascii"),
+                "text/plain": "<Figure size 432x288 with 1 Axes>"}),
+        ]
+        cell.execution_count = i
+        cells.append(cell)
+
+    nb = v4.new_notebook(cells=cells)
+    nb.metadata.kernelspec = {"display_name": "Python 3", "language": "python", "name": "python3"}
+    return nb
+
+
+def best(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cells", type=int, default=1000, help="number of cells in the notebook")
+    parser.add_argument("--image-size", type=int, default=20000, help="size of the image output of each cell, in bytes")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs, of which the best is kept")
+    args = parser.parse_args()
+
+    nb = make_notebook(args.cells, args.image_size)
+    print("JSON codec: {}".format("orjson" if notebookio.orjson is not None else "json"))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        plain = os.path.join(tmpdir, "plain.ipynb")
+        stamped = os.path.join(tmpdir, "stamped.ipynb")
+
+        write_before, _ = best(lambda: nbformat.write(nb, plain), args.repeat)
+        write_after, _ = best(lambda: notebookio.write(nb, stamped), args.repeat)
+        print("notebook: {} cells, {:.1f} MB".format(args.cells, os.path.getsize(plain) / 1e6))
+
+        read_before, expected = best(lambda: nbformat.read(plain, as_version=4), args.repeat)
+        read_unstamped, unstamped = best(lambda: notebookio.read(plain), args.repeat)
+        read_stamped, actual = best(lambda: notebookio.read(stamped), args.repeat)
+
+    assert unstamped == expected, "notebook read differs"
+    assert actual == expected, "stamped notebook read differs"
+
+    print("{:>18}: {:.3f}s -> {:.3f}s ({:.2f}x)".format(
+        "write", write_before, write_after, write_before / write_after))
+    print("{:>18}: {:.3f}s -> {:.3f}s ({:.2f}x)".format(
+        "read", read_before, read_unstamped, read_before / read_unstamped))
+    print("{:>18}: {:.3f}s -> {:.3f}s ({:.2f}x)".format(
+        "read (stamped)", read_before, read_stamped, read_before / read_stamped))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Benchmark the preprocessors of nbgrader generate_assignment on a large
+notebook, running each preprocessor over all the cells in turn and with the
+cell-level preprocessors fused into single passes over the cells.
+
+SaveCells is left out, as it needs a database and doesn't change the
+notebook. The output of both runs is checked to be the same.
+
+"""
+import argparse
+import copy
+import time
+
+from nbformat import v4, writes
+
+from nbgrader.converters import GenerateAssignment
+from nbgrader.preprocessors import SaveCells
+from nbgrader.preprocessors.fused import FusedCellPreprocessor, fuse_preprocessors, is_cell_level
+from nbgrader.nbgraderformat import SCHEMA_VERSION
+
+
+def make_notebook(ncells):
+    cells = []
+    for i in range(ncells):
+        kind = i % 4
+        if kind == 0:
+            cell = v4.new_markdown_cell("Question {}\n\n".format(i) + "Some text.\n" * 5)
+        elif kind == 1:
+            cell = v4.new_code_cell(
+                "def f{0}(x):\n    ### BEGIN SOLUTION\n    return x + {0}\n    ### END SOLUTION\n".format(i))
+            cell.metadata.nbgrader = {
+                "grade": False, "solution": True, "locked": False,
+                "grade_id": "solution_{}".format(i), "schema_version": SCHEMA_VERSION}
+        elif kind == 2:
+            cell = v4.new_code_cell(
+                "assert f{0}(1) == {1}\n### BEGIN HIDDEN TESTS\nassert f{0}(2) == {2}\n### END HIDDEN TESTS\n".format(
+                    i - 1, i, i + 1))
+            cell.metadata.nbgrader = {
+                "grade": True, "solution": False, "locked": False, "points": 1,
+                "grade_id": "test_{}".format(i), "schema_version": SCHEMA_VERSION}
+        else:
+            cell = v4.new_code_cell("print({})".format(i))
+            cell.outputs = [v4.new_output("stream", name="stdout", text="{}\n".format(i))]
+            cell.execution_count = i
+        cells.append(cell)
+
+    nb = v4.new_notebook(cells=cells)
+    nb.metadata.kernelspec = {"display_name": "Python 3", "language": "python", "name": "python3"}
+    return nb
+
+
+def run(preprocessors, nb):
+    """Run the preprocessors, returning the time spent in the cell-level
+    ones, the total time and the output notebook."""
+    resources = {}
+    cell_time = total = 0
+    for pp in preprocessors:
+        start = time.perf_counter()
+        nb, resources = pp(nb, resources)
+        elapsed = time.perf_counter() - start
+        if isinstance(pp, FusedCellPreprocessor) or is_cell_level(pp):
+            cell_time += elapsed
+        total += elapsed
+    return cell_time, total, nb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cells", type=int, default=4000, help="number of cells in the notebook")
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs, of which the best is kept")
+    args = parser.parse_args()
+
+    classes = [x for x in GenerateAssignment.class_traits()["preprocessors"].default() if x is not SaveCells]
+    nb = make_notebook(args.cells)
+
+    results = {}
+    for name, fuse in [("separate", False), ("fused", True)]:
+        preprocessors = [cls() for cls in classes]
+        if fuse:
+            preprocessors = fuse_preprocessors(preprocessors)
+        runs = [run(preprocessors, copy.deepcopy(nb)) for _ in range(args.repeat)]
+        cell_time = min(x[0] for x in runs)
+        total = min(x[1] for x in runs)
+        results[name] = (cell_time, total, writes(runs[-1][2]))
+        print("{:>8}: {:2d} stages, cell-level {:.3f}s, total {:.3f}s".format(
+            name, len(preprocessors), cell_time, total))
+
+    assert results["separate"][2] == results["fused"][2], "fused output differs"
+    print("speedup: cell-level {:.2f}x, total {:.2f}x".format(
+        results["separate"][0] / results["fused"][0],
+        results["separate"][1] / results["fused"][1]))
+
+
+if __name__ == "__main__":
+    main()